@@ -0,0 +1,166 @@
+import json
+import re
+import string
+import sys
+from pathlib import Path
+
+# ----------------------------------------
+# SHARED ANALYZER
+# ----------------------------------------
+# The one text -> terms pipeline for indexing (every build path), the
+# document store's token spans, querying and ranking:
+#
+#   1. split     lower-case runs of [a-z0-9]; everything else separates.
+#                ASCII text goes through one bytes.translate table that
+#                lower-cases and blanks separators in a single C pass, then
+#                split(); other text falls back to the regex
+#   2. stopwords optional: drop STOPWORDS (or a given set)
+#   3. stem      optional: "s" (Harman's S-stemmer, built in) or "porter"
+#                (needs nltk)
+#
+# Terms come out of a per-analyzer vocabulary (surface token -> final
+# term), so every occurrence of a term is the same string object and the
+# stop / stem stages run once per distinct token, not once per occurrence.
+#
+# The analyzer a build used is saved in the index directory (ANALYZER_FILE)
+# and load_analyzer() gives the query side the same one.
+#
+#   python bench/bench_analyzer.py    tokens/sec vs the old re.sub tokenizer
+
+ANALYZER_FILE = "analyzer.json"
+MAX_VOCAB = 1 << 20   # a long-running server sees arbitrary query tokens
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+NON_TOKEN_RE = re.compile(r"[^a-z0-9\s]")
+_KEEP = set(string.ascii_lowercase + string.digits + string.whitespace)
+# ASCII byte -> lower-case byte, or a space for anything that is not a token char
+FOLD = bytes(c + 32 if 65 <= c <= 90 else c if chr(c) in _KEEP else 32 for c in range(256))
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "of", "for", "to", "in", "on", "is", "are", "this", "that", "with",
+    "we", "by", "it", "as", "be", "our", "from", "or", "at",
+})
+STEMMERS = ("s", "porter")
+
+
+def split_tokens(text):
+    # the surface tokens, lower-cased, before the stop / stem stages
+    if text.isascii():
+        return text.encode("ascii").translate(FOLD).decode("ascii").split()
+    return NON_TOKEN_RE.sub(" ", text.lower()).split()
+
+
+def s_stem(token):
+    # Harman's S-stemmer: plural endings only, so it rarely conflates
+    if len(token) > 3 and token.endswith("ies") and token[-4] not in "ae":
+        return token[:-3] + "y"
+    if len(token) > 2 and token.endswith("es") and token[-3] not in "aeo":
+        return token[:-1]
+    if len(token) > 1 and token.endswith("s") and token[-2] not in "us":
+        return token[:-1]
+    return token
+
+
+def _porter():
+    try:
+        from nltk.stem.porter import PorterStemmer
+    except ImportError:
+        raise ValueError("stem='porter' needs nltk; use stem='s' for the built-in stemmer")
+    return PorterStemmer().stem
+
+
+class Analyzer:
+    def __init__(self, stopwords=False, stem=None):
+        # stopwords: False, True (STOPWORDS) or an iterable of words
+        if stem is not None and stem not in STEMMERS:
+            raise ValueError(f"Unknown stemmer {stem!r}; choose from {', '.join(STEMMERS)}")
+        if stopwords is True:
+            stopwords = STOPWORDS
+        self.stopwords = frozenset(stopwords or ())
+        self.stem = stem
+        self._stemmer = None if stem is None else s_stem if stem == "s" else _porter()
+        self._identity = not self.stopwords and self._stemmer is None
+        self._terms = {}   # surface token -> interned term ("" when dropped)
+
+    def config(self):
+        return {"stopwords": sorted(self.stopwords), "stem": self.stem}
+
+    def _term(self, token):
+        if token in self.stopwords:
+            return ""
+        if self._stemmer is not None:
+            token = self._stemmer(token)
+        return sys.intern(token)
+
+    def analyze(self, text):
+        # -> [term, ...] in text order
+        terms = self._terms
+        if len(terms) > MAX_VOCAB:
+            terms.clear()
+        if self._identity:
+            intern = terms.setdefault
+            return [intern(t, t) for t in split_tokens(text)]
+        out = []
+        for t in split_tokens(text):
+            term = terms.get(t)
+            if term is None:
+                term = terms[t] = self._term(t)
+            if term:
+                out.append(term)
+        return out
+
+    __call__ = analyze
+
+    def analyze_terms(self, words):
+        # analyze every word of an already split query (boolean operands)
+        return [t for w in words for t in self.analyze(w)]
+
+    def token_spans(self, text):
+        # -> [(byte start, byte end)] of the tokens analyze() keeps, in order,
+        # so span p is the token at position p in the positional index
+        if text.isascii():
+            low = text.lower()
+            if not self.stopwords:
+                return [m.span() for m in TOKEN_RE.finditer(low)]
+            return [m.span() for m in TOKEN_RE.finditer(low) if m.group() not in self.stopwords]
+        spans = []
+        token = []
+        start = last_end = None
+        pos = 0
+        for ch in text:
+            end = pos + len(ch.encode("utf-8"))
+            # lower() can expand a char; each piece is a token char or a break
+            for low in ch.lower():
+                if "a" <= low <= "z" or "0" <= low <= "9":
+                    if start is None:
+                        start = pos
+                    token.append(low)
+                    last_end = end
+                elif start is not None:
+                    if "".join(token) not in self.stopwords:
+                        spans.append((start, last_end))
+                    start = None
+                    token.clear()
+            pos = end
+        if start is not None and "".join(token) not in self.stopwords:
+            spans.append((start, last_end))
+        return spans
+
+    def save(self, index_dir):
+        with open(Path(index_dir) / ANALYZER_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.config(), f)
+
+
+DEFAULT = Analyzer()
+
+
+def load_analyzer(index_dir):
+    # the analyzer the index was built with (the default for older indexes)
+    path = Path(index_dir) / ANALYZER_FILE
+    if not path.exists():
+        return DEFAULT
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not config["stopwords"] and config["stem"] is None:
+        return DEFAULT
+    return Analyzer(config["stopwords"], config["stem"])
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from query_parser import QuerySyntaxError
+from result_cache import ResultCache, index_generation
+from search_service import Searcher, INDEX_DIR, QUERY_TYPES, TOP_K_TYPES
+from tracing import METRICS, record, sampled, trace
+from warmup import Warmup, process_age
+
+# ----------------------------------------
+# HEADLESS SEARCH API
+# ----------------------------------------
+# asyncio HTTP/1.1 front end (keep-alive, stdlib only) + a process pool:
+#
+#   event loop    parses requests, answers cache hits, pages results
+#   workers       one Searcher each (segments mmap'd once per process),
+#                 run the CPU-bound matching and scoring
+#
+#   GET /search?q=...&type=ranked|semantic|hybrid|boolean|phrase|proximity
+#               |proximity_ordered&k=3&page=1&size=10[&trace=1][&profile=1]
+#   GET /health    status, cache stats, warm-up and time-to-first-query
+#   GET /ready     200 once every worker is warm, 503 before (readiness probe)
+#   GET /metrics   Prometheus text: latency histograms per query type and
+#                  per span, work counters (tracing.py)
+#
+# Responses are JSON with paging info and timing fields (ms):
+#   search_ms  time inside the worker
+#   queue_ms   pool dispatch + wait (total_ms - search_ms on a miss)
+#   total_ms   request parsed -> response ready
+#
+# Every uncached query is traced in its worker; the trace comes back with
+# the results and is recorded here (histograms, plus one JSON log line per
+# query with --trace-log). trace=1 returns it in the response; profile=1
+# runs that one query under cProfile (--profile-rate samples queries).
+#
+# Workers warm up in the pool initializer (warmup.py: open the Searcher,
+# prefault the hot terms, one query per type) and the pool is started at
+# launch with one status task per worker, so the first user query does not
+# pay for process start-up or a cold index; /ready (and --ready-file) hold
+# traffic until then.
+#
+#   python api_server.py --port 8765 --workers 4
+#   python bench/load_gen.py --url http://127.0.0.1:8765 --concurrency 32
+
+DEFAULT_PORT = 8765
+MAX_PAGE_SIZE = 100
+MAX_DEPTH = 1000          # deepest ranked result a client can page to
+MAX_LINE = 8192
+WARM_TIMEOUT = 600        # seconds a worker waits for the others at start-up
+
+_searcher = None
+_warmup = None
+_barrier = None
+
+
+# ----------------------------------------
+# WORKER SIDE
+# ----------------------------------------
+def _init_worker(index_dir, barrier=None):
+    global _searcher, _warmup, _barrier
+    _barrier = barrier
+    _warmup = Warmup(index_dir).run()
+    # a failed open raises here again, and the pool reports it
+    _searcher = _warmup.searcher or Searcher(index_dir)
+
+
+def _worker_status():
+    # runs after the initializer warmed this worker; the barrier holds it
+    # until every worker is running one, so each worker answers exactly once
+    _barrier.wait(WARM_TIMEOUT)
+    return os.getpid(), _warmup.status()
+
+
+def _worker_search(qtype, query, k, depth, profile=False):
+    _searcher.refresh()
+    with trace(query, qtype, profile) as t:
+        results = _searcher.search(qtype, query, k, depth)
+    return results, t.seconds * 1000, t.to_dict()
+
+
+# ----------------------------------------
+# REQUEST HANDLING
+# ----------------------------------------
+class BadRequest(Exception):
+    pass
+
+
+def _int_param(params, name, default, lo, hi):
+    raw = params.get(name, [None])[0]
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if not lo <= value <= hi:
+        raise BadRequest(f"{name} must be between {lo} and {hi}")
+    return value
+
+
+class SearchAPI:
+    def __init__(self, index_dir=INDEX_DIR, workers=None, cache=None, profile_rate=0.0, ready_file=None):
+        self.index_dir = index_dir
+        self.profile_rate = profile_rate
+        self.ready_file = ready_file
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache if cache is not None else ResultCache()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(index_dir, multiprocessing.Barrier(self.workers)))
+        self.requests = 0
+        self.ready = False
+        self.warmup = {}               # worker pid -> its warm-up status
+        self.startup = {}              # ready_ms, time_to_first_query_ms
+
+    async def warm(self):
+        # one status task per worker: all workers start and warm at once
+        loop = asyncio.get_running_loop()
+        statuses = await asyncio.gather(*(loop.run_in_executor(self.pool, _worker_status)
+                                          for _ in range(self.workers)))
+        self.warmup = dict(statuses)
+        self.startup["ready_ms"] = round(process_age() * 1000, 1)
+        self.ready = True
+        if self.ready_file:
+            with open(self.ready_file, "w", encoding="utf-8") as f:
+                json.dump(self.readiness(), f)
+
+    def readiness(self):
+        return {"status": "ready" if self.ready else "warming", "workers": self.workers,
+                "warmed": len(self.warmup), "startup": self.startup,
+                "warmup": {str(pid): s["timings"] for pid, s in self.warmup.items()}}
+
+    async def search(self, params):
+        t0 = time.perf_counter()
+        query = params.get("q", [""])[0]
+        if not query.strip():
+            raise BadRequest("q is required")
+        qtype = params.get("type", ["ranked"])[0]
+        if qtype not in QUERY_TYPES:
+            raise BadRequest(f"type must be one of {', '.join(QUERY_TYPES)}")
+        k = _int_param(params, "k", 3, 1, 50)
+        size = _int_param(params, "size", 10, 1, MAX_PAGE_SIZE)
+        page = _int_param(params, "page", 1, 1, MAX_DEPTH)
+        start = (page - 1) * size
+        if start >= MAX_DEPTH:
+            raise BadRequest(f"cannot page past result {MAX_DEPTH}")
+        # ranked types are a top-k, so fetch one extra hit to know if there is more
+        depth = min(start + size + 1, MAX_DEPTH) if qtype in TOP_K_TYPES else 0
+        want_trace = params.get("trace", [""])[0] == "1"
+        profile = params.get("profile", [""])[0] == "1" or sampled(self.profile_rate)
+
+        self.cache.check_generation(index_generation(self.index_dir))
+        key = self.cache.key(qtype, query, k if qtype.startswith("proximity") else "", depth)
+        results = self.cache.get(key)
+        cached = results is not None
+        search_ms = 0.0
+        traced = None
+        if cached:
+            METRICS.inc("cache_hits")
+        else:
+            METRICS.inc("cache_misses")
+            loop = asyncio.get_running_loop()
+            results, search_ms, traced = await loop.run_in_executor(
+                self.pool, _worker_search, qtype, query, k, depth, profile)
+            self.cache.put(key, results)
+            record(traced, results=len(results))
+
+        hits = results[start:start + size]
+        total_ms = (time.perf_counter() - t0) * 1000
+        if "time_to_first_query_ms" not in self.startup:
+            self.startup["time_to_first_query_ms"] = round(process_age() * 1000, 1)
+        body = {
+            "query": query,
+            "type": qtype,
+            "page": page,
+            "size": size,
+            # ranked types only know their hits up to depth
+            "total": len(results) if qtype not in TOP_K_TYPES else None,
+            "has_more": len(results) > start + size,
+            "results": [{"rank": start + i + 1, "doc_id": d, "score": s}
+                        for i, (d, s) in enumerate(hits)],
+            "cached": cached,
+            "timing": {
+                "search_ms": round(search_ms, 3),
+                "queue_ms": round(total_ms - search_ms, 3) if not cached else 0.0,
+                "total_ms": round(total_ms, 3),
+            },
+        }
+        if want_trace:
+            body["trace"] = traced   # None for a cache hit
+        return body
+
+    def health(self):
+        return {
+            "status": "ok",
+            "ready": self.ready,
+            "workers": self.workers,
+            "startup": self.startup,
+            "requests": self.requests,
+            "generation": index_generation(self.index_dir),
+            "cache": self.cache.stats(),
+        }
+
+    async def dispatch(self, method, target):
+        url = urlsplit(target)
+        if method not in ("GET", "HEAD"):
+            return 405, {"error": "method not allowed"}
+        if url.path == "/health":
+            return 200, self.health()
+        if url.path == "/ready":
+            return (200 if self.ready else 503), self.readiness()
+        if url.path == "/metrics":
+            return 200, METRICS.exposition()
+        if url.path != "/search":
+            return 404, {"error": "not found"}
+        self.requests += 1
+        try:
+            return 200, await self.search(parse_qs(url.query))
+        except (BadRequest, QuerySyntaxError) as e:
+            return 400, {"error": str(e)}
+
+    async def handle(self, reader, writer):
+        # one connection, any number of keep-alive requests
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if len(line) > MAX_LINE:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await _respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+                length = int(headers.get("content-length", 0) or 0)
+                if length:
+                    await reader.readexactly(length)   # no request bodies are used
+
+                keep_alive = headers.get("connection") != "close" and version == "HTTP/1.1"
+                try:
+                    status, body = await self.dispatch(method, target)
+                except Exception as e:   # keep serving other requests
+                    status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+                await _respond(writer, status, body, keep_alive, head=method == "HEAD")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def _respond(writer, status, body, keep_alive, head=False):
+    # str bodies are plain text (/metrics), everything else JSON
+    if isinstance(body, str):
+        payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+    head_lines = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head_lines.encode("latin-1") + (b"" if head else payload))
+    await writer.drain()
+
+
+async def serve(host, port, api):
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"Search API on http://{host}:{port} ({api.workers} workers, index {api.index_dir})")
+
+    def warmed(task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            print(f"Worker warm-up failed: {task.exception()!r}")
+        else:
+            print(f"Workers warm, ready {api.startup['ready_ms'] / 1000:.2f} s after start")
+
+    # listen at once (/ready answers 503) and warm the workers meanwhile
+    warming = asyncio.create_task(api.warm())
+    warming.add_done_callback(warmed)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless IntelliSearch HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: CPU count)")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--cache-size", type=int, default=1024, help="result cache entries (0 disables)")
+    parser.add_argument("--trace-log", action="store_true", help="log one JSON trace line per query to stderr")
+    parser.add_argument("--profile-rate", type=float, default=0.0,
+                        help="run this fraction of queries under cProfile (logged with --trace-log)")
+    parser.add_argument("--ready-file", default=None, help="write the readiness JSON here once all workers are warm")
+    args = parser.parse_args()
+    if args.trace_log:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    api = SearchAPI(args.index_dir, args.workers or None,
+                    ResultCache(max_entries=args.cache_size), args.profile_rate, args.ready_file)
+    try:
+        asyncio.run(serve(args.host, args.port, api))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
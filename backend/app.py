@@ -1,19 +1,39 @@
-import re
+import os
+import logging
 import streamlit as st
 import json
-from collections import Counter
+from html import escape
 from pathlib import Path
+from urllib.parse import urlencode
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from query_parser import QuerySyntaxError
+from result_cache import ResultCache
+from snippets import make_snippets, query_terms
+from tracing import record, span, trace
+from warmup import READY_FILE_ENV, Warmup
 
 BASE_DIR = Path(__file__).resolve().parent
-DOCS_PATH = BASE_DIR / "data" / "docs_2000.jsonl"     # backend/data/docs_2000.jsonl
 INDEX_DIR = (BASE_DIR / ".." / "output").resolve()    # output/
+CACHE_PATH = None                                     # e.g. INDEX_DIR / "result_cache.json"
+API_URL = os.environ.get("INTELLISEARCH_API")         # e.g. http://127.0.0.1:8765; unset = in-process
+READY_FILE = os.environ.get(READY_FILE_ENV)           # written once the index is warm (readiness probe)
+if os.environ.get("INTELLISEARCH_TRACE_LOG"):         # one JSON line per query (tracing.py)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+# UI label -> search_service query type
+QUERY_TYPES = {
+    "Boolean (AND / OR / NOT)": "boolean",
+    "Phrase": "phrase",
+    "Proximity": "proximity",
+    "Proximity (ordered)": "proximity_ordered",
+    "Ranked (BM25)": "ranked",
+    "Semantic (dense)": "semantic",
+    "Hybrid (BM25 + dense)": "hybrid",
+}
 
 
-def tokenize_text(text: str):
-    text = (text or "").lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    return [t for t in text.split() if t]
-
 DARK_CSS = """
 <style>
 .stApp { background-color: #111418; color: #e6e6e6; font-family: "Inter", sans-serif; }
@@ -30,6 +50,7 @@ h1, h2, h3 { color: #8ab4f8; }
 .result-title { color: #8ab4f8; font-size: 20px; font-weight: 600; }
 .result-meta { color: #b5b5b5; font-size: 13px; }
 .result-snippet { font-size: 14px; margin-top: 10px; }
+.result-snippet .hl { color: #61dafb; font-weight: bold; }
 
 /* Buttons / links */
 .pdf-btn { 
@@ -110,162 +131,129 @@ h1,h2,h3,h4,h5,h6
 </style>
 """
 
-# ----------------------------- LOAD INDEXES -----------------------------
-from pathlib import Path
+# ----------------------------- SEARCH BACKEND -----------------------------
+@st.cache_resource
+def start_warmup():
+    # one warm-up per server process, on a background thread (warmup.py):
+    # the page draws at once while numpy, the Searcher and the hot postings
+    # load. API mode only needs the segment, analyzer and docstore here.
+    return Warmup(INDEX_DIR, searcher=not API_URL, docstore=True,
+                  cache=ResultCache(path=CACHE_PATH), ready_file=READY_FILE).start()
+
+
+def wait_for_index():
+    warm = start_warmup()
+    if not warm.ready:
+        with st.spinner("🔥 Warming up the index..."):
+            warm.wait()
+    return warm
 
-BASE_DIR = Path(__file__).resolve().parent
-INDEX_DIR = (BASE_DIR / ".." / "output").resolve()
 
 @st.cache_resource
-def load_indexes():
+def load_searcher():
     # DEBUG LINES — PUT THEM HERE
     st.sidebar.write(f"INDEX_DIR: {INDEX_DIR}")
-    st.sidebar.write(f"Index exists? {(INDEX_DIR / 'positional_index.json').exists()}")
-
-    # NOW load the files
-    with open(INDEX_DIR / "positional_index.json", "r", encoding="utf-8") as f:
-        pos_index = json.load(f)
-
-    with open(INDEX_DIR / "biword_index.json", "r", encoding="utf-8") as f:
-        bi_index = json.load(f)
-
-    with open(INDEX_DIR / "idf.json", "r", encoding="utf-8") as f:
-        idf = json.load(f)
+    st.sidebar.write(f"Index exists? {(INDEX_DIR / 'positional' / 'meta.json').exists()}")
 
-    return pos_index, bi_index, idf
+    # in-process mode: one Searcher (mmap'd segments + result cache) for
+    # the whole server process, not one per browser session
+    return wait_for_index().searcher
 
 
 # ------------------------- LOAD DOCUMENTS -------------------------
 @st.cache_resource
 def load_docs():
-    st.sidebar.write(f"DOCS_PATH: {DOCS_PATH}")
-    st.sidebar.write(f"Docs exists? {DOCS_PATH.exists()}")
+    # lazy store: only the rendered results are read from disk (LRU in front)
+    st.sidebar.write(f"DOCSTORE: {INDEX_DIR / 'docstore'}")
+    docs = wait_for_index().docs
+    st.sidebar.write(f"Docs exists? {docs is not None}")
+    return docs
 
-    docs = {}
-    cleaned_docs = {}
 
-    with open(DOCS_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            entry = json.loads(line)
-            doc_id = entry.get("id") or entry.get("doc_id") or entry.get("_id") or str(len(docs))
-            text = entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
-            docs[doc_id] = text
-            cleaned_docs[doc_id] = tokenize_text(text)
+def load_fields():
+    # stored titles (fields.py); None when the index was built without them
+    return wait_for_index().fields
 
 
-    return docs, cleaned_docs
+def load_query_analyzer():
+    # highlight terms must be analyzed the way the index was built
+    return wait_for_index().analyzer
 
 
-# ------------------------- HELPERS -------------------------
-def intersect(a, b):
-    i = j = 0
-    res = []
-    while i < len(a) and j < len(b):
-        if a[i] == b[j]:
-            res.append(a[i]); i += 1; j += 1
-        elif a[i] < b[j]:
-            i += 1
+def show_warmup(warm):
+    # sidebar: warming / ready state, and time-to-first-query once known
+    with st.sidebar:
+        if warm.state == "failed":
+            st.error(f"Index failed to load: {warm.error}")
+        elif not warm.ready:
+            st.info(f"🔥 Warming up the index ({warm.step or 'starting'}); searches wait for it")
         else:
-            j += 1
-    return res
-
-def boolean_and(t1, t2, pos_index):
-    return intersect(sorted(pos_index.get(t1, {}).keys()),
-                     sorted(pos_index.get(t2, {}).keys()))
-
-def phrase_query(phrase, bi_index, pos_index):
-    tokens = phrase.lower().split()
-    if len(tokens) == 1:
-        return sorted(pos_index.get(tokens[0], {}).keys())
-
-    biwords = [" ".join(tokens[i:i+2]) for i in range(len(tokens)-1)]
-    postings = [bi_index.get(b, []) for b in biwords if b in bi_index]
-
-    if not postings:
-        return []
-
-    result = postings[0]
-    for p in postings[1:]:
-        result = intersect(result, p)
-
-    return result
-
-def proximity_query(t1, t2, k, pos_index):
-    docs = set(pos_index.get(t1, {})) & set(pos_index.get(t2, {}))
-    out = []
-    for d in docs:
-        for p1 in pos_index[t1][d]:
-            for p2 in pos_index[t2][d]:
-                if abs(p1 - p2) <= k:
-                    out.append(d)
-                    break
-            else:
-                continue
-            break
-    return out
-
-def bm25_score(tokens, filtered_docs, idf, k1=1.5, b=0.75):
-    if not filtered_docs:
-        return []
-
-    avg_len = sum(len(v) for v in filtered_docs.values()) / len(filtered_docs)
-    scores = {}
+            t = warm.timings
+            line = f"✅ Index ready {t['ready_ms'] / 1000:.2f} s after start (warm-up {t['warmup_ms']:.0f} ms)"
+            if "time_to_first_query_ms" in t:
+                line += f", first query answered at {t['time_to_first_query_ms'] / 1000:.2f} s"
+            st.caption(line)
 
-    for doc_id, words in filtered_docs.items():
-        tf = Counter(words)
-        score = 0
-        for q in tokens:
-            if q in tf and q in idf:
-                freq = tf[q]
-                score += idf[q] * freq * (k1 + 1) / \
-                         (freq + k1 * (1 - b + b * len(words) / avg_len))
 
-        if score > 0:
-            scores[doc_id] = round(score, 4)
-
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
-
-def highlight_terms(text, terms):
-    for t in terms:
-        text = text.replace(t, f"<span style='color:#61dafb; font-weight:bold;'>{t}</span>")
-    return text
-
-def cached_search(query, qtype, k, pos_index, bi_index, cleaned_docs, idf):
-    key = f"{qtype}|{query}|{k}"
-
-    if key in st.session_state.cache:
-        return st.session_state.cache[key]
-
-    q = query.lower().split()
-
-    if qtype == "Boolean (AND)" and len(q) == 2:
-        docs = boolean_and(q[0], q[1], pos_index)
-
-    elif qtype == "Phrase":
-        docs = phrase_query(query, bi_index, pos_index)
-
-    elif qtype == "Proximity" and len(q) == 2:
-        docs = proximity_query(q[0], q[1], k, pos_index)
-
-    else:
-        docs = []
-
-    filtered = {d: cleaned_docs[d] for d in docs if d in cleaned_docs}
-    ranked = bm25_score(q, filtered, idf)
-    st.session_state.cache[key] = ranked
-
-    return ranked
+# ------------------------- HELPERS -------------------------
+def run_query(query, qtype, k, debug=False, profile=False):
+    # -> (results, total, status line, API worker trace or None); all query
+    # logic lives in the backend. search_service is imported on use, not at
+    # the top: by the first query the warm-up has loaded it (start_warmup)
+    from search_service import TOP_K
+    if API_URL:
+        params = {"q": query, "type": QUERY_TYPES[qtype], "k": k, "size": TOP_K}
+        if debug:
+            params.update(trace=1, profile=int(profile))
+        try:
+            with urlopen(f"{API_URL}/search?{urlencode(params)}", timeout=30) as resp:
+                body = json.load(resp)
+        except HTTPError as e:
+            if e.code == 400:   # the API rejected the query
+                raise QuerySyntaxError(json.load(e).get("error", "bad query")) from None
+            raise
+        results = [(r["doc_id"], r["score"]) for r in body["results"]]
+        total = body["total"] if body["total"] is not None else len(results)
+        status = f"API: {body['timing']['total_ms']:.1f} ms" + (" (cached)" if body["cached"] else "")
+        return results, total, status, body.get("trace")
+
+    searcher = load_searcher()
+    # a rebuild changes the generation stamp: reopen the segments and
+    # drop cached results so nothing stale is served
+    searcher.refresh()
+    results = searcher.search(QUERY_TYPES[qtype], query, k, TOP_K)
+    stats = searcher.cache.stats()
+    status = f"Result cache: {stats['entries']} entries, {stats['hits']} hits / {stats['misses']} misses"
+    return results, len(results), status, None
+
+
+def _span_rows(trace_dict):
+    return [{"span": name, "calls": s["calls"], "ms": s["ms"], "self ms": s["self_ms"],
+             "counters": ", ".join(f"{c}={n}" for c, n in s["counters"].items())}
+            for name, s in trace_dict["spans"].items()]
+
+
+def show_trace(local, remote=None):
+    # debug panel: where the time went, stage by stage
+    with st.expander("🛠 Query trace", expanded=True):
+        st.caption(f"Total {local['total_ms']:.1f} ms (backend, snippets and rendering)")
+        st.table(_span_rows(local))
+        if remote is not None:
+            st.caption(f"API worker: {remote['total_ms']:.1f} ms")
+            st.table(_span_rows(remote))
+        counters = {**local["counters"], **(remote or {}).get("counters", {})}
+        if counters:
+            st.caption(" · ".join(f"{c}: {n}" for c, n in counters.items()))
+        profile = local["profile"] or (remote or {}).get("profile")
+        if profile:
+            st.markdown("**cProfile (top functions by cumulative time)**")
+            st.code(profile)
 
 # ------------------------- MAIN APP -------------------------
 def main():
     st.set_page_config(page_title="Hybrid Search Engine", layout="wide")
     st.markdown(DARK_CSS, unsafe_allow_html=True)
 
-    if "cache" not in st.session_state:
-        st.session_state.cache = {}
-
     # --- Sidebar with navigation + about info ---
     with st.sidebar:
         st.markdown("### 📂 Navigation")
@@ -306,10 +294,12 @@ scholarly platforms like Google Scholar operate.
 
 
 **Key Features:**
-- Boolean (AND) search  
+- Boolean query language: AND / OR / NOT, parentheses, "phrases", NEAR/k and W/k, planned rarest operand first  
+- Field-aware index: title:word / title:"phrase" queries, BM25F ranking that weights title hits above abstract hits  
 - Phrase search  
-- Proximity search  
-- BM25 ranked retrieval over arXiv-style abstracts  
+- Proximity search (NEAR/k any order, W/k in query order)  
+- BM25F ranked retrieval over arXiv-style titles and abstracts  
+- Free-text top-k retrieval with WAND pruning  
 - Dark scholarly UI inspired by Google Scholar
                 """
             )
@@ -325,15 +315,19 @@ scholarly platforms like Google Scholar operate.
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        qtype = st.selectbox("Query Type", ["Boolean (AND)", "Phrase", "Proximity"])
+        qtype = st.selectbox("Query Type", list(QUERY_TYPES))
     with col2:
         k = st.number_input("Proximity Window (k)", 1, 10, 3)
     with col3:
         st.markdown("<div style='height:8px'></div>", unsafe_allow_html=True)  # pushes button down
     do_search = st.button("🚀 Search", use_container_width=True)
 
-    pos_index, bi_index, idf = load_indexes()
-    docs, cleaned_docs = load_docs()
+    with st.sidebar:
+        debug = st.checkbox("🛠 Debug panel", value=False)
+        profile = debug and st.checkbox("Profile each query (cProfile)", value=False)
+
+    warm = start_warmup()
+    show_warmup(warm)
 
     if do_search:
 
@@ -341,24 +335,48 @@ scholarly platforms like Google Scholar operate.
             st.warning("Please enter a valid query.")
             return
 
-        with st.spinner("🔎 Searching..."):
-            ranked = cached_search(query, qtype, k, pos_index, bi_index, cleaned_docs, idf)
-
-        if not ranked:
-            st.error("No matching documents found.")
-            return
-
-        st.success(f"Found {len(ranked)} results")
-
-        st.markdown("### 📄 Top Results")
-
-        query_tokens = query.lower().split()
-
-        for doc, score in ranked[:10]:
-            raw = docs.get(doc, "")
-            title = doc.replace("_", " ").title()
-            snippet = " ".join(raw.split()[:90]) + "..."
-            snippet_html = highlight_terms(snippet, query_tokens)
+        docs = load_docs()
+
+        # the whole request -- backend, snippets, rendering -- is one trace
+        with trace(query, QUERY_TYPES[qtype], profile=profile and not API_URL) as t:
+            with st.spinner("🔎 Searching..."):
+                try:
+                    ranked, total, status, remote = run_query(query, qtype, k, debug, profile)
+                except QuerySyntaxError as e:
+                    st.error(f"Invalid query: {e}")
+                    return
+            st.sidebar.caption(status)
+            show_results(ranked, total, query, qtype, docs)
+        record(t, ui=True)
+        warm.first_query()
+        if debug:
+            show_trace(t.to_dict(), remote)
+
+
+def show_results(ranked, total, query, qtype, docs):
+    from search_service import TOP_K
+    if not ranked:
+        st.error("No matching documents found.")
+        return
+
+    st.success(f"Found {total} results")
+
+    st.markdown("### 📄 Top Results")
+
+    # best passage per hit, matched tokens highlighted by their stored spans
+    shown = [doc for doc, _ in ranked[:TOP_K]]
+    terms = query_terms(QUERY_TYPES[qtype], query, load_query_analyzer())
+    snippets = {}
+    if docs is not None:
+        snippets = make_snippets(docs.reader, docs, terms, shown, phrase=qtype == "Phrase")
+
+    fields = load_fields()
+    with span("render"):
+        for doc, score in ranked[:TOP_K]:
+            # the stored title field, so the card never reads the abstract
+            fallback = doc.replace("_", " ").title()
+            title = escape(fields.title_of(doc, fallback) if fields is not None else fallback)
+            snippet_html = snippets.get(doc, "")
 
             pdf_link = "#"
 
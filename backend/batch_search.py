@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyzer import DEFAULT
+from query_parser import QuerySyntaxError, parse_query, query_terms
+from search_service import Searcher, INDEX_DIR, QUERY_TYPES, TOP_K
+from segment import PostingsCursor, SegmentReader
+
+# ----------------------------------------
+# BATCH QUERY EXECUTION
+# ----------------------------------------
+# search_batch(queries) replays many queries at once (offline evaluation,
+# saved-search jobs):
+#   - queries are grouped by their most expensive term (highest df), and
+#     a group is cut into chunks, so queries sharing hot posting lists
+#     land in the same chunk
+#   - each chunk runs against a SharedPostings wrapper: the queries' lazy
+#     postings cursors (segment.PostingsCursor) read their blocks through
+#     it, so a block is decoded once and shared by every query in the chunk
+#   - chunks run in this process by default, results yielded per query.
+#     workers > 1 runs chunks on a process pool and yields each chunk when
+#     it finishes. Every worker opens its own Searcher and decodes its own
+#     blocks, so the pool only pays off when there are several cores, the
+#     batch holds thousands of queries and they are expensive (phrase /
+#     proximity over a large index). On a 2k-doc index 4 workers ran
+#     slower than 1, and the first result came after ~0.5 s instead of
+#     ~40 ms; the CLI below prints both for a given index and batch.
+#
+#   python batch_search.py --queries saved.tsv --workers 4
+#   (one query per line, optionally "type<TAB>query"; without a file a
+#   sample is drawn from the corpus)
+
+CHUNK_QUERIES = 64
+
+_searcher = None
+
+
+class SharedPostings:
+    # Reader stand-in for one chunk: memoizes decoded lists and the blocks
+    # its postings cursors decode (a segment's blocks; the live index's
+    # cursors read their own segments directly)
+    def __init__(self, reader):
+        self.reader = reader
+        self._doc_nums = {}
+        self._postings = {}
+        self._positions = {}
+        self._blocks = {}
+        self._position_blocks = {}
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
+
+    def __contains__(self, term):
+        return term in self.reader
+
+    def doc_nums(self, term):
+        lst = self._doc_nums.get(term)
+        if lst is None:
+            lst = self._doc_nums[term] = self.reader.doc_nums(term)
+        return lst
+
+    def postings(self, term):
+        lst = self._postings.get(term)
+        if lst is None:
+            lst = self._postings[term] = self.reader.postings(term)
+        return lst
+
+    def positions(self, term):
+        lst = self._positions.get(term)
+        if lst is None:
+            lst = self._positions[term] = self.reader.positions(term)
+        return lst
+
+    def cursor(self, term):
+        if not isinstance(self.reader, SegmentReader):
+            return self.reader.cursor(term)
+        entry = self.reader.lookup(term)
+        return None if entry is None else PostingsCursor(self, entry)
+
+    def _doc_block(self, entry, skips, b):
+        key = (entry[1], b)
+        block = self._blocks.get(key)
+        if block is None:
+            block = self._blocks[key] = self.reader._doc_block(entry, skips, b)
+        return block
+
+    def _position_block(self, entry, skips, b, n):
+        key = (entry[3], b)
+        gaps = self._position_blocks.get(key)
+        if gaps is None:
+            gaps = self._position_blocks[key] = self.reader._position_block(entry, skips, b, n)
+        return gaps
+
+
+def _terms(qtype, query, analyzer):
+    if qtype == "boolean":
+        try:
+            return query_terms(parse_query(query, analyzer), negated=True)
+        except QuerySyntaxError:
+            return analyzer.analyze(query)
+    return analyzer.analyze(query)
+
+
+def plan_chunks(queries, reader, chunk_size=CHUNK_QUERIES, analyzer=DEFAULT):
+    # -> [[query index, ...], ...] with queries that share their hottest
+    # term kept together
+    def hot_term(i):
+        terms = _terms(*queries[i], analyzer)
+        if not terms:
+            return 0, ""
+        df, term = max((reader.doc_freq(t), t) for t in terms)
+        return -df, term
+
+    order = sorted(range(len(queries)), key=hot_term)
+    return [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+
+def _init_worker(index_dir):
+    global _searcher
+    _searcher = Searcher(index_dir)
+
+
+def _run_chunk(chunk, k, depth):
+    # chunk: [(query index, qtype, query), ...]
+    _searcher.refresh()
+    shared = SharedPostings(_searcher.reader)
+    return [(i, _searcher.execute(qtype, query, k, depth, reader=shared))
+            for i, qtype, query in chunk]
+
+
+def search_batch(queries, index_dir=INDEX_DIR, workers=1, k=3, depth=TOP_K,
+                 chunk_size=CHUNK_QUERIES):
+    # queries: [(qtype, query), ...] or plain strings (ranked)
+    # yields (query index, results) in completion order; see the header
+    # before raising workers (None: one per CPU)
+    queries = [("ranked", q) if isinstance(q, str) else tuple(q) for q in queries]
+    for qtype, _ in queries:
+        if qtype not in QUERY_TYPES:
+            raise ValueError(f"Unknown query type: {qtype!r}")
+
+    searcher = Searcher(index_dir)
+    chunks = [[(i, *queries[i]) for i in c]
+              for c in plan_chunks(queries, searcher.reader, chunk_size, searcher.analyzer)]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        shared = SharedPostings(searcher.reader)
+        for chunk in chunks:
+            for i, qtype, query in chunk:
+                yield i, searcher.execute(qtype, query, k, depth, reader=shared)
+            shared = SharedPostings(searcher.reader)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(index_dir),)) as pool:
+        futures = [pool.submit(_run_chunk, chunk, k, depth) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+# ----------------------------------------
+# CLI: BATCH VS SERIAL THROUGHPUT
+# ----------------------------------------
+def read_queries(path):
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            qtype, sep, query = line.partition("\t")
+            queries.append((qtype, query) if sep else ("ranked", line))
+    return queries
+
+
+def sample_queries(n, seed):
+    from build_index import load_docs
+    _, cleaned_docs = load_docs()
+    rng = random.Random(seed)
+    docs = [t for t in cleaned_docs.values() if len(t) >= 3]
+    queries = []
+    for _ in range(n):
+        tokens = rng.choice(docs)
+        qtype = rng.choice(QUERY_TYPES)
+        length = rng.choice((2, 3))
+        start = rng.randrange(len(tokens) - length + 1)
+        queries.append((qtype, " ".join(tokens[start:start + length])))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch query execution vs the serial loop")
+    parser.add_argument("--queries", help="query file (query or type<TAB>query per line)")
+    parser.add_argument("--sample", type=int, default=2000, help="queries to sample without a file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="also time the batch on this many worker processes (0: CPU count)")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queries = read_queries(args.queries) if args.queries else sample_queries(args.sample, args.seed)
+    n = len(queries)
+
+    searcher = Searcher(args.index_dir)
+    t0 = time.perf_counter()
+    serial = [searcher.execute(qtype, query) for qtype, query in queries]
+    serial_s = time.perf_counter() - t0
+    print(f"serial loop     {n} queries in {serial_s:.2f}s  ({n / serial_s:.0f} q/s)")
+
+    for workers in sorted({1, args.workers or os.cpu_count() or 1}):
+        batch = [None] * n
+        t0 = time.perf_counter()
+        first = None
+        for i, results in search_batch(queries, args.index_dir, workers):
+            if first is None:
+                first = time.perf_counter() - t0
+            batch[i] = results
+        batch_s = time.perf_counter() - t0
+        if batch != serial:
+            sys.exit(f"batch results (workers={workers}) differ from the serial loop")
+        print(f"batch x{workers:<2}        {n} queries in {batch_s:.2f}s  ({n / batch_s:.0f} q/s, "
+              f"{serial_s / batch_s:.2f}x, first result after {first * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
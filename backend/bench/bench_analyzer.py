@@ -0,0 +1,96 @@
+import argparse
+import json
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analyzer import Analyzer
+from build_index import DOCS_PATH
+
+# ----------------------------------------
+# ANALYZER THROUGHPUT
+# ----------------------------------------
+# Tokens per second over the corpus text for the tokenizer build_index.py
+# used before analyzer.py (re.sub + split, reproduced here) and for the
+# shared Analyzer in each configuration the build accepts. The plain
+# analyzer must produce exactly the old tokens; "token MB" is the memory
+# the token lists of the whole corpus hold (interned terms share strings).
+#
+#   python bench/bench_analyzer.py --repeat 3
+
+
+def legacy_tokenize(text):
+    text = text.lower()
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    return [t for t in text.split() if t]
+
+
+def configs():
+    out = [("legacy re.sub", legacy_tokenize),
+           ("analyzer", Analyzer().analyze),
+           ("+ stopwords", Analyzer(stopwords=True).analyze),
+           ("+ stopwords + s-stem", Analyzer(stopwords=True, stem="s").analyze)]
+    try:
+        out.append(("+ stopwords + porter", Analyzer(stopwords=True, stem="porter").analyze))
+    except ValueError:
+        pass   # nltk not installed
+    return out
+
+
+def measure(name, fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    tokens = [fn(text) for text in texts]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n = sum(len(t) for t in tokens)
+    return {"analyzer": name, "tokens": n, "seconds": round(best, 4),
+            "mtok_s": round(n / best / 1e6, 3) if best else 0.0,
+            "token_mb": round(size / 2**20, 2)}, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens/sec of the shared analyzer vs the old tokenizer")
+    parser.add_argument("--docs", default=str(DOCS_PATH))
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes (best is kept)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    texts = []
+    with open(args.docs, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                texts.append(entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", "")))
+
+    report = {"docs": len(texts), "chars": sum(len(t) for t in texts), "results": []}
+    expected = None
+    for name, fn in configs():
+        row, tokens = measure(name, fn, texts, args.repeat)
+        if expected is None:
+            expected = tokens
+        elif name == "analyzer" and tokens != expected:
+            raise AssertionError("the plain analyzer does not match the legacy tokenizer")
+        report["results"].append(row)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['docs']} docs, {report['chars']} chars\n")
+    print(f"  {'analyzer':<24}{'tokens':>12}{'seconds':>10}{'Mtok/s':>9}{'token MB':>10}")
+    for r in report["results"]:
+        print(f"  {r['analyzer']:<24}{r['tokens']:>12}{r['seconds']:>10.4f}{r['mtok_s']:>9.3f}"
+              f"{r['token_mb']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import sys
+import time
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from postings_codec import CODECS, FIELDS
+from ranker import INDEX_DIR
+from segment import SegmentReader
+
+# ----------------------------------------
+# POSTINGS CODECS: BYTES PER POSTING AND DECODE SPEED
+# ----------------------------------------
+# Pulls every term's docs / tfs / positions streams out of the built
+# positional segment (as the gaps the writer feeds the codecs), then for
+# each field and codec:
+#
+#   bytes/value   encoded size over all terms (per-block headers included)
+#   decode M/s    values decoded per second, one term block at a time
+#
+# Every decode is checked against the input. "json-text" is the old
+# positional_index.json representation (decimal absolute values), for
+# reference. Pick a codec per field with build_index.py --docs-codec etc.
+#
+#   python bench/bench_codecs.py --repeat 3
+
+
+def term_streams(reader, min_df):
+    # -> {field: [values per term]}
+    streams = {field: [] for field in FIELDS}
+    for term in reader.terms():
+        if reader.doc_freq(term) < min_df:
+            continue
+        gaps, tfs, pos_gaps = [], [], []
+        prev = 0
+        for d, positions in reader.positions(term):
+            gaps.append(d - prev)
+            prev = d
+            tfs.append(len(positions))
+            pos_gaps.extend(p - q for p, q in zip(positions, [0] + positions[:-1]))
+        streams["docs"].append(gaps)
+        streams["tfs"].append(tfs)
+        streams["positions"].append(pos_gaps)
+    return streams
+
+
+class JsonText:
+    # reference only: what positional_index.json stored
+    name = "json-text"
+
+    def encode(self, values):
+        return json.dumps(list(accumulate(values))).encode("utf-8")
+
+    def decode(self, buf, count):
+        sums = json.loads(buf)
+        return [x - p for x, p in zip(sums, [0] + sums[:-1])]
+
+
+def measure(codec, lists, repeat):
+    blocks = [codec.encode(v) for v in lists]
+    n_values = sum(len(v) for v in lists)
+    for block, values in zip(blocks, lists):
+        if codec.decode(block, len(values)) != values:
+            raise AssertionError(f"{codec.name} does not round-trip")
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for block, values in zip(blocks, lists):
+            codec.decode(block, len(values))
+        best = min(best, time.perf_counter() - t0)
+    size = sum(len(b) for b in blocks)
+    return {"codec": codec.name, "bytes": size,
+            "bytes_per_value": round(size / n_values, 3) if n_values else 0.0,
+            "decode_mvals_s": round(n_values / best / 1e6, 3) if best else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per posting and decode speed per codec")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR / "positional"))
+    parser.add_argument("--min-df", type=int, default=1, help="only terms with at least this df")
+    parser.add_argument("--repeat", type=int, default=3, help="decode passes (best is kept)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    reader = SegmentReader(args.index_dir)
+    streams = term_streams(reader, args.min_df)
+    codecs = [*CODECS.values(), JsonText()]
+    report = {"docs": reader.num_docs, "terms": len(streams["docs"]), "built_with": reader.meta["codecs"],
+              "fields": {}}
+    for field in FIELDS:
+        lists = streams[field]
+        report["fields"][field] = {"values": sum(len(v) for v in lists),
+                                   "results": [measure(c, lists, args.repeat) for c in codecs]}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['docs']} docs, {report['terms']} terms (df >= {args.min_df}), "
+          f"segment built with {report['built_with']}\n")
+    for field, r in report["fields"].items():
+        print(f"{field} ({r['values']} values)")
+        print(f"  {'codec':<12}{'bytes':>12}{'bytes/value':>14}{'decode M/s':>13}")
+        for row in r["results"]:
+            print(f"  {row['codec']:<12}{row['bytes']:>12}{row['bytes_per_value']:>14.3f}"
+                  f"{row['decode_mvals_s']:>13.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
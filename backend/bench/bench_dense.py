@@ -0,0 +1,99 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from build_index import load_docs
+from dense import load_dense_index
+from ranker import INDEX_DIR, load_index
+
+# ----------------------------------------
+# DENSE LEG: IVF RECALL@K AND LATENCY VS BRUTE FORCE
+# ----------------------------------------
+# Queries are short spans of real abstracts, embedded once. Brute-force
+# cosine over every float32 vector is the ground truth; each IVF setting
+# (nprobe, float32 or int8 vectors) is scored by recall@k against it.
+#
+#   python build_index.py --dense
+#   python bench/bench_dense.py --queries 300 --k 10 --nprobe 1 4 8 16
+
+
+def sample_queries(n, seed):
+    _, cleaned_docs = load_docs()
+    rng = random.Random(seed)
+    docs = [t for t in cleaned_docs.values() if len(t) >= 8]
+    queries = []
+    for _ in range(n):
+        tokens = rng.choice(docs)
+        length = rng.randint(3, 8)
+        start = rng.randrange(len(tokens) - length + 1)
+        queries.append(" ".join(tokens[start:start + length]))
+    return queries
+
+
+def timed(fn, vectors):
+    out, lat = [], []
+    for v in vectors:
+        t0 = time.perf_counter()
+        out.append(fn(v))
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return out, {"mean_ms": round(statistics.fmean(lat), 3),
+                 "p50_ms": round(lat[len(lat) // 2], 3),
+                 "p95_ms": round(lat[int(len(lat) * 0.95)], 3)}
+
+
+def recall(results, truth):
+    hits = total = 0
+    for got, want in zip(results, truth):
+        want = {d for d, _ in want}
+        hits += len(want & {d for d, _ in got})
+        total += len(want)
+    return round(hits / total, 4) if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall@k and latency vs brute-force cosine")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    reader, idf = load_index()
+    dense = load_dense_index(INDEX_DIR / "dense", reader, idf)
+    if dense is None:
+        sys.exit("No dense index in output/; run build_index.py --dense")
+    vectors = [dense.embed_query(q) for q in sample_queries(args.queries, args.seed)]
+    k = args.k
+
+    truth, t_brute = timed(lambda v: dense.brute_force(v, k), vectors)
+    rows = [{"setup": "brute float32", "recall": 1.0, **t_brute}]
+    brute_i8, t = timed(lambda v: dense.brute_force(v, k, quantized=True), vectors)
+    rows.append({"setup": "brute int8", "recall": recall(brute_i8, truth), **t})
+    for nprobe in args.nprobe:
+        for quantized in (False, True):
+            got, t = timed(lambda v: dense.search_vector(v, k, nprobe, quantized), vectors)
+            name = f"ivf nprobe={nprobe} {'int8' if quantized else 'float32'}"
+            rows.append({"setup": name, "recall": recall(got, truth), **t})
+
+    report = {"docs": reader.num_docs, "nlist": dense.meta["nlist"], "embedder": dense.embedder,
+              "queries": len(vectors), "k": k, "results": rows}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['docs']} docs, nlist={report['nlist']}, {report['embedder']}, "
+          f"{report['queries']} queries, recall@{k} vs brute-force cosine\n")
+    print(f"{'setup':<26}{'recall':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in rows:
+        print(f"{r['setup']:<26}{r['recall']:>8.3f}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ranker import bm25_score
+from search_service import INDEX_DIR, Searcher
+from topk import top_k
+
+# ----------------------------------------
+# IMPACT-ORDERED SCORE-AT-A-TIME VS WAND VS EXHAUSTIVE
+# ----------------------------------------
+# Top-k latency (mean / p50 / p95 / p99) over two query sets:
+#
+#   common   1-2 of the most frequent terms ("model", "learning" ...), the
+#            UI's worst case: every candidate has to be scored without
+#            early termination
+#   mixed    1-4 terms drawn by df, as in bench_matrix.py
+#
+# and four engines: exhaustive BM25 (the matrix when built, else Python),
+# WAND (topk.py), impact SAAT alone (8-bit scores) and impact SAAT plus
+# the exact rescoring Searcher does. "scored" is the fraction of the
+# query terms' postings SAAT read before the top k was settled; results
+# are checked against the exhaustive ranking.
+#
+#   python build_index.py --impacts
+#   python bench/bench_impact.py --queries 500 --k 10
+
+
+def query_sets(reader, n, seed):
+    rng = random.Random(seed)
+    by_df = sorted(reader.terms(), key=lambda t: -reader.doc_freq(t))
+    common = by_df[:50]
+    terms = [t for t in by_df if reader.doc_freq(t) >= 2]
+    weights = [reader.doc_freq(t) for t in terms]
+    return {
+        "common": [rng.sample(common, rng.randint(1, 2)) for _ in range(n)],
+        "mixed": [rng.choices(terms, weights, k=rng.randint(1, 4)) for _ in range(n)],
+    }
+
+
+def timed(fn, queries):
+    out, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        out.append(fn(q))
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return out, {"mean_ms": round(statistics.fmean(lat), 3),
+                 "p50_ms": round(lat[len(lat) // 2], 3),
+                 "p95_ms": round(lat[int(len(lat) * 0.95)], 3),
+                 "p99_ms": round(lat[int(len(lat) * 0.99)], 3)}
+
+
+def overlap(results, truth):
+    hits = total = 0
+    for got, want in zip(results, truth):
+        want = {d for d, _ in want}
+        hits += len(want & {d for d, _ in got})
+        total += len(want)
+    return round(hits / total, 4) if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Impact-ordered SAAT vs WAND vs exhaustive top-k")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    searcher = Searcher(INDEX_DIR)
+    reader, idf, impacts, matrix = searcher.reader, searcher.idf, searcher.impacts, searcher.matrix
+    if impacts is None:
+        sys.exit("No impact index in output/; run build_index.py --impacts")
+    k = args.k
+    if matrix is not None:
+        exhaustive = lambda q: matrix.top_k(q, k)
+    else:
+        exhaustive = lambda q: bm25_score(q, reader, idf)[:k]
+
+    report = {"docs": reader.num_docs, "tiers": impacts.meta["num_tiers"], "k": k, "sets": {}}
+    for name, queries in query_sets(reader, args.queries, args.seed).items():
+        truth, t_exh = timed(exhaustive, queries)
+        wand, t_wand = timed(lambda q: top_k(q, reader, idf, k), queries)
+        approx, t_saat = timed(lambda q: impacts.top_k(q, k), queries)
+        exact, t_exact = timed(lambda q: searcher.impact_top(q, k), queries)
+        scored = sum(impacts.saat(q, k)[1] for q in queries)
+        postings = sum(reader.doc_freq(t) for q in queries for t in Counter(q))
+        report["sets"][name] = {
+            "queries": len(queries),
+            "scored": round(scored / postings, 4) if postings else 0.0,
+            "engines": [
+                {"engine": "exhaustive", **t_exh, "overlap": 1.0},
+                {"engine": "wand", **t_wand, "overlap": overlap(wand, truth)},
+                {"engine": "saat 8-bit", **t_saat, "overlap": overlap(approx, truth)},
+                {"engine": "saat + rescore", **t_exact, "overlap": overlap(exact, truth),
+                 "mismatches": sum(a != b for a, b in zip(exact, truth))},
+            ],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['docs']} docs, {report['tiers']} impact tiers, top-{k}\n")
+    for name, r in report["sets"].items():
+        print(f"{name} ({r['queries']} queries, SAAT scored {r['scored']:.1%} of postings)")
+        print(f"  {'engine':<16}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'overlap':>9}")
+        for e in r["engines"]:
+            print(f"  {e['engine']:<16}{e['mean_ms']:>9.3f}{e['p50_ms']:>9.3f}{e['p95_ms']:>9.3f}"
+                  f"{e['p99_ms']:>9.3f}{e['overlap']:>9.3f}")
+        print(f"  saat + rescore vs exhaustive: {r['engines'][-1]['mismatches']} mismatches\n")
+
+
+if __name__ == "__main__":
+    main()
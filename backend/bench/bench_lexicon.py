@@ -0,0 +1,129 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from query_engine import and_terms, intersect
+from ranker import INDEX_DIR
+from segment import ENTRY, SegmentReader
+
+# ----------------------------------------
+# LEXICON AND INTEGER POSTINGS
+# ----------------------------------------
+# What the term-id lexicon and array('I') postings cost against the
+# representations they replaced:
+#
+#   lexicon      on-disk bytes of the front-coded dictionary vs one
+#                u16 len + term + ENTRY record (and u32 offset) per term;
+#                term -> id microseconds, cold (fresh reader) and cached
+#   doc lists    memory of every query term's doc list held as array('I')
+#                vs a list of Python ints, and the time to decode them
+#   AND          multi-term AND queries over both, with identical results
+#
+#   python bench/bench_lexicon.py --queries 500
+
+
+def lexicon_sizes(reader):
+    terms = list(reader.terms())
+    flat = sum(2 + len(t.encode("utf-8")) + ENTRY.size + 4 for t in terms)
+    files = ("terms.bin", "terms.idx", "entries.bin")
+    front = sum((reader.path / f).stat().st_size for f in files)
+    strings = sum(len(t.encode("utf-8")) for t in terms)
+    return terms, {"terms": len(terms), "term_bytes": strings, "flat_bytes": flat, "front_coded_bytes": front}
+
+
+def lookup_us(path, terms, rng):
+    sample = rng.sample(terms, min(len(terms), 5000))
+    reader = SegmentReader(path)
+    t0 = time.perf_counter()
+    for t in sample:
+        reader.term_id(t)
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for t in sample:
+        reader.term_id(t)
+    warm = time.perf_counter() - t0
+    return {"cold_us": round(cold / len(sample) * 1e6, 3), "cached_us": round(warm / len(sample) * 1e6, 3)}
+
+
+def legacy_doc_list(reader, term):
+    # the old query_engine.doc_list: decode (doc, tf) pairs, keep the docs
+    return [d for d, _ in reader.postings(term)]
+
+
+def held(fn, terms):
+    # -> (seconds, bytes) to decode and hold one doc list per term
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    lists = [fn(t) for t in terms]
+    seconds = time.perf_counter() - t0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return lists, seconds, size
+
+
+def legacy_and(reader, terms):
+    lists = sorted((legacy_doc_list(reader, t) for t in dict.fromkeys(terms)), key=len)
+    result = lists[0]
+    for p in lists[1:]:
+        result = intersect(result, p)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Front-coded lexicon and array('I') postings vs the old layout")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR / "positional"))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reader = SegmentReader(args.index_dir)
+    terms, lexicon = lexicon_sizes(reader)
+    report = {"docs": reader.num_docs, "lexicon": {**lexicon, **lookup_us(args.index_dir, terms, rng)}}
+
+    by_df = [t for t in terms if reader.doc_freq(t) >= 2]
+    weights = [reader.doc_freq(t) for t in by_df]
+    queries = [rng.choices(by_df, weights, k=rng.randint(2, 4)) for _ in range(args.queries)]
+    query_terms = list(dict.fromkeys(t for q in queries for t in q))
+
+    fresh = SegmentReader(args.index_dir)
+    _, t_list, b_list = held(lambda t: legacy_doc_list(fresh, t), query_terms)
+    _, t_arr, b_arr = held(fresh.doc_nums, query_terms)
+    postings = sum(reader.doc_freq(t) for t in query_terms)
+    report["doc_lists"] = {"terms": len(query_terms), "postings": postings,
+                           "list_bytes": b_list, "array_bytes": b_arr,
+                           "list_ms": round(t_list * 1000, 2), "array_ms": round(t_arr * 1000, 2)}
+
+    t0 = time.perf_counter()
+    old = [legacy_and(reader, q) for q in queries]
+    t_old = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = [and_terms(reader, q) for q in queries]
+    t_new = time.perf_counter() - t0
+    if [list(r) for r in new] != [list(r) for r in old]:
+        raise AssertionError("array('I') AND results differ from the list ones")
+    report["and"] = {"queries": len(queries), "list_ms": round(t_old * 1000 / len(queries), 3),
+                     "array_ms": round(t_new * 1000 / len(queries), 3)}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    lx, dl, q = report["lexicon"], report["doc_lists"], report["and"]
+    print(f"{report['docs']} docs, {lx['terms']} terms ({lx['term_bytes']} bytes of term text)\n")
+    print(f"lexicon   flat records {lx['flat_bytes']} B -> front-coded + entries {lx['front_coded_bytes']} B")
+    print(f"          term -> id {lx['cold_us']:.2f} us cold, {lx['cached_us']:.2f} us cached")
+    print(f"doc lists {dl['terms']} terms / {dl['postings']} postings: "
+          f"list[int] {dl['list_bytes']} B in {dl['list_ms']:.1f} ms, "
+          f"array('I') {dl['array_bytes']} B in {dl['array_ms']:.1f} ms")
+    print(f"AND       {q['queries']} queries: list {q['list_ms']:.3f} ms/query, array {q['array_ms']:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
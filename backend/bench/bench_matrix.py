@@ -0,0 +1,100 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from matrix import load_matrix
+from ranker import INDEX_DIR, load_index, bm25_score, tfidf_score
+from topk import top_k
+
+# ----------------------------------------
+# EXHAUSTIVE (NUMPY) VS PURE-PYTHON VS WAND
+# ----------------------------------------
+# Times top-10 retrieval three ways over the built index and checks that
+# the pruned WAND results match the exhaustive NumPy reference:
+#
+#   python            ranker.bm25_score / tfidf_score over every posting
+#   numpy             matrix.TermDocMatrix.top_k (CSR slices + argpartition)
+#   wand              topk.top_k
+#
+# Scores are compared rounded; a mismatch is reported per query.
+#
+#   python bench/bench_matrix.py --queries 500
+
+
+def sample_queries(reader, n, seed):
+    # 1-4 terms, biased towards frequent ones (the slow case for pruning)
+    rng = random.Random(seed)
+    terms = [t for t in reader.terms() if reader.doc_freq(t) >= 2]
+    weights = [reader.doc_freq(t) for t in terms]
+    return [rng.choices(terms, weights, k=rng.randint(1, 4)) for _ in range(n)]
+
+
+def timed(fn, queries):
+    out, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        out.append(fn(q))
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return out, {"mean_ms": round(statistics.fmean(lat), 3),
+                 "p50_ms": round(lat[len(lat) // 2], 3),
+                 "p95_ms": round(lat[int(len(lat) * 0.95)], 3)}
+
+
+def same_ranking(a, b):
+    # equal scores may legitimately swap docs; compare the score lists and
+    # the doc sets above the last (possibly tied) score
+    if [s for _, s in a] != [s for _, s in b]:
+        return False
+    cut = a[-1][1] if a else None
+    return {d for d, s in a if s != cut} == {d for d, s in b if s != cut}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy exhaustive scoring vs pure Python vs WAND")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    reader, idf = load_index()
+    matrix = load_matrix(INDEX_DIR / "matrix", reader)
+    if matrix is None:
+        sys.exit("No matrix in output/; run build_index.py without --no-matrix")
+    queries = sample_queries(reader, args.queries, args.seed)
+    k = args.k
+
+    report = {"queries": len(queries), "k": k}
+    for scoring, exhaustive in (("bm25", bm25_score), ("tfidf", tfidf_score)):
+        python, t_py = timed(lambda q: exhaustive(q, reader, idf)[:k], queries)
+        numpy_, t_np = timed(lambda q: matrix.top_k(q, k, scoring), queries)
+        wand, t_wand = timed(lambda q: top_k(q, reader, idf, k, scoring), queries)
+        report[scoring] = {
+            "python": t_py, "numpy": t_np, "wand": t_wand,
+            "numpy_vs_python_mismatches": sum(not same_ranking(a, b) for a, b in zip(numpy_, python)),
+            "wand_vs_numpy_mismatches": sum(not same_ranking(a, b) for a, b in zip(wand, numpy_)),
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['queries']} queries, top-{k}\n")
+    for scoring in ("bm25", "tfidf"):
+        r = report[scoring]
+        print(f"{scoring:<6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name in ("python", "numpy", "wand"):
+            t = r[name]
+            print(f"  {name:<6}{t['mean_ms']:>8.3f}{t['p50_ms']:>10.3f}{t['p95_ms']:>10.3f}")
+        print(f"  mismatches: numpy vs python {r['numpy_vs_python_mismatches']}, "
+              f"wand vs numpy {r['wand_vs_numpy_mismatches']}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from build_index import DOCS_PATH, load_docs, build_indexes
+from phrase import prune_ngrams, phrase_search
+from segment import SegmentReader, write_segment
+
+# ----------------------------------------
+# PHRASE INDEX: SIZE VS LATENCY
+# ----------------------------------------
+# Builds the positional segment once, then a pruned word-pair index for each
+# --min-df value, and times the same sampled phrases against every setup.
+# Results are checked against positional-only so a faster setup can never
+# be a wrong one.
+#
+#   python bench/bench_phrase.py --queries 500 --min-df 1 5 20 50
+
+
+def dir_size(path):
+    return sum(f.stat().st_size for f in Path(path).iterdir())
+
+
+def sample_phrases(cleaned_docs, n, seed):
+    # real 2- and 3-word spans from the corpus, so every phrase has a hit
+    rng = random.Random(seed)
+    docs = [t for t in cleaned_docs.values() if len(t) >= 3]
+    phrases = []
+    while len(phrases) < n:
+        tokens = rng.choice(docs)
+        length = rng.choice((2, 3))
+        start = rng.randrange(len(tokens) - length + 1)
+        phrases.append(tokens[start:start + length])
+    return phrases
+
+
+def time_phrases(reader, phrases, ngram):
+    latencies = []
+    results = []
+    for tokens in phrases:
+        t0 = time.perf_counter()
+        results.append(phrase_search(reader, tokens, ngram))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return results, {
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phrase index size vs latency")
+    parser.add_argument("--input", default=str(DOCS_PATH))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--min-df", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    _, cleaned_docs = load_docs(args.input)
+    doc_ids = sorted(cleaned_docs)
+    doc_lens = [len(cleaned_docs[d]) for d in doc_ids]
+    positional, biword = build_indexes(cleaned_docs, doc_ids)
+    phrases = sample_phrases(cleaned_docs, args.queries, args.seed)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        write_segment(os.path.join(tmp, "positional"), doc_ids, positional)
+        reader = SegmentReader(os.path.join(tmp, "positional"))
+        pos_size = dir_size(reader.path)
+
+        expected, timing = time_phrases(reader, phrases, None)
+        rows.append({"setup": "positional", "min_df": None, "extra_bytes": 0,
+                     "total_bytes": pos_size, **timing})
+
+        for min_df in args.min_df:
+            path = os.path.join(tmp, f"ngram_{min_df}")
+            write_segment(path, doc_ids, prune_ngrams(biword, min_df),
+                          with_positions=False, doc_lens=doc_lens)
+            ngram = SegmentReader(path)
+            results, timing = time_phrases(reader, phrases, ngram)
+            if results != expected:
+                raise SystemExit(f"ngram min_df={min_df} disagrees with positional-only results")
+            extra = dir_size(path)
+            rows.append({"setup": "ngram", "min_df": min_df, "pairs": ngram.num_terms,
+                         "extra_bytes": extra, "total_bytes": pos_size + extra, **timing})
+
+    if args.json:
+        print(json.dumps({"docs": len(doc_ids), "queries": len(phrases), "results": rows}, indent=2))
+        return
+
+    print(f"{len(doc_ids)} docs, {len(phrases)} phrases (2-3 words)\n")
+    print(f"{'setup':<16}{'extra KB':>10}{'total KB':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in rows:
+        name = r["setup"] if r["min_df"] is None else f"ngram df>={r['min_df']}"
+        print(f"{name:<16}{r['extra_bytes'] / 1024:>10.0f}{r['total_bytes'] / 1024:>10.0f}"
+              f"{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
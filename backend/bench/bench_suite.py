@@ -0,0 +1,420 @@
+import argparse
+import contextlib
+import json
+import math
+import platform
+import random
+import resource
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analyzer import DEFAULT
+from build_index import DOCS_PATH, OUT_DIR
+
+# ----------------------------------------
+# RETRIEVAL BENCHMARK SUITE
+# ----------------------------------------
+# One reproducible run over the real corpus (docs_2000.jsonl) and
+# synthetic scaled-up corpora drawn from its unigram distribution and
+# doc-length distribution (seeded, so the same size is the same corpus on
+# every machine). For every corpus:
+#
+#   build      build_index.py in a child process: wall time, peak RSS
+#   size       bytes of the whole index directory
+#   cold load  a fresh process opening the index (Searcher) and answering
+#              its first query; the OS page cache may still be warm
+#   replay     a seeded query log per type -- boolean, phrase, proximity,
+#              ranked -- sampled from the corpus itself so queries hit:
+#              p50 / p95 / p99 / mean latency, QPS, peak RSS of the process
+#   relevance  nDCG@10 and MRR@10 of ranked (and hybrid, when the dense
+#              index is built) against bench/judged_2000.json, a small
+#              hand-judged set of known-item queries; real corpus only
+#
+# Results go to JSON (--out). --baseline compares against a stored run
+# and flags metrics that got worse by more than --tolerance (relevance by
+# more than RELEVANCE_TOLERANCE absolute); --save-baseline stores this run.
+#
+#   python bench/bench_suite.py                          real + 10k
+#   python bench/bench_suite.py --sizes 10000 100000 1000000 --build-args="--workers 4"
+#   python bench/bench_suite.py --baseline bench/baseline.json --fail-on-regression
+
+BENCH_DIR = Path(__file__).resolve().parent
+WORK_DIR = OUT_DIR / "bench"
+JUDGED_PATH = BENCH_DIR / "judged_2000.json"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+REAL = "docs_2000"
+LOG_TYPES = ("boolean", "phrase", "proximity", "ranked")
+PROXIMITY_K = 5
+SAMPLE_DOCS = 2000        # docs the query logs are drawn from
+RELEVANCE_TOLERANCE = 0.01
+# metric -> +1 when higher is worse, -1 when lower is worse
+DIRECTIONS = {"build_s": 1, "index_mb": 1, "build_rss_mb": 1, "load_ms": 1, "first_query_ms": 1,
+              "p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "mean_ms": 1, "qps": -1, "peak_rss_mb": 1,
+              "ndcg@10": -1, "mrr@10": -1}
+
+
+def peak_rss_mb(children=False):
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(usage.ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def dir_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def read_texts(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
+
+
+def corpus_label(size):
+    return REAL if size is None else f"syn_{size // 1000}k" if size < 10**6 else f"syn_{size // 10**6}m"
+
+
+# ----------------------------------------
+# SYNTHETIC CORPORA
+# ----------------------------------------
+def synthesize(src, n_docs, out_path, seed):
+    # unigram draws from src's term distribution, lengths from its doc lengths
+    counts = Counter()
+    lengths = []
+    for text in read_texts(src):
+        tokens = DEFAULT.analyze(text)
+        counts.update(tokens)
+        lengths.append(len(tokens))
+    vocab = list(counts)
+    cum = list(accumulate(counts[t] for t in vocab))
+    rng = random.Random(seed)
+    tmp = out_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for i in range(n_docs):
+            tokens = rng.choices(vocab, cum_weights=cum, k=max(1, rng.choice(lengths)))
+            f.write(json.dumps({"id": f"syn_{i:07d}", "text": " ".join(tokens)}) + "\n")
+    tmp.replace(out_path)   # only a complete corpus is ever reused
+
+
+def corpus_path(size, work_dir, seed):
+    if size is None:
+        return DOCS_PATH
+    path = work_dir / "corpora" / f"synthetic_{size}_{seed}.jsonl"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Generating {size} synthetic docs -> {path}", file=sys.stderr)
+        synthesize(DOCS_PATH, size, path, seed)
+    return path
+
+
+# ----------------------------------------
+# QUERY LOGS
+# ----------------------------------------
+def sample_docs(path, n, rng):
+    # reservoir sample of n analyzed docs, so a 1M-doc corpus is not loaded
+    sample = []
+    for i, text in enumerate(read_texts(path)):
+        if i < n:
+            sample.append(text)
+        else:
+            j = rng.randrange(i + 1)
+            if j < n:
+                sample[j] = text
+    return [t for t in map(DEFAULT.analyze, sample) if len(t) >= 3]
+
+
+def make_query_log(corpus, n, seed):
+    # -> [{"type", "query", "k"}] with n queries per type
+    rng = random.Random(seed)
+    docs = sample_docs(corpus, SAMPLE_DOCS, rng)
+    log = []
+    for qtype in LOG_TYPES:
+        for _ in range(n):
+            tokens = rng.choice(docs)
+            if qtype == "ranked":
+                length = rng.choice((1, 2, 3))
+                start = rng.randrange(len(tokens) - length + 1)
+                query = " ".join(tokens[start:start + length])
+            elif qtype == "phrase":
+                length = rng.choice((2, 3))
+                start = rng.randrange(len(tokens) - length + 1)
+                query = " ".join(tokens[start:start + length])
+            elif qtype == "proximity":
+                i = rng.randrange(len(tokens) - 1)
+                j = min(len(tokens) - 1, i + rng.randint(1, PROXIMITY_K))
+                query = f"{tokens[i]} {tokens[j]}"
+            else:
+                a, b = rng.sample(tokens, 2)
+                op = rng.choice(("AND", "AND", "OR", "NOT"))
+                if op == "NOT":
+                    b = rng.choice(rng.choice(docs))
+                query = f"{a} {op} {b}"
+            log.append({"type": qtype, "query": query, "k": PROXIMITY_K})
+    return log
+
+
+def load_query_log(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ----------------------------------------
+# METRICS
+# ----------------------------------------
+def latency_stats(latencies):
+    lat = sorted(latencies)
+    n = len(lat)
+    total = sum(lat)
+    return {"queries": n,
+            "mean_ms": round(statistics.fmean(lat), 3),
+            "p50_ms": round(lat[n // 2], 3),
+            "p95_ms": round(lat[min(n - 1, int(n * 0.95))], 3),
+            "p99_ms": round(lat[min(n - 1, int(n * 0.99))], 3),
+            "qps": round(n / total * 1000, 1) if total else 0.0}
+
+
+def ndcg(ranked, relevant, k=10):
+    dcg = sum((2 ** relevant.get(d, 0) - 1) / math.log2(i + 2) for i, d in enumerate(ranked[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def reciprocal_rank(ranked, relevant, k=10):
+    for i, d in enumerate(ranked[:k]):
+        if relevant.get(d, 0) > 0:
+            return 1 / (i + 1)
+    return 0.0
+
+
+def relevance(searcher, judged, qtype):
+    scores_ndcg, scores_rr = [], []
+    for j in judged:
+        ranked = [d for d, _ in searcher.execute(qtype, j["query"], depth=10)]
+        scores_ndcg.append(ndcg(ranked, j["relevant"]))
+        scores_rr.append(reciprocal_rank(ranked, j["relevant"]))
+    return {"queries": len(judged), "ndcg@10": round(statistics.fmean(scores_ndcg), 4),
+            "mrr@10": round(statistics.fmean(scores_rr), 4)}
+
+
+# ----------------------------------------
+# CHILD PROCESSES (one per phase, so each peak RSS is its own)
+# ----------------------------------------
+def child_build(args):
+    import build_index
+    argv = ["--input", args.corpus, "--out-dir", args.index_dir, *shlex.split(args.build_args)]
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        build_index.main(argv)
+    seconds = time.perf_counter() - t0
+    rss = max(peak_rss_mb(), peak_rss_mb(children=True))   # --workers builds fork
+    print(json.dumps({"build_s": round(seconds, 3), "build_rss_mb": rss}))
+
+
+def child_replay(args):
+    from search_service import Searcher
+    log = load_query_log(args.log)
+    t0 = time.perf_counter()
+    searcher = Searcher(args.index_dir)
+    load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    searcher.execute("ranked", log[0]["query"] if log else "")
+    first = time.perf_counter() - t0
+    report = {"load_ms": round(load * 1000, 2), "first_query_ms": round(first * 1000, 2), "types": {}}
+
+    by_type = {}
+    for entry in log:
+        by_type.setdefault(entry["type"], []).append(entry)
+    for qtype, entries in by_type.items():
+        latencies, hits = [], 0
+        for entry in entries:
+            t0 = time.perf_counter()
+            results = searcher.execute(qtype, entry["query"], entry.get("k", PROXIMITY_K))
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += bool(results)
+        report["types"][qtype] = {**latency_stats(latencies), "with_hits": round(hits / len(entries), 4)}
+
+    if args.judged:
+        with open(args.judged, "r", encoding="utf-8") as f:
+            judged = json.load(f)
+        report["relevance"] = {"ranked": relevance(searcher, judged, "ranked")}
+        if searcher.dense is not None:
+            report["relevance"]["hybrid"] = relevance(searcher, judged, "hybrid")
+    report["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(report))
+
+
+def run_child(*argv):
+    # -> the JSON the child prints last; its progress goes to our stderr
+    proc = subprocess.run([sys.executable, __file__, *argv], stdout=subprocess.PIPE, text=True)
+    if proc.returncode:
+        sys.exit(f"bench child {argv[0]} failed (exit {proc.returncode})")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# ----------------------------------------
+# BASELINE COMPARISON
+# ----------------------------------------
+def flatten(results):
+    # -> {(corpus, scope, metric): value} for every comparable metric
+    out = {}
+    for corpus, r in results["corpora"].items():
+        for metric in ("build_s", "index_mb", "build_rss_mb", "load_ms", "first_query_ms", "peak_rss_mb"):
+            out[corpus, "", metric] = r[metric]
+        for qtype, t in r["types"].items():
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "mean_ms", "qps"):
+                out[corpus, qtype, metric] = t[metric]
+        for qtype, rel in r.get("relevance", {}).items():
+            for metric in ("ndcg@10", "mrr@10"):
+                out[corpus, qtype, metric] = rel[metric]
+    return out
+
+
+def compare(results, baseline, tolerance):
+    # -> [(corpus, scope, metric, baseline, current, change, regressed)]
+    rows = []
+    base = flatten(baseline)
+    for key, value in flatten(results).items():
+        if key not in base:
+            continue
+        old = base[key]
+        worse = DIRECTIONS[key[2]] * (value - old)
+        if key[2] in ("ndcg@10", "mrr@10"):
+            regressed = worse > RELEVANCE_TOLERANCE
+        else:
+            regressed = old > 0 and worse / old > tolerance
+        change = (value - old) / old if old else 0.0
+        rows.append((*key, old, value, change, regressed))
+    return rows
+
+
+def print_report(results):
+    for corpus, r in results["corpora"].items():
+        print(f"\n{corpus}: {r['docs']} docs, build {r['build_s']:.1f} s ({r['build_rss_mb']:.0f} MB peak), "
+              f"index {r['index_mb']:.1f} MB, cold load {r['load_ms']:.0f} ms + first query "
+              f"{r['first_query_ms']:.1f} ms, replay peak RSS {r['peak_rss_mb']:.0f} MB")
+        print(f"  {'type':<12}{'queries':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'QPS':>9}{'hits':>7}")
+        for qtype, t in r["types"].items():
+            print(f"  {qtype:<12}{t['queries']:>8}{t['p50_ms']:>9.3f}{t['p95_ms']:>9.3f}{t['p99_ms']:>9.3f}"
+                  f"{t['qps']:>9.0f}{t['with_hits']:>7.0%}")
+        for qtype, rel in r.get("relevance", {}).items():
+            print(f"  relevance {qtype}: nDCG@10 {rel['ndcg@10']:.4f}  MRR@10 {rel['mrr@10']:.4f} "
+                  f"({rel['queries']} judged queries)")
+
+
+def print_comparison(rows):
+    print(f"\n  {'corpus':<10}{'type':<11}{'metric':<15}{'baseline':>11}{'current':>11}{'change':>9}")
+    for corpus, scope, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSED" if regressed else ""
+        print(f"  {corpus:<10}{scope:<11}{metric:<15}{old:>11.3f}{new:>11.3f}{change:>+9.1%}{flag}")
+
+
+# ----------------------------------------
+# MAIN
+# ----------------------------------------
+def run(args):
+    work_dir = Path(args.work_dir)
+    sizes = ([] if args.no_real else [None]) + args.sizes
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                        "queries_per_type": args.queries, "seed": args.seed,
+                        "build_args": args.build_args, "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+               "corpora": {}}
+    for size in sizes:
+        label = corpus_label(size)
+        corpus = corpus_path(size, work_dir, args.seed)
+        index_dir = work_dir / "indexes" / label
+        print(f"[{label}] building {index_dir} ...", file=sys.stderr)
+        build = run_child("build", "--corpus", str(corpus), "--index-dir", str(index_dir),
+                          "--build-args", args.build_args)
+
+        log_path = Path(args.query_log) if args.query_log else work_dir / "logs" / f"{label}.jsonl"
+        if not args.query_log:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(log_path, "w", encoding="utf-8") as f:
+                for entry in make_query_log(corpus, args.queries, args.seed):
+                    f.write(json.dumps(entry) + "\n")
+        print(f"[{label}] replaying {log_path} ...", file=sys.stderr)
+        replay_args = ["replay", "--index-dir", str(index_dir), "--log", str(log_path)]
+        if size is None:
+            replay_args += ["--judged", str(JUDGED_PATH)]
+        replay = run_child(*replay_args)
+
+        with open(index_dir / "positional" / "meta.json", "r", encoding="utf-8") as f:
+            docs = json.load(f)["num_docs"]
+        results["corpora"][label] = {"docs": docs, **build,
+                                     "index_mb": round(dir_size(index_dir) / 2**20, 2), **replay}
+
+    out = Path(args.out) if args.out else work_dir / "results.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+        print(f"\nResults written to {out}")
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance)
+        print_comparison(rows)
+        regressed = [r for r in rows if r[-1]]
+        print(f"\n{len(regressed)} of {len(rows)} metrics regressed beyond tolerance")
+        if regressed and args.fail_on_regression:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, replay and judge the search engine at several scales")
+    sub = parser.add_subparsers(dest="command")
+
+    build = sub.add_parser("build", help=argparse.SUPPRESS)
+    build.add_argument("--corpus", required=True)
+    build.add_argument("--index-dir", required=True)
+    build.add_argument("--build-args", default="")
+    replay = sub.add_parser("replay", help=argparse.SUPPRESS)
+    replay.add_argument("--index-dir", required=True)
+    replay.add_argument("--log", required=True)
+    replay.add_argument("--judged")
+
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000],
+                        help="synthetic corpus sizes in docs (e.g. 10000 100000 1000000)")
+    parser.add_argument("--no-real", action="store_true", help=f"skip the real {REAL} corpus")
+    parser.add_argument("--queries", type=int, default=200, help="queries per type in each log")
+    parser.add_argument("--query-log", help="replay this JSONL log ({type, query, k}) instead")
+    parser.add_argument("--build-args", default="", help="extra build_index.py flags, e.g. \"--workers 4\"")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--work-dir", default=str(WORK_DIR), help="corpora, indexes, logs and results")
+    parser.add_argument("--out", help="results JSON (default: WORK_DIR/results.json)")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative change that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write {BASELINE_PATH.name}")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        child_build(args)
+    elif args.command == "replay":
+        child_replay(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from warmup import HOT_TERMS, INDEX_DIR
+
+# ----------------------------------------
+# COLD START
+# ----------------------------------------
+# Time-to-first-query of a fresh process with and without warm-up
+# (warmup.py), each run in its own child process so imports, lazy reader
+# state and the first-call paths start cold every time (the OS page cache
+# may stay warm between runs). Per mode, medians over --repeat runs of:
+#
+#   ready ms      process start -> index open (and warmed)
+#   first query   latency of the first user query of every type, over
+#                 terms just outside the warmed hot set
+#   ttfq ms       process start -> those queries answered
+#
+#   python bench/bench_warmup.py --repeat 5
+#   python bench/bench_warmup.py --hot-terms 1024 --json
+
+WARMUP = Path(__file__).resolve().parent.parent / "warmup.py"
+
+
+def run_once(index_dir, hot_terms, warm):
+    argv = [sys.executable, str(WARMUP), "--json", "--index-dir", index_dir, "--hot-terms", str(hot_terms)]
+    if not warm:
+        argv.append("--no-warm")
+    proc = subprocess.run(argv, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def summarize(runs):
+    t = [r["timings"] for r in runs]
+    firsts = [r["first_queries"]["ms"] for r in runs]
+    return {
+        "runs": len(runs),
+        "ready_ms": round(statistics.median(x["ready_ms"] for x in t), 1),
+        "warmup_ms": round(statistics.median(x.get("warmup_ms", 0.0) for x in t), 1),
+        "ttfq_ms": round(statistics.median(x["time_to_first_query_ms"] for x in t), 1),
+        "first_query_ms": {q: round(statistics.median(f[q] for f in firsts), 3) for q in firsts[0]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-query with and without index warm-up")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--hot-terms", type=int, default=HOT_TERMS)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for mode, warm in (("cold", False), ("warm", True)):
+        runs = [run_once(args.index_dir, args.hot_terms, warm) for _ in range(args.repeat)]
+        report[mode] = summarize(runs)
+        report["terms"] = runs[0]["first_queries"]["terms"]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    cold, warm = report["cold"], report["warm"]
+    print(f"medians of {args.repeat} fresh processes each; first queries over {' '.join(report['terms'])!r}\n")
+    print(f"  {'':<28}{'cold':>10}{'warm':>10}")
+    print(f"  {'ready ms':<28}{cold['ready_ms']:>10.1f}{warm['ready_ms']:>10.1f}")
+    print(f"  {'warm-up ms':<28}{'-':>10}{warm['warmup_ms']:>10.1f}")
+    for q in cold["first_query_ms"]:
+        print(f"  {'first ' + q + ' ms':<28}{cold['first_query_ms'][q]:>10.3f}{warm['first_query_ms'][q]:>10.3f}")
+    print(f"  {'ttfq ms':<28}{cold['ttfq_ms']:>10.1f}{warm['ttfq_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
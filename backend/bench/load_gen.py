@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from build_index import DOCS_PATH, load_docs
+
+# ----------------------------------------
+# LOAD GENERATOR FOR api_server.py
+# ----------------------------------------
+# N concurrent keep-alive clients send GET /search for a fixed duration
+# and report throughput and latency percentiles. Queries are 1-3 word
+# spans sampled from the corpus; --repeat draws them from a small pool so
+# the result cache gets hits, otherwise nearly every query is new.
+#
+#   python api_server.py --workers 4 &
+#   python bench/load_gen.py --concurrency 32 --duration 10 --type ranked
+
+
+def sample_queries(n, seed):
+    _, cleaned_docs = load_docs(DOCS_PATH)
+    rng = random.Random(seed)
+    docs = [t for t in cleaned_docs.values() if len(t) >= 3]
+    queries = []
+    for _ in range(n):
+        tokens = rng.choice(docs)
+        length = rng.choice((1, 2, 3))
+        start = rng.randrange(len(tokens) - length + 1)
+        queries.append(" ".join(tokens[start:start + length]))
+    return queries
+
+
+async def _request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length)
+    return status, json.loads(body)
+
+
+async def _client(url, queries, args, deadline, rng, stats):
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    try:
+        while time.perf_counter() < deadline:
+            params = {"q": rng.choice(queries), "type": args.type, "size": args.size}
+            t0 = time.perf_counter()
+            status, body = await _request(reader, writer, url.hostname, "/search?" + urlencode(params))
+            stats["latencies"].append((time.perf_counter() - t0) * 1000)
+            if status != 200:
+                stats["errors"] += 1
+            elif body.get("cached"):
+                stats["cached"] += 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    pool = args.repeat or args.queries
+    queries = sample_queries(pool, args.seed)
+    stats = {"latencies": [], "errors": 0, "cached": 0}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        _client(url, queries, args, deadline, random.Random(args.seed + i), stats)
+        for i in range(args.concurrency)))
+    return stats, time.perf_counter() - start
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load against the search API")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--type", default="ranked")
+    parser.add_argument("--size", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=5000, help="distinct queries sampled")
+    parser.add_argument("--repeat", type=int, default=0,
+                        help="draw from only this many queries (exercises the cache)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    stats, elapsed = asyncio.run(run(args))
+    lat = sorted(stats["latencies"])
+    report = {
+        "requests": len(lat),
+        "errors": stats["errors"],
+        "cached": stats["cached"],
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "qps": round(len(lat) / elapsed, 1),
+        "p50_ms": round(percentile(lat, 0.50), 3),
+        "p95_ms": round(percentile(lat, 0.95), 3),
+        "p99_ms": round(percentile(lat, 0.99), 3),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, value in report.items():
+        print(f"{name:<12}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,99 +1,303 @@
+import argparse
 import json
 import os
-import re
+import shutil
 from collections import defaultdict
-import math
 from pathlib import Path
 
+from analyzer import DEFAULT, STEMMERS, Analyzer
+from postings_codec import CODECS
+from segment import SegmentReader, write_segment, idf_value
+from phrase import NGRAM_MIN_DF, prune_ngrams
+from result_cache import write_build_marker
+from runs import record_id
+
 BASE_DIR = Path(__file__).resolve().parent
 DOCS_PATH = BASE_DIR / "data" / "docs_2000.jsonl"
 OUT_DIR = (BASE_DIR / ".." / "output").resolve()
-OUT_DIR.mkdir(parents=True, exist_ok=True)
+POSITIONAL_DIR = OUT_DIR / "positional"
+NGRAM_DIR = OUT_DIR / "ngram"
+MATRIX_DIR = OUT_DIR / "matrix"
+DENSE_DIR = OUT_DIR / "dense"
+DOCSTORE_DIR = OUT_DIR / "docstore"
+IMPACT_DIR = OUT_DIR / "impact"
+FIELDS_DIR = OUT_DIR / "fields"
 
 
-os.makedirs(OUT_DIR, exist_ok=True)
+# ----------------------------------------
+# STAGING + PUBLISH
+# ----------------------------------------
+# A build never writes into the index directory a server may have open:
+# every part goes to a staging directory next to it, and publish() swaps
+# the parts in by rename once all of them are complete. A replaced part is
+# renamed aside and deleted afterwards; processes that have its files
+# mmapped keep reading them (neither rename nor unlink touches an open
+# mapping), and reopen once main() writes the new build marker.
+INDEX_PARTS = ("positional", "ngram", "matrix", "dense", "docstore", "impact", "fields",
+               "idf.json", "analyzer.json")
 
-def tokenize(text):
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    return text.split()
 
+def staging_dir(out_dir):
+    # sibling of the index directory, so publish() renames stay on one filesystem
+    out_dir = Path(out_dir).resolve()
+    return out_dir.with_name(f".{out_dir.name}.build-{os.getpid()}")
 
-docs = {}         # doc_id -> raw text
-cleaned_docs = {} # doc_id -> tokens
 
-print(f"Loading {DOCS_PATH} ...")
+def publish(staging, out_dir):
+    # staged parts replace the live ones; parts this build did not make
+    # (a matrix after --no-matrix, say) are removed, they would not match
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    old = staging.with_name(staging.name + ".old")
+    old.mkdir()
+    for name in INDEX_PARTS:
+        new, cur = staging / name, out_dir / name
+        if cur.is_dir() or (cur.exists() and not new.exists()):
+            os.replace(cur, old / name)
+        if new.exists():
+            os.replace(new, cur)
+    shutil.rmtree(old, ignore_errors=True)
 
-with open(DOCS_PATH, "r", encoding="utf-8") as f:
-    for line in f:
-        if not line.strip():
-            continue
-        entry = json.loads(line)
 
-        doc_id = entry.get("id") or entry.get("doc_id") or entry.get("_id")
-        text = entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
+def set_out_dir(path):
+    # build into another index directory (bench/bench_suite.py builds one per corpus)
+    global OUT_DIR, POSITIONAL_DIR, NGRAM_DIR, MATRIX_DIR, DENSE_DIR, DOCSTORE_DIR, IMPACT_DIR, FIELDS_DIR
+    OUT_DIR = Path(path).resolve()
+    POSITIONAL_DIR = OUT_DIR / "positional"
+    NGRAM_DIR = OUT_DIR / "ngram"
+    MATRIX_DIR = OUT_DIR / "matrix"
+    DENSE_DIR = OUT_DIR / "dense"
+    DOCSTORE_DIR = OUT_DIR / "docstore"
+    IMPACT_DIR = OUT_DIR / "impact"
+    FIELDS_DIR = OUT_DIR / "fields"
 
-        if doc_id is None:
-            # fallback if no id field exists
-            doc_id = str(len(docs))
 
-        docs[doc_id] = text
-        cleaned_docs[doc_id] = tokenize(text)
+def load_docs(path=DOCS_PATH, analyzer=DEFAULT):
+    docs = {}         # doc_id -> raw text
+    cleaned_docs = {} # doc_id -> tokens
 
-print(f"Loaded {len(docs)} documents.")
+    n = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            doc_id = record_id(entry, n)
+            n += 1
+            text = entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
+
+            docs[doc_id] = text
+            cleaned_docs[doc_id] = analyzer.analyze(text)
+
+    return docs, cleaned_docs
 
 
 # ----------------------------------------
 # BUILD INDEXES
 # ----------------------------------------
-positional_index = defaultdict(lambda: defaultdict(list))
-biword_index = defaultdict(list)
+def build_indexes(cleaned_docs, doc_ids, with_biword=True):
+    # doc_ids: doc_num -> doc_id, so postings are keyed by integer doc nums
+    positional_index = defaultdict(lambda: defaultdict(list))
+    biword_index = defaultdict(lambda: defaultdict(list))
 
-print("Building positional + biword indexes ...")
+    for doc_num, doc_id in enumerate(doc_ids):
+        tokens = cleaned_docs[doc_id]
+        # positional index
+        for pos, term in enumerate(tokens):
+            positional_index[term][doc_num].append(pos)
 
-for doc_id, tokens in cleaned_docs.items():
-    # positional index
-    for pos, term in enumerate(tokens):
-        positional_index[term][doc_id].append(pos)
+        if not with_biword:
+            continue
+        # biword index (position of the first word of the pair)
+        for i in range(len(tokens) - 1):
+            pair = tokens[i] + " " + tokens[i + 1]
+            biword_index[pair][doc_num].append(i)
 
-    # biword index
-    for i in range(len(tokens) - 1):
-        pair = tokens[i] + " " + tokens[i + 1]
-        biword_index[pair].append(doc_id)
+    return positional_index, biword_index
 
-# convert defaultdict to normal dict for saving
-positional_index = {t: dict(v) for t, v in positional_index.items()}
-biword_index = dict(biword_index)
 
 # ----------------------------------------
 # COMPUTE IDF
 # ----------------------------------------
-print("Computing IDF ...")
+def compute_idf(cleaned_docs):
+    N = len(cleaned_docs)
+    df = defaultdict(int)
 
-N = len(cleaned_docs)
-df = defaultdict(int)
+    for doc_tokens in cleaned_docs.values():
+        unique_terms = set(doc_tokens)
+        for t in unique_terms:
+            df[t] += 1
 
-for doc_tokens in cleaned_docs.values():
-    unique_terms = set(doc_tokens)
-    for t in unique_terms:
-        df[t] += 1
+    return {t: idf_value(N, df_val) for t, df_val in df.items()}
 
-idf = {t: math.log((N + 1) / (df_val + 1)) + 1 for t, df_val in df.items()}
 
-# ----------------------------------------
-# SAVE OUTPUT FILES
-# ----------------------------------------
-print("Saving index files ...")
+def build_serial(docs_path, ngram_min_df=None, codecs=None, analyzer=DEFAULT):
+    print(f"Loading {docs_path} ...")
+    docs, cleaned_docs = load_docs(docs_path, analyzer)
+    print(f"Loaded {len(docs)} documents.")
+
+    # sorted doc ids keep integer doc-num order identical to string order
+    doc_ids = sorted(cleaned_docs)
+
+    print("Building positional index ...")
+    positional_index, biword_index = build_indexes(
+        cleaned_docs, doc_ids, with_biword=ngram_min_df is not None)
+
+    print("Computing IDF ...")
+    idf = compute_idf(cleaned_docs)
+
+    # ----------------------------------------
+    # SAVE OUTPUT FILES
+    # ----------------------------------------
+    print("Saving index segments ...")
+    write_segment(POSITIONAL_DIR, doc_ids, positional_index, codecs=codecs)
+    if ngram_min_df is not None:
+        doc_lens = [len(cleaned_docs[d]) for d in doc_ids]
+        write_segment(NGRAM_DIR, doc_ids, prune_ngrams(biword_index, ngram_min_df),
+                      with_positions=False, doc_lens=doc_lens, codecs=codecs)
+
+    with open(OUT_DIR / "idf.json", "w", encoding="utf-8") as f:
+        json.dump(idf, f)
+    return len(doc_ids)
+
+
+def save_matrix():
+    # CSR copy of the positional segment for vectorized scoring (matrix.py),
+    # with the BM25F tf~ column when the field index was just built
+    from fields import load_fields
+    from matrix import write_matrix
+    with open(OUT_DIR / "idf.json", "r", encoding="utf-8") as f:
+        idf = json.load(f)
+    reader = SegmentReader(POSITIONAL_DIR)
+    write_matrix(MATRIX_DIR, reader, idf, load_fields(FIELDS_DIR, reader))
+
+
+def save_impacts():
+    # BM25 impacts quantized to 8 bits, tiered per term (impact.py)
+    from impact import write_impacts
+    with open(OUT_DIR / "idf.json", "r", encoding="utf-8") as f:
+        idf = json.load(f)
+    write_impacts(IMPACT_DIR, SegmentReader(POSITIONAL_DIR), idf)
+
+
+def save_docstore(docs_path, compression, analyzer=DEFAULT):
+    # per-doc offsets so the UI fetches only the texts it shows (docstore.py)
+    from docstore import write_docstore
+    write_docstore(DOCSTORE_DIR, docs_path, SegmentReader(POSITIONAL_DIR), compression, analyzer)
+
+
+def save_fields(docs_path, analyzer=DEFAULT):
+    # title postings, field lengths and stored titles for title: queries
+    # and BM25F (fields.py)
+    from fields import write_fields
+    write_fields(FIELDS_DIR, docs_path, SegmentReader(POSITIONAL_DIR), analyzer)
+
+
+def save_dense(embedder, docs_path):
+    # doc embeddings + IVF index for the dense retrieval leg (dense.py)
+    from dense import HASHED, hashed_doc_vectors, load_model, model_vectors, write_dense
+    from matrix import TermDocMatrix
+    reader = SegmentReader(POSITIONAL_DIR)
+    if embedder == HASHED:
+        vectors = hashed_doc_vectors(TermDocMatrix(MATRIX_DIR, reader))
+    else:
+        model = load_model(embedder)
+        if model is None:
+            raise SystemExit(f"--embedder {embedder} needs sentence-transformers; "
+                             f"use --embedder {HASHED} for the offline fallback")
+        docs, _ = load_docs(docs_path)
+        vectors = model_vectors(model, [docs[reader.doc_id(d)] for d in range(reader.num_docs)])
+    write_dense(DENSE_DIR, vectors, embedder)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the search index segments")
+    parser.add_argument("--input", default=str(DOCS_PATH), help="JSONL corpus")
+    parser.add_argument("--out-dir", default=str(OUT_DIR), help="index directory to build into")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="build with N worker processes (map/reduce over byte ranges)")
+    parser.add_argument("--memory-mb", type=int, default=0,
+                        help="stream the input (SPIMI), flushing runs at this memory budget")
+    parser.add_argument("--phrase-index", choices=["positional", "ngram"], default="positional",
+                        help="answer phrases from positions only, or add a pruned word-pair index")
+    parser.add_argument("--ngram-min-df", type=int, default=NGRAM_MIN_DF,
+                        help="only index word pairs that occur in at least this many docs")
+    parser.add_argument("--no-matrix", action="store_true",
+                        help="skip the NumPy term x doc matrix used for exhaustive scoring")
+    parser.add_argument("--no-fields", action="store_true",
+                        help="skip the title field index (title: queries, BM25F scoring, stored titles)")
+    parser.add_argument("--dense", action="store_true",
+                        help="also build doc embeddings + an IVF index for hybrid search")
+    parser.add_argument("--impacts", action="store_true",
+                        help="also build impact-ordered tiers for early-terminating top-k")
+    parser.add_argument("--embedder", default="hashed-tfidf",
+                        help="sentence-transformers model name, or hashed-tfidf (offline)")
+    for field, what in (("docs", "doc num gaps"), ("tfs", "term frequencies"),
+                        ("positions", "position gaps")):
+        parser.add_argument(f"--{field}-codec", choices=list(CODECS), default="vbyte",
+                            help=f"postings codec for {what} (see bench/bench_codecs.py)")
+    parser.add_argument("--stopwords", action="store_true",
+                        help="drop stopwords at index and query time (analyzer.py)")
+    parser.add_argument("--stem", choices=STEMMERS, default=None,
+                        help="stem terms: s (built in) or porter (needs nltk)")
+    parser.add_argument("--doc-compression", choices=["none", "zlib"], default="none",
+                        help="store document text as-is or in zlib-compressed blocks")
+    args = parser.parse_args(argv)
+    if args.dense and args.no_matrix and args.embedder == "hashed-tfidf":
+        parser.error("the hashed-tfidf embedder is computed from the matrix; drop --no-matrix")
+    docs_path = Path(args.input)
+    ngram_min_df = args.ngram_min_df if args.phrase_index == "ngram" else None
+    codecs = {"docs": args.docs_codec, "tfs": args.tfs_codec, "positions": args.positions_codec}
+    try:
+        analyzer = Analyzer(args.stopwords, args.stem)
+    except ValueError as e:
+        parser.error(str(e))
 
-with open(OUT_DIR / "positional_index.json", "w", encoding="utf-8") as f:
-    json.dump(positional_index, f)
+    out_dir = Path(args.out_dir).resolve()
+    staging = staging_dir(out_dir)
+    shutil.rmtree(staging, ignore_errors=True)
+    set_out_dir(staging)
+    try:
+        os.makedirs(OUT_DIR)
+        n_docs = build(args, docs_path, ngram_min_df, codecs, analyzer)
+        publish(staging, out_dir)
+        # last, so a searcher only sees the new index once all of it is there
+        write_build_marker(out_dir, num_docs=n_docs)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        set_out_dir(out_dir)
+    print(f"DONE! Indexed {n_docs} documents.")
 
-with open(OUT_DIR / "biword_index.json", "w", encoding="utf-8") as f:
-    json.dump(biword_index, f)
 
-with open(OUT_DIR / "idf.json", "w", encoding="utf-8") as f:
-    json.dump(idf, f)
+def build(args, docs_path, ngram_min_df, codecs, analyzer):
+    # every part into OUT_DIR (the staging directory); -> number of docs
+    # queries must be analyzed the way the index was
+    analyzer.save(OUT_DIR)
 
+    if args.workers:
+        from parallel_build import build_parallel
+        n_docs = build_parallel(docs_path, OUT_DIR, args.workers, ngram_min_df, codecs, analyzer)
+    elif args.memory_mb:
+        from spimi import build_spimi
+        n_docs = build_spimi(docs_path, OUT_DIR, args.memory_mb, ngram_min_df, codecs, analyzer)
+    else:
+        n_docs = build_serial(docs_path, ngram_min_df, codecs, analyzer)
 
-print("DONE! Indexes saved successfully.")
+    print("Saving document store ...")
+    save_docstore(docs_path, args.doc_compression, analyzer)
+    if not args.no_fields:
+        print("Saving title field index ...")
+        save_fields(docs_path, analyzer)
+    if not args.no_matrix:
+        print("Saving term x doc matrix ...")
+        save_matrix()
+    if args.impacts:
+        print("Saving impact-ordered postings ...")
+        save_impacts()
+    if args.dense:
+        print(f"Embedding docs ({args.embedder}) + training IVF ...")
+        save_dense(args.embedder, docs_path)
+    return n_docs
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+from analyzer import DEFAULT
+from segment import page_in_array
+
+# ----------------------------------------
+# DENSE RETRIEVAL LEG
+# ----------------------------------------
+# Doc embeddings + an IVF (inverted file) ANN index, all CPU / NumPy:
+#
+#   embedder     sentence-transformers model when one is installed and
+#                named at build time; otherwise "hashed-tfidf", a
+#                deterministic signed feature-hashing projection of the
+#                (1 + log tf) * idf vector into DIM dims. The fallback needs
+#                no model and no network, but it only captures term
+#                overlap, not synonyms.
+#   vectors.npy  float32 [N, D], L2-normalised (cosine = dot product)
+#   vectors_i8.npy + scales.npy   int8 copy with a per-vector scale
+#   centroids.npy                 float32 [nlist, D] spherical k-means
+#   ivf_offsets.npy, ivf_ids.npy  doc nums grouped by nearest centroid
+#   meta.json    embedder, dims, nlist, doc count (checked at load)
+#
+# A query scores the centroids, visits the nprobe closest lists and
+# ranks only their docs; small collections are scanned exactly instead
+# (bench/bench_dense.py shows where IVF starts to pay off). rrf() fuses
+# the dense ranking with BM25.
+
+DIM = 256
+NPROBE = 16
+EXACT_MAX_DOCS = 20_000   # below this a brute-force scan beats visiting IVF lists
+KMEANS_ITERS = 15
+TRAIN_SAMPLE = 50_000
+RRF_K = 60
+HASHED = "hashed-tfidf"
+
+META_FILE = "meta.json"
+
+
+# ----------------------------------------
+# EMBEDDERS
+# ----------------------------------------
+def _hash_term(term, dim):
+    # stable across processes (unlike hash()): bucket + sign
+    h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, 1.0 if (h >> 63) & 1 else -1.0
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def hashed_doc_vectors(matrix, dim=DIM):
+    # matrix: matrix.TermDocMatrix; one vectorized pass over its nonzeros
+    reader = matrix.reader
+    buckets = np.empty(reader.num_terms, dtype=np.int64)
+    signs = np.empty(reader.num_terms, dtype=np.float32)
+    for r, term in enumerate(reader.terms()):
+        buckets[r], signs[r] = _hash_term(term, dim)
+    rows = np.repeat(np.arange(reader.num_terms), np.diff(matrix.indptr))
+    weights = (1 + np.log(matrix.tf)) * matrix.idf[rows] * signs[rows]
+    vectors = np.zeros((matrix.num_docs, dim), dtype=np.float32)
+    np.add.at(vectors, (matrix.indices, buckets[rows]), weights)
+    return _normalize(vectors)
+
+
+def hashed_query_vector(tokens, idf, dim=DIM):
+    vec = np.zeros(dim, dtype=np.float32)
+    counts = {}
+    for t in tokens:
+        counts[t] = counts.get(t, 0) + 1
+    for t, tf in counts.items():
+        if t not in idf:
+            continue
+        bucket, sign = _hash_term(t, dim)
+        vec[bucket] += sign * (1 + math.log(tf)) * idf[t]
+    return _normalize(vec)
+
+
+def load_model(name):
+    # optional: a sentence-transformers model already on this machine
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return None
+    return SentenceTransformer(name, device="cpu")
+
+
+def model_vectors(model, texts, batch_size=64):
+    return np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True),
+                      dtype=np.float32)
+
+
+# ----------------------------------------
+# IVF BUILD
+# ----------------------------------------
+def _assign(vectors, centroids, batch=8192):
+    out = np.empty(len(vectors), dtype=np.int64)
+    for s in range(0, len(vectors), batch):
+        out[s:s + batch] = np.argmax(vectors[s:s + batch] @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors, nlist, seed=0, iters=KMEANS_ITERS):
+    # spherical k-means on a sample; empty lists are re-seeded
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > TRAIN_SAMPLE:
+        sample = vectors[rng.choice(len(vectors), TRAIN_SAMPLE, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def quantize(vectors):
+    # symmetric int8 with one scale per vector
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.round(vectors / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def write_dense(out_dir, vectors, embedder, nlist=None, seed=0):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    nlist = nlist or max(1, min(n, int(math.sqrt(n))))
+
+    centroids = train_centroids(vectors, nlist, seed)
+    assign = _assign(vectors, centroids)
+    order = np.argsort(assign, kind="stable").astype(np.int32)
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+    q, scales = quantize(vectors)
+
+    np.save(out_dir / "vectors.npy", vectors)
+    np.save(out_dir / "vectors_i8.npy", q)
+    np.save(out_dir / "scales.npy", scales)
+    np.save(out_dir / "centroids.npy", centroids.astype(np.float32))
+    np.save(out_dir / "ivf_offsets.npy", offsets)
+    np.save(out_dir / "ivf_ids.npy", order)
+    meta = {"embedder": embedder, "dim": int(vectors.shape[1]), "num_docs": n, "nlist": nlist}
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+# ----------------------------------------
+# SEARCH
+# ----------------------------------------
+class DenseIndex:
+    def __init__(self, path, reader, idf, analyzer=DEFAULT):
+        self.path = Path(path)
+        self.reader = reader
+        self.idf = idf
+        self.analyzer = analyzer
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["num_docs"] != reader.num_docs:
+            raise ValueError(f"{self.path} does not match segment {reader.path}; rebuild the index")
+        self.embedder = self.meta["embedder"]
+        self.dim = self.meta["dim"]
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.vectors_i8 = np.load(self.path / "vectors_i8.npy", mmap_mode="r")
+        self.scales = np.load(self.path / "scales.npy", mmap_mode="r")
+        self.centroids = np.load(self.path / "centroids.npy")
+        self.offsets = np.load(self.path / "ivf_offsets.npy")
+        self.ids = np.load(self.path / "ivf_ids.npy", mmap_mode="r")
+        self._model = None
+
+    def prefault(self):
+        # page in what search() scans: the float vectors and the IVF lists
+        # (the embedding model loads on the first query)
+        return page_in_array(self.vectors) + page_in_array(self.ids)
+
+    def embed_query(self, query):
+        if self.embedder == HASHED:
+            return hashed_query_vector(self.analyzer.analyze(query), self.idf, self.dim)
+        if self._model is None:
+            self._model = load_model(self.embedder)
+            if self._model is None:
+                raise RuntimeError(f"{self.path} was built with {self.embedder!r}, "
+                                   "but sentence-transformers is not installed")
+        return model_vectors(self._model, [query])[0]
+
+    def _top(self, doc_nums, scores, k):
+        if len(doc_nums) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            doc_nums, scores = doc_nums[keep], scores[keep]
+        order = np.lexsort((doc_nums, -scores))
+        return [(int(doc_nums[i]), float(scores[i])) for i in order if scores[i] > 0]
+
+    def _score(self, doc_nums, qvec, quantized):
+        if quantized:
+            return (self.vectors_i8[doc_nums].astype(np.float32) @ qvec) * self.scales[doc_nums]
+        return self.vectors[doc_nums] @ qvec
+
+    def search_vector(self, qvec, k=10, nprobe=NPROBE, quantized=False):
+        # -> [(doc_num, cosine)] from the nprobe nearest IVF lists
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ qvec), nprobe - 1)[:nprobe]
+        doc_nums = np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+        if not len(doc_nums):
+            return []
+        return self._top(doc_nums, self._score(doc_nums, qvec, quantized), k)
+
+    def brute_force(self, qvec, k=10, quantized=False):
+        doc_nums = np.arange(self.meta["num_docs"])
+        return self._top(doc_nums, self._score(doc_nums, qvec, quantized), k)
+
+    def search(self, query, k=10, nprobe=NPROBE, quantized=False):
+        # -> [(doc_id, cosine)]
+        qvec = self.embed_query(query)
+        if self.meta["num_docs"] <= EXACT_MAX_DOCS:
+            hits = self.brute_force(qvec, k, quantized)
+        else:
+            hits = self.search_vector(qvec, k, nprobe, quantized)
+        return [(self.reader.doc_id(d), round(s, 4)) for d, s in hits]
+
+
+def load_dense_index(path, reader, idf, analyzer=DEFAULT):
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        return None
+    return DenseIndex(path, reader, idf, analyzer)
+
+
+# ----------------------------------------
+# FUSION
+# ----------------------------------------
+def rrf(rankings, k=10, rrf_k=RRF_K):
+    # reciprocal rank fusion: sum of 1 / (rrf_k + rank) over the rankings
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, 1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (rrf_k + rank)
+    ranked = sorted(fused.items(), key=lambda x: (-x[1], x[0]))
+    return [(doc, round(score, 6)) for doc, score in ranked[:k]]
@@ -0,0 +1,204 @@
+import json
+import mmap
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from analyzer import DEFAULT
+from runs import record_id
+from segment import page_in
+
+# ----------------------------------------
+# LAZY DOCUMENT STORE
+# ----------------------------------------
+# Raw document text for snippets, fetched per doc instead of loading the
+# whole corpus:
+#
+#   docs.bin      records, stored as-is or as zlib-compressed blocks of
+#                 about BLOCK_BYTES of text
+#   offsets.bin   per doc num: u64 block offset, u32 block length,
+#                 u32 offset inside the (decompressed) block, u32 length,
+#                 u64 first token span, u32 token count
+#   spans.bin     per token: u32 byte offset into the doc's utf-8 text,
+#                 u16 byte length (fixed width, so any token is O(1) away)
+#   meta.json     doc count, compression
+#
+# Token spans are recorded at index time by the analyzer the index was
+# built with (analyzer.py), so token position p of the positional index is
+# span p here; snippets.py uses them to cut passages and highlight.
+#
+# Uncompressed, a record is a single slice of the mmap. Compressed, the
+# whole block is inflated once and kept in a small block LRU; an LRU of
+# decoded records sits in front of both. All three files are mmapped, so
+# resident memory is the two LRUs plus the pages touched: offsets.bin is
+# RECORD.size (32) bytes per doc, spans.bin SPAN.size (6) bytes per token,
+# whatever the text size.
+
+BLOCK_BYTES = 64 * 1024
+RECORD = struct.Struct("<QIIIQI")
+SPAN = struct.Struct("<IH")
+COMPRESSIONS = ("none", "zlib")
+
+META_FILE = "meta.json"
+DATA_FILE = "docs.bin"
+OFFSETS_FILE = "offsets.bin"
+SPANS_FILE = "spans.bin"
+
+
+def doc_text(entry):
+    # the text every build tokenizes (see build_index.load_docs)
+    return entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
+
+
+def write_docstore(out_dir, docs_path, reader, compression="none", analyzer=DEFAULT):
+    # streams the JSONL once; reader maps doc ids to the segment's doc nums
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression!r}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    locations = [(0, 0, 0, 0)] * reader.num_docs   # text location per doc num
+    span_refs = [(0, 0)] * reader.num_docs          # (first span, count) per doc num
+
+    with open(docs_path, "r", encoding="utf-8") as src, \
+            open(out_dir / DATA_FILE, "wb") as out, open(out_dir / SPANS_FILE, "wb") as spans_out:
+        block = bytearray()
+        members = []   # (doc num, offset in block, length) for the open block
+        n_spans = 0
+
+        def flush():
+            data = zlib.compress(bytes(block), 6)
+            off = out.tell()
+            out.write(data)
+            for doc_num, inner, length in members:
+                locations[doc_num] = (off, len(data), inner, length)
+            block.clear()
+            members.clear()
+
+        n = 0
+        for line in src:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            doc_id = record_id(entry, n)
+            n += 1
+            doc_num = reader.doc_num(doc_id)
+            if doc_num is None:
+                continue
+            text = doc_text(entry)
+            spans = analyzer.token_spans(text)
+            spans_out.write(b"".join(SPAN.pack(s, min(e - s, 0xFFFF)) for s, e in spans))
+            span_refs[doc_num] = (n_spans, len(spans))
+            n_spans += len(spans)
+
+            data = text.encode("utf-8")
+            if compression == "none":
+                locations[doc_num] = (out.tell(), len(data), 0, len(data))
+                out.write(data)
+                continue
+            members.append((doc_num, len(block), len(data)))
+            block += data
+            if len(block) >= BLOCK_BYTES:
+                flush()
+        if members:
+            flush()
+
+    with open(out_dir / OFFSETS_FILE, "wb") as f:
+        for loc, ref in zip(locations, span_refs):
+            f.write(RECORD.pack(*loc, *ref))
+    meta = {"num_docs": reader.num_docs, "compression": compression}
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class DocStore:
+    def __init__(self, path, reader, cache_size=256, block_cache_size=16):
+        self.path = Path(path)
+        self.reader = reader
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["num_docs"] != reader.num_docs:
+            raise ValueError(f"{self.path} does not match segment {reader.path}; rebuild the index")
+        self.compressed = self.meta["compression"] == "zlib"
+        self.cache_size = cache_size
+        self.block_cache_size = block_cache_size
+        self._cache = OrderedDict()
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()   # the UI reads from several threads
+        self._offsets = _map(self.path / OFFSETS_FILE)
+        self._data = _map(self.path / DATA_FILE)
+        self._spans = _map(self.path / SPANS_FILE)
+
+    @staticmethod
+    def _touch(lru, key, value, limit):
+        lru[key] = value
+        if len(lru) > limit:
+            lru.popitem(last=False)
+
+    def _block(self, off, length):
+        block = self._blocks.get(off)
+        if block is None:
+            block = zlib.decompress(self._data[off:off + length])
+            self._touch(self._blocks, off, block, self.block_cache_size)
+        else:
+            self._blocks.move_to_end(off)
+        return block
+
+    def _raw(self, doc_num):
+        # utf-8 bytes of one doc: an mmap slice, or a slice of a cached block
+        off, length, inner, size, _, _ = RECORD.unpack_from(self._offsets, RECORD.size * doc_num)
+        if self.compressed:
+            return self._block(off, length)[inner:inner + size]
+        return self._data[off:off + size]
+
+    def get(self, doc_num):
+        with self._lock:
+            text = self._cache.get(doc_num)
+            if text is not None:
+                self._cache.move_to_end(doc_num)
+                return text
+            text = bytes(self._raw(doc_num)).decode("utf-8")
+            self._touch(self._cache, doc_num, text, self.cache_size)
+            return text
+
+    def num_tokens(self, doc_num):
+        return RECORD.unpack_from(self._offsets, RECORD.size * doc_num)[5]
+
+    def token_spans(self, doc_num, first, last):
+        # byte (start, end) of tokens first .. last - 1, clamped to the doc
+        _, _, _, _, base, count = RECORD.unpack_from(self._offsets, RECORD.size * doc_num)
+        first, last = max(0, first), min(count, last)
+        out = []
+        for i in range(first, last):
+            s, n = SPAN.unpack_from(self._spans, SPAN.size * (base + i))
+            out.append((s, s + n))
+        return out
+
+    def passage(self, doc_num, start, end):
+        # utf-8 bytes [start, end) of one doc, without decoding the rest
+        with self._lock:
+            return bytes(self._raw(doc_num)[start:end])
+
+    def text(self, doc_id, default=""):
+        doc_num = self.reader.doc_num(doc_id)
+        return default if doc_num is None else self.get(doc_num)
+
+    def prefault(self):
+        # page in the per-doc records (warmup.py); text and spans stay on
+        # disk until a result needs them. -> bytes
+        return page_in(self._offsets)
+
+
+def load_docstore(path, reader, **kwargs):
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        return None
+    return DocStore(path, reader, **kwargs)
@@ -0,0 +1,189 @@
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from analyzer import DEFAULT
+from runs import record_id
+from segment import SegmentReader, page_in_array, write_segment
+
+# ----------------------------------------
+# FIELD INDEX (TITLE / ABSTRACT) + BM25F
+# ----------------------------------------
+# The positional segment indexes a doc as one token stream, title and
+# abstract run together. This adds the title as a field of its own, doc
+# nums shared with the positional segment:
+#
+#   title/              a positional segment over title tokens only; title:
+#                       queries read its postings, a fraction of the size
+#   indptr.npy          int64  [num_terms + 1]  row r is postings indptr[r]:indptr[r+1]
+#   title_tf.npy        uint8  [nnz]            title tf of every posting of the
+#                                               positional segment (0: abstract only),
+#                                               in matrix.py's row layout; the matrix
+#                                               build folds it into its tf~ column
+#   lens.npy            float64[2, num_docs]    title / abstract token counts
+#   titles.npy          uint8  stored titles, utf-8; doc d is
+#   title_offsets.npy   int64  titles[off[d]:off[d + 1]]
+#   meta.json           shape + average field lengths, checked against the segment
+#
+# The abstract is the rest of the doc: its tf is the positional tf minus
+# the title tf and its length the doc length minus the title length, so
+# the abstract postings are not stored twice.
+#
+# BM25F normalizes each field's tf by that field's length, weights and sums
+# them, and saturates once:
+#
+#   tf~   = sum_f  w_f * tf_f / (1 - b_f + b_f * len_f / avglen_f)
+#   score = sum_t  idf(t) * tf~ * (k1 + 1) / (k1 + tf~)
+#
+# A title hit is worth FIELD_WEIGHTS["title"] abstract hits, a short title
+# is not penalized by a long abstract, and a term in both fields still
+# saturates like one. matrix.py scores this way (scoring="bm25f") when the
+# fields are built, from the tf~ of every posting it stores at build time.
+
+FIELDS = ("title", "abstract")
+FIELD_WEIGHTS = {"title": 3.0, "abstract": 1.0}
+FIELD_B = {"title": 0.3, "abstract": 0.75}
+MAX_TITLE_CHARS = 300   # a longer "title." prefix is a first sentence, not a title
+
+META_FILE = "meta.json"
+TITLE_DIR = "title"
+
+MARKED_RE = re.compile(r"\s*Title:\s*(.*?)\s*\nAbstract:\s*(.*)", re.S)
+# bounded: an unmarked text is not scanned past where a title could end
+UNMARKED_RE = re.compile(r"(.{0,%d}?)\.\s{3,}(.*)" % MAX_TITLE_CHARS, re.S)
+
+
+def doc_fields(entry):
+    # -> (title, abstract) of a corpus record: separate fields, a
+    # "Title: ...\nAbstract: ..." text, or "Title.   Abstract ..." text;
+    # text without a recognizable title is all abstract
+    text = entry.get("text")
+    if not text:
+        return entry.get("title", ""), entry.get("abstract", "")
+    m = MARKED_RE.match(text) or UNMARKED_RE.match(text)
+    if m is None or len(m.group(1)) > MAX_TITLE_CHARS:
+        return "", text
+    return m.group(1), m.group(2)
+
+
+def write_fields(out_dir, docs_path, reader, analyzer=DEFAULT):
+    # streams the JSONL once, like docstore.write_docstore; reader is the
+    # positional segment, for doc nums, term rows and doc lengths
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    num_docs = reader.num_docs
+    index = defaultdict(lambda: defaultdict(list))   # title term -> {doc num: [positions]}
+    titles = [""] * num_docs
+    title_len = np.zeros(num_docs, dtype=np.float64)
+
+    with open(docs_path, "r", encoding="utf-8") as src:
+        n = 0
+        for line in src:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            doc_id = record_id(entry, n)
+            n += 1
+            doc_num = reader.doc_num(doc_id)
+            if doc_num is None:
+                continue
+            title = " ".join(doc_fields(entry)[0].split())
+            tokens = analyzer.analyze(title)
+            for pos, term in enumerate(tokens):
+                index[term][doc_num].append(pos)
+            titles[doc_num] = title
+            title_len[doc_num] = len(tokens)
+
+    # the file need not be in doc num order; postings must be
+    index = {t: dict(sorted(p.items())) for t, p in index.items()}
+    write_segment(out_dir / TITLE_DIR, [reader.doc_id(d) for d in range(num_docs)], index)
+
+    # title tfs laid out like the matrix rows; only title terms' rows are decoded
+    indptr = np.zeros(reader.num_terms + 1, dtype=np.int64)
+    for r in range(reader.num_terms):
+        indptr[r + 1] = indptr[r] + reader.entry_at(r)[0]
+    nnz = int(indptr[-1])
+    title_tf = np.zeros(nnz, dtype=np.uint8)
+    for t, postings in index.items():
+        r = reader.term_id(t)
+        if r is None:
+            continue
+        docs = np.frombuffer(reader.doc_nums(t), dtype=np.uint32)
+        at = np.searchsorted(docs, np.fromiter(postings, np.uint32, len(postings)))
+        title_tf[indptr[r] + at] = [min(len(p), 255) for p in postings.values()]
+    np.save(out_dir / "indptr.npy", indptr)
+    np.save(out_dir / "title_tf.npy", title_tf)
+
+    doc_len = np.array([reader.doc_len(d) for d in range(num_docs)], dtype=np.float64)
+    lens = np.stack([title_len, np.maximum(doc_len - title_len, 0)])
+    np.save(out_dir / "lens.npy", lens)
+
+    data = [t.encode("utf-8") for t in titles]
+    offsets = np.zeros(num_docs + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in data])
+    np.save(out_dir / "title_offsets.npy", offsets)
+    np.save(out_dir / "titles.npy", np.frombuffer(b"".join(data), dtype=np.uint8))
+
+    meta = {"num_terms": reader.num_terms, "num_docs": num_docs, "nnz": nnz, "fields": list(FIELDS),
+            "avg_len": {f: float(lens[i].mean()) if num_docs else 0.0 for i, f in enumerate(FIELDS)}}
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+class FieldIndex:
+    def __init__(self, path, reader):
+        self.path = Path(path)
+        self.reader = reader
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if (self.meta["num_terms"], self.meta["num_docs"]) != (reader.num_terms, reader.num_docs):
+            raise ValueError(f"{self.path} does not match segment {reader.path}; rebuild the index")
+        self.avg_len = self.meta["avg_len"]
+        # field name -> segment of that field alone (title: queries)
+        self.readers = {"title": SegmentReader(self.path / TITLE_DIR)}
+        self.indptr = np.load(self.path / "indptr.npy", mmap_mode="r")
+        self.title_tf = np.load(self.path / "title_tf.npy", mmap_mode="r")
+        self.lens = np.load(self.path / "lens.npy", mmap_mode="r")
+        self._titles = np.load(self.path / "titles.npy", mmap_mode="r")
+        self._title_offsets = np.load(self.path / "title_offsets.npy", mmap_mode="r")
+        self._norms = None
+
+    def title(self, doc_num):
+        start, end = self._title_offsets[doc_num], self._title_offsets[doc_num + 1]
+        return self._titles[start:end].tobytes().decode("utf-8")
+
+    def title_of(self, doc_id, default=""):
+        doc_num = self.reader.doc_num(doc_id)
+        return default if doc_num is None else self.title(doc_num) or default
+
+    def _field_norms(self):
+        # per doc: the abstract's w_f / (1 - b_f + b_f * len_f / avglen_f),
+        # and how much more the title's is
+        if self._norms is None:
+            title, abstract = [FIELD_WEIGHTS[f] / (1 - FIELD_B[f] + FIELD_B[f] * (self.lens[i] / (self.avg_len[f] or 1.0)))
+                               for i, f in enumerate(FIELDS)]
+            self._norms = abstract, title - abstract
+        return self._norms
+
+    def field_tf(self, start, end, docs, tf):
+        # BM25F tf~ of postings start:end of the positional segment (in
+        # matrix.py's layout); docs / tf are their doc nums and whole-doc
+        # tfs. Every occurrence is weighted as abstract, plus the title's
+        # extra for the title ones
+        abstract_norm, title_gain = self._field_norms()
+        return tf * abstract_norm[docs] + self.title_tf[start:end] * title_gain[docs]
+
+    def prefault(self, term_ids=()):
+        # page in the stored-title offsets (result cards); queries score
+        # from the matrix's tf~ column, not from these arrays. -> bytes
+        return page_in_array(self._title_offsets)
+
+
+def load_fields(path, reader):
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        return None
+    return FieldIndex(path, reader)
@@ -1,171 +1,117 @@
 import json
-import os
-import math
-from collections import Counter, defaultdict
+from pathlib import Path
+
+from analyzer import load_analyzer
+from dense import load_dense_index, rrf
+from segment import SegmentReader, PositionalIndexView
+from phrase import load_ngram_index, phrase_search
+from positional import proximity_search
+from query_parser import QuerySyntaxError, parse_query, query_terms
+from query_planner import boolean_search
+from ranker import bm25_score
+from topk import top_k
+
+BASE_DIR = Path(__file__).resolve().parent
+INDEX_DIR = (BASE_DIR / ".." / "output").resolve()
+ANALYZER = load_analyzer(INDEX_DIR)   # the one the index was built with
 
 # Load Indexes 
 def load_indexes():
-    with open("C:\Projects\HybridSearchEngine\output/positional_index.json", "r", encoding="utf-8") as f:
-        pos_index = json.load(f)
-    with open("C:\Projects\HybridSearchEngine\output/biword_index.json", "r", encoding="utf-8") as f:
-        bi_index = json.load(f)
-    return pos_index, bi_index
-
-# Load Cleaned Docs 
-def load_docs():
-    docs = {}
-    path = "C:\Projects\HybridSearchEngine\data/cleaned_docs"
-    for file in os.listdir(path):
-        if file.endswith(".txt"):
-            with open(os.path.join(path, file), "r", encoding="utf-8") as f:
-                docs[file.replace(".txt", "")] = f.read().split()
-    return docs
-
-# Intersection Helper 
-def intersect(list1, list2):
-    i, j = 0, 0
-    res = []
-    while i < len(list1) and j < len(list2):
-        if list1[i] == list2[j]:
-            res.append(list1[i])
-            i += 1; j += 1
-        elif list1[i] < list2[j]:
-            i += 1
-        else:
-            j += 1
-    return res
+    pos_index = PositionalIndexView(SegmentReader(INDEX_DIR / "positional"))
+    ngram_index = load_ngram_index(INDEX_DIR / "ngram")
+    return pos_index, ngram_index
+
+# Load collection IDF (computed over the full collection at index time)
+def load_idf():
+    with open(INDEX_DIR / "idf.json", "r", encoding="utf-8") as f:
+        return json.load(f)
 
 # Boolean Query
-def boolean_and(t1, t2, pos_index):
-    docs1 = sorted(pos_index.get(t1, {}).keys())
-    docs2 = sorted(pos_index.get(t2, {}).keys())
-    return intersect(docs1, docs2)
+def boolean_and(query, pos_index):
+    # AND / OR / NOT, parentheses, "phrases", NEAR/k; planned rarest operand first
+    return boolean_search(pos_index.reader, query, ANALYZER)
 
 # Phrase Query 
-def phrase_query(phrase, bi_index, pos_index):
-    tokens = phrase.lower().split()
-    if len(tokens) == 1:
-        return sorted(pos_index.get(tokens[0], {}).keys())
-
-    biwords = [" ".join(tokens[i:i+2]) for i in range(len(tokens)-1)]
-    postings = [bi_index.get(b, []) for b in biwords if b in bi_index]
-    if not postings:
-        return []
-
-    result = postings[0]
-    for p in postings[1:]:
-        result = intersect(result, p)
-    if not result:
-        return []
-
-    verified = []
-    for doc in result:
-        first_positions = pos_index.get(tokens[0], {}).get(doc, [])
-        for p in first_positions:
-            match = True
-            for i in range(1, len(tokens)):
-                positions = pos_index.get(tokens[i], {}).get(doc, [])
-                if (p + i) not in positions:
-                    match = False
-                    break
-            if match:
-                verified.append(doc)
-                break
-    return sorted(verified)
+def phrase_query(phrase, ngram_index, pos_index):
+    # verified against positions; the optional n-gram index only narrows candidates
+    return phrase_search(pos_index.reader, ANALYZER.analyze(phrase), ngram_index)
 
 # Proximity Query 
-def proximity_query(t1, t2, k, pos_index):
-    docs1 = set(pos_index.get(t1, {}).keys())
-    docs2 = set(pos_index.get(t2, {}).keys())
-    common = docs1.intersection(docs2)
-    results = []
-    for doc in common:
-        pos1 = pos_index[t1][doc]
-        pos2 = pos_index[t2][doc]
-        for p1 in pos1:
-            for p2 in pos2:
-                if abs(p1 - p2) <= k:
-                    results.append(doc)
-                    break
-            else:
-                continue
-            break
-    return sorted(results)
-
-# TF-IDF + BM25 Ranking
-def compute_idf(all_docs):
-    N = len(all_docs)
-    df = defaultdict(int)
-    for tokens in all_docs.values():
-        for term in set(tokens):
-            df[term] += 1
-    return {term: math.log((N + 1) / (df_val + 1)) + 1 for term, df_val in df.items()}
-
-def bm25_score(query_tokens, docs, idf, k1=1.5, b=0.75):
-    avg_len = sum(len(d) for d in docs.values()) / len(docs)
-    scores = {}
-    for doc_id, tokens in docs.items():
-        tf = Counter(tokens)
-        doc_len = len(tokens)
-        score = 0.0
-        for q in query_tokens:
-            if q in tf and q in idf:
-                freq = tf[q]
-                num = idf[q] * freq * (k1 + 1)
-                denom = freq + k1 * (1 - b + b * (doc_len / avg_len))
-                score += num / denom
-        if score > 0:
-            scores[doc_id] = round(score, 4)
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+def proximity_query(terms, k, pos_index, ordered=False):
+    # NEAR/k (any order) or W/k (query order) over any number of terms
+    return proximity_search(pos_index.reader, ANALYZER.analyze_terms(terms), k, ordered)
+
+# Lexical + Dense (reciprocal rank fusion)
+def dense_hybrid(query, pos_index, idf, dense, k=10, depth=100):
+    # BM25 top-k and the dense leg's top-k, fused by rank (scores are not comparable)
+    lexical = top_k(ANALYZER.analyze(query), pos_index.reader, idf, k=depth)
+    if dense is None:
+        return lexical[:k]
+    return rrf([lexical, dense.search(query, depth)], k)
 
 # Main Hybrid Search 
-def hybrid_search(query_type, query, pos_index, bi_index, docs, idf):
+def hybrid_search(query_type, query, pos_index, ngram_index, idf):
     candidates = []
     if query_type == "boolean":
-        t1, t2 = query.split()
-        candidates = boolean_and(t1, t2, pos_index)
+        candidates = boolean_and(query, pos_index)
     elif query_type == "phrase":
-        candidates = phrase_query(query, bi_index, pos_index)
+        candidates = phrase_query(query, ngram_index, pos_index)
     elif query_type == "proximity":
-        t1, t2, k = query.split()
-        candidates = proximity_query(t1, t2, int(k), pos_index)
+        *terms, k = query.split()
+        candidates = proximity_query(terms, int(k), pos_index)
 
     if not candidates:
         print("❌ No matching documents found.")
         return []
 
-    # Rank only retrieved docs
-    filtered_docs = {doc: docs[doc] for doc in candidates if doc in docs}
-    query_tokens = query.split()
-    ranked = bm25_score(query_tokens, filtered_docs, idf)
+    # Rank only retrieved docs, straight from their postings; a boolean
+    # query ranks on its positive terms (operators and NOT-ed terms dropped)
+    if query_type == "boolean":
+        query_tokens = query_terms(parse_query(query, ANALYZER))
+    else:
+        query_tokens = query.split()
+        if query_type == "proximity":
+            query_tokens = query_tokens[:-1]
+        query_tokens = ANALYZER.analyze_terms(query_tokens)
+    ranked = bm25_score(query_tokens, pos_index.reader, idf, candidates=candidates)
     return ranked
 
 # MAIN 
 def main():
     print("📚 Loading indexes and documents...")
-    pos_index, bi_index = load_indexes()
-    docs = load_docs()
-    idf = compute_idf(docs)
-    print(f"✅ Loaded {len(docs)} documents.")
+    pos_index, ngram_index = load_indexes()
+    idf = load_idf()
+    dense = load_dense_index(INDEX_DIR / "dense", pos_index.reader, idf, ANALYZER)
+    print(f"✅ Loaded {pos_index.reader.num_docs} documents.")
+    if dense is None:
+        print("(no dense index: option 4 is BM25 only; build with --dense)")
 
     while True:
         print("\n🔎 Choose search type:")
-        print("1. Boolean (AND)")
+        print("1. Boolean (AND / OR / NOT)")
         print("2. Phrase query")
         print("3. Proximity query")
-        print("4. Exit")
+        print("4. Hybrid (BM25 + dense, RRF)")
+        print("5. Exit")
         choice = input("Enter choice: ").strip()
 
         if choice == "1":
-            q = input("Enter 2 terms (space separated): ").strip().lower()
-            results = hybrid_search("boolean", q, pos_index, bi_index, docs, idf)
+            q = input("Enter query (AND implied; OR, NOT, ( ), \"phrases\", NEAR/k allowed): ").strip()
+            try:
+                results = hybrid_search("boolean", q, pos_index, ngram_index, idf)
+            except QuerySyntaxError as e:
+                print(f"❌ Invalid query: {e}")
+                continue
         elif choice == "2":
             q = input("Enter phrase: ").strip().lower()
-            results = hybrid_search("phrase", q, pos_index, bi_index, docs, idf)
+            results = hybrid_search("phrase", q, pos_index, ngram_index, idf)
         elif choice == "3":
-            q = input("Enter 'term1 term2 k': ").strip().lower()
-            results = hybrid_search("proximity", q, pos_index, bi_index, docs, idf)
+            q = input("Enter 'term1 term2 ... k': ").strip().lower()
+            results = hybrid_search("proximity", q, pos_index, ngram_index, idf)
         elif choice == "4":
+            q = input("Enter query: ").strip()
+            results = dense_hybrid(q, pos_index, idf, dense)
+        elif choice == "5":
             print("👋 Exiting hybrid search.")
             break
         else:
@@ -0,0 +1,227 @@
+import json
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from segment import bm25_tf, page_in_array
+from tracing import count
+
+# ----------------------------------------
+# IMPACT-ORDERED POSTINGS (SCORE-AT-A-TIME)
+# ----------------------------------------
+# An optional second layout of the positional segment's postings
+# (build_index.py --impacts). Every posting's full BM25 contribution
+# idf * bm25_tf is precomputed and quantized to 8 bits with one global
+# scale. Each term's postings are sorted by impact, highest first, and cut
+# into tiers of FIRST_TIER, 2 * FIRST_TIER, 4 * FIRST_TIER ... postings:
+# the few high-impact postings come in small tiers, the long low-impact
+# tail in a handful of big ones.
+#
+#   tier_ptr.npy     int64 [num_terms + 1]  tiers of row r (dictionary order)
+#   tier_off.npy     int64 [num_tiers + 1]  tier t is postings tier_off[t]:tier_off[t+1]
+#   docs.npy         int32 [nnz]            doc nums, by impact within a term
+#   impacts.npy      uint8 [nnz]            quantized impact of each posting
+#   meta.json        shape + scale, checked against the segment
+#
+# A tier's first impact bounds everything after it in that term.
+#
+# A query merges its terms' tiers by their top impact and adds them into integer
+# accumulators, biggest contributions first, remembering which terms each
+# doc has been seen in. It stops as soon as the top-k set is settled:
+#   - an unseen doc can collect at most the sum of every term's next tier
+#     impact, and the k-th accumulator is already at least that
+#   - no seen doc outside the top k can pass the k-th, even if it collects
+#     the next tier impact of every term it has not been seen in yet
+# Stop checks cost O(docs), so they run after 2k, 4k, 8k ... postings.
+# Tiers are whole NumPy slices, so a query costs a few array operations
+# per tier rather than per posting.
+# Common terms put most of their postings in low tiers, which is exactly
+# what gets skipped.
+#
+# Quantizing moves a posting's impact by less than one level, so a doc's
+# accumulated score is within E = sum of query tf levels of its exact BM25.
+# candidates() widens the settled set by 2E -- every doc that could still
+# be in the exact top k -- and Searcher rescores just those exactly, which
+# gives the same results as exhaustive BM25 (bench/bench_impact.py).
+#
+# Searcher uses it in place of WAND; NumPy exhaustive scoring over the
+# term x doc matrix is still faster where that was built.
+
+LEVELS = 255
+FIRST_TIER = 16
+MASK_TERMS = 64   # seen-in-term bitmasks per doc up to this many query terms
+
+META_FILE = "meta.json"
+
+
+def write_impacts(out_dir, reader, idf):
+    # reader: SegmentReader over the positional segment; idf: term -> idf
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    doc_lens = np.array([reader.doc_len(d) for d in range(reader.num_docs)], dtype=np.float64)
+
+    rows = []
+    top = 0.0
+    for term in reader.terms():
+        postings = reader.postings(term)
+        docs = np.array([d for d, _ in postings], dtype=np.int32)
+        tf = np.array([f for _, f in postings], dtype=np.float64)
+        impacts = idf.get(term, 0.0) * bm25_tf(tf, doc_lens[docs], reader.avg_doc_len)
+        rows.append((docs, impacts))
+        top = max(top, float(impacts.max(initial=0.0)))
+    scale = top / LEVELS if top > 0 else 1.0
+
+    tier_ptr, tier_off = [0], [0]
+    doc_chunks, impact_chunks = [], []
+    for docs, impacts in rows:
+        q = np.clip(np.rint(impacts / scale), 1, LEVELS).astype(np.uint8)
+        order = np.lexsort((docs, -q.astype(np.int16)))   # impact desc, then doc num
+        doc_chunks.append(docs[order])
+        impact_chunks.append(q[order])
+        size = FIRST_TIER
+        start = tier_off[-1]
+        end = start + len(docs)
+        while start < end:
+            start = min(end, start + size)
+            tier_off.append(start)
+            size *= 2
+        tier_ptr.append(len(tier_off) - 1)
+
+    empty = np.zeros(0, dtype=np.int32)
+    np.save(out_dir / "tier_ptr.npy", np.array(tier_ptr, dtype=np.int64))
+    np.save(out_dir / "tier_off.npy", np.array(tier_off, dtype=np.int64))
+    np.save(out_dir / "docs.npy", np.concatenate(doc_chunks) if doc_chunks else empty)
+    np.save(out_dir / "impacts.npy",
+            np.concatenate(impact_chunks) if impact_chunks else empty.astype(np.uint8))
+    meta = {"num_terms": reader.num_terms, "num_docs": reader.num_docs, "num_tiers": len(tier_off) - 1,
+            "nnz": tier_off[-1], "scale": scale, "levels": LEVELS, "first_tier": FIRST_TIER}
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+class ImpactIndex:
+    def __init__(self, path, reader):
+        self.path = Path(path)
+        self.reader = reader
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if (self.meta["num_terms"], self.meta["num_docs"]) != (reader.num_terms, reader.num_docs):
+            raise ValueError(f"{self.path} does not match segment {reader.path}; rebuild the index")
+        self.num_docs = self.meta["num_docs"]
+        self.scale = self.meta["scale"]
+        self.tier_ptr = np.load(self.path / "tier_ptr.npy", mmap_mode="r")
+        self.tier_off = np.load(self.path / "tier_off.npy", mmap_mode="r")
+        self.docs = np.load(self.path / "docs.npy", mmap_mode="r")
+        self.impacts = np.load(self.path / "impacts.npy", mmap_mode="r")
+
+    def prefault(self, term_ids=()):
+        # page in the tier tables and every tier of term_ids; -> bytes
+        touched = page_in_array(self.tier_ptr) + page_in_array(self.tier_off)
+        for r in term_ids:
+            start = int(self.tier_off[self.tier_ptr[r]])
+            end = int(self.tier_off[self.tier_ptr[r + 1]])
+            touched += page_in_array(self.docs, start, end) + page_in_array(self.impacts, start, end)
+        return touched
+
+    def _tiers(self, query_tokens):
+        # -> [(top impact, term slot, start, end, qtf)] best first, plus the
+        # top impact of every tier per term
+        tiers, per_term = [], []
+        for q, qtf in Counter(query_tokens).items():
+            r = self.reader.term_id(q)
+            if r is None:
+                continue
+            slot = len(per_term)
+            offs = [int(o) for o in self.tier_off[self.tier_ptr[r]:self.tier_ptr[r + 1] + 1]]
+            tops = [int(self.impacts[o]) * qtf for o in offs[:-1]]
+            per_term.append(tops)
+            for i, top in enumerate(tops):
+                tiers.append((top, slot, offs[i], offs[i + 1], qtf))
+        tiers.sort(key=lambda x: (-x[0], x[1]))
+        return tiers, per_term
+
+    def saat(self, query_tokens, k=10, slack=0):
+        # -> ([(doc_num, quantized score)] best first, postings scored);
+        # with slack, also every doc within slack levels of the k-th
+        tiers, per_term = self._tiers(query_tokens)
+        if not tiers or k <= 0:
+            return [], 0
+        acc = np.zeros(self.num_docs, dtype=np.int32)
+        seen = np.zeros(self.num_docs, dtype=np.uint64) if len(per_term) <= MASK_TERMS else None
+        # what each term can still add: the impact of its next unread tier
+        read = [0] * len(per_term)
+        rem = [tops[0] for tops in per_term]
+        scored = 0
+        next_check = 2 * k
+        for _, slot, start, end, qtf in tiers:
+            docs = self.docs[start:end]
+            impacts = self.impacts[start:end].astype(np.int32)
+            acc[docs] += impacts * qtf if qtf > 1 else impacts   # doc nums are unique per term
+            if seen is not None:
+                seen[docs] |= np.uint64(1 << slot)
+            scored += end - start
+            tops = per_term[slot]
+            read[slot] += 1
+            rem[slot] = tops[read[slot]] if read[slot] < len(tops) else 0
+            if scored >= next_check:
+                next_check *= 2
+                if self._settled(acc, seen, rem, k, slack):
+                    break
+        count("postings_scored", scored)
+        return self._top(acc, k, slack), scored
+
+    @staticmethod
+    def _settled(acc, seen, rem, k, slack):
+        # True when no doc below the cut (k-th score - slack) can reach it
+        remaining = sum(rem)
+        if not remaining:
+            return True
+        hits = np.flatnonzero(acc)
+        if len(hits) < k:
+            return False
+        cut = int(acc[hits[np.argpartition(-acc[hits], k - 1)[k - 1]]]) - slack
+        if remaining >= cut:
+            return False   # an unseen doc could still get in
+        below = hits[acc[hits] < cut]
+        if not len(below):
+            return True
+        bound = acc[below].astype(np.int64)
+        if seen is None:
+            bound += remaining
+        else:
+            masks = seen[below]
+            for slot, r in enumerate(rem):
+                if r:
+                    bound += np.where(masks & np.uint64(1 << slot), 0, r)
+        return int(bound.max()) < cut
+
+    @staticmethod
+    def _top(acc, k, slack=0):
+        hits = np.flatnonzero(acc)
+        if len(hits) > k:
+            kth = acc[hits[np.argpartition(-acc[hits], k - 1)[k - 1]]]
+            hits = hits[acc[hits] >= kth - slack]
+        hits = hits[np.lexsort((hits, -acc[hits]))]
+        if not slack:
+            hits = hits[:k]
+        return [(int(d), int(acc[d])) for d in hits]
+
+    def top_k(self, query_tokens, k=10):
+        # -> [(doc_id, approximate BM25)] best first, at 8-bit precision
+        hits, _ = self.saat(query_tokens, k)
+        return [(self.reader.doc_id(d), round(s * self.scale, 4)) for d, s in hits]
+
+    def candidates(self, query_tokens, k=10):
+        # -> doc ids that include the exact BM25 top k (usually a few more)
+        error = sum(qtf for q, qtf in Counter(query_tokens).items()
+                    if self.reader.term_id(q) is not None)
+        hits, _ = self.saat(query_tokens, k, slack=2 * error)
+        return [self.reader.doc_id(d) for d, _ in hits]
+
+
+def load_impact_index(path, reader):
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        return None
+    return ImpactIndex(path, reader)
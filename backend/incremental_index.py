@@ -0,0 +1,566 @@
+import argparse
+import heapq
+import json
+import os
+import shutil
+import threading
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+
+from analyzer import ANALYZER_FILE, DEFAULT, load_analyzer
+from build_index import OUT_DIR, load_docs, build_indexes
+from result_cache import write_build_marker
+from segment import END, SegmentReader, SegmentWriter, idf_value
+
+# ----------------------------------------
+# INCREMENTAL (APPEND-ONLY) INDEX
+# ----------------------------------------
+# The live index is a directory of immutable segments plus a manifest:
+#
+#   live/manifest.json            generation, segment list, per-segment stats
+#   live/analyzer.json            the analyzer every live segment was built with
+#   live/seg_000001/...           a normal segment (see segment.py)
+#   live/seg_000001/tombstones.bin  deleted-docs bitmap (1 bit per doc num)
+#
+# Every JSONL batch becomes a new segment, so ingesting a delta costs
+# about the size of the delta. Deletes only flip tombstone bits, and a
+# document re-added under an existing id replaces the old copy. A tiered
+# merge policy (Lucene style) compacts small segments and expunges
+# deleted docs. N and avg_len come from the manifest's live counts; df is
+# the sum of per-segment dfs, so deleted docs still count towards df until
+# their segment is merged (same trade-off Lucene makes).
+#
+# A live index created inside a batch index directory starts with the
+# batch segment (<index dir>/positional) as its first segment, so the
+# batch docs stay searchable; the docstore and title fields are looked up
+# by doc id through the batch segment and cover them as before. A later
+# batch rebuild does not touch live/; remove it to start over from the
+# new batch segment.
+
+LIVE_DIR = OUT_DIR / "live"
+MANIFEST_FILE = "manifest.json"
+TOMBSTONES_FILE = "tombstones.bin"
+
+SEGMENTS_PER_TIER = 10    # merge once a tier holds this many segments
+FLOOR_DOCS = 1000         # segments smaller than this all share tier 0
+MAX_DELETED_RATIO = 0.2   # rewrite a segment once this share is deleted
+
+
+def _write_atomic(path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_manifest(root):
+    path = Path(root) / MANIFEST_FILE
+    if not path.exists():
+        return {"generation": 0, "next_segment": 1, "segments": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_tombstones(seg_dir, num_docs):
+    path = Path(seg_dir) / TOMBSTONES_FILE
+    if not path.exists():
+        return bytearray((num_docs + 7) // 8)
+    return bytearray(path.read_bytes())
+
+
+def is_deleted(bits, doc_num):
+    return bits[doc_num >> 3] & (1 << (doc_num & 7))
+
+
+# ----------------------------------------
+# READER OVER ALL LIVE SEGMENTS
+# ----------------------------------------
+class MultiSegmentReader:
+    # Same interface as SegmentReader. Global doc num = segment base + local
+    # doc num; deleted docs leave holes that are skipped while decoding.
+    def __init__(self, root=LIVE_DIR):
+        self.root = Path(root)
+        self.manifest = load_manifest(self.root)
+        self.generation = self.manifest["generation"]
+        self.segments = []
+        self.tombstones = []
+        self.bases = []
+        base = 0
+        for info in self.manifest["segments"]:
+            seg_dir = self.root / info["name"]
+            reader = SegmentReader(seg_dir)
+            self.segments.append(reader)
+            self.tombstones.append(load_tombstones(seg_dir, reader.num_docs))
+            self.bases.append(base)
+            base += reader.num_docs
+
+        live_docs = sum(s["num_docs"] - s["num_deleted"] for s in self.manifest["segments"])
+        live_len = sum(s["live_len"] for s in self.manifest["segments"])
+        self.num_docs = live_docs
+        self.avg_doc_len = live_len / live_docs if live_docs else 0.0
+        self.num_terms = sum(r.num_terms for r in self.segments)
+
+    def is_current(self):
+        return load_manifest(self.root)["generation"] == self.generation
+
+    def _locate(self, doc_num):
+        i = bisect_right(self.bases, doc_num) - 1
+        return i, doc_num - self.bases[i]
+
+    # --- doc id table ---
+    def all_docs(self):
+        for i, reader in enumerate(self.segments):
+            bits = self.tombstones[i]
+            for d in range(reader.num_docs):
+                if not is_deleted(bits, d):
+                    yield self.bases[i] + d
+
+    def doc_id(self, doc_num):
+        i, local = self._locate(doc_num)
+        return self.segments[i].doc_id(local)
+
+    def doc_num(self, doc_id):
+        # newest live copy wins
+        for i in range(len(self.segments) - 1, -1, -1):
+            local = self.segments[i].doc_num(doc_id)
+            if local is not None and not is_deleted(self.tombstones[i], local):
+                return self.bases[i] + local
+        return None
+
+    def doc_len(self, doc_num):
+        i, local = self._locate(doc_num)
+        return self.segments[i].doc_len(local)
+
+    # --- term dictionary ---
+    def __contains__(self, term):
+        return any(term in r for r in self.segments)
+
+    def terms(self):
+        last = None
+        for term in heapq.merge(*(r.terms() for r in self.segments)):
+            if term != last:
+                yield term
+                last = term
+
+    def doc_freq(self, term):
+        return sum(r.doc_freq(term) for r in self.segments)
+
+    def score_bounds(self, term):
+        # stored BM25 bounds were computed against each segment's own
+        # avg_len, so only the tf / doc_len bound is safe to reuse
+        bounds = [r.score_bounds(term)[1] for r in self.segments]
+        return None, max(bounds, default=0.0)
+
+    # --- postings ---
+    def _live(self, term, decode):
+        out = []
+        for i, reader in enumerate(self.segments):
+            base, bits = self.bases[i], self.tombstones[i]
+            for d, value in decode(reader, term):
+                if not is_deleted(bits, d):
+                    out.append((base + d, value))
+        return out
+
+    def doc_nums(self, term):
+        out = array("I")
+        for i, reader in enumerate(self.segments):
+            base, bits = self.bases[i], self.tombstones[i]
+            out.extend(base + d for d in reader.doc_nums(term) if not is_deleted(bits, d))
+        return out
+
+    def postings(self, term):
+        return self._live(term, SegmentReader.postings)
+
+    def positions(self, term):
+        return self._live(term, SegmentReader.positions)
+
+    def cursor(self, term):
+        parts = []
+        for i, reader in enumerate(self.segments):
+            c = reader.cursor(term)
+            if c is not None:
+                parts.append((c, self.bases[i], self.tombstones[i]))
+        return _LiveCursor(parts) if parts else None
+
+    # --- warm-up (warmup.py) ---
+    # term ids are per segment, so this reader hands out the terms
+    # themselves as ids: hot_terms returns strings and term() maps them back
+    def hot_terms(self, n):
+        candidates = {r.term(t) for r in self.segments for t in r.hot_terms(n)}
+        return heapq.nlargest(n, candidates, key=self.doc_freq)
+
+    def term(self, term):
+        return term
+
+    def prefault(self, terms=()):
+        touched = 0
+        for r in self.segments:
+            touched += r.prefault([tid for tid in map(r.term_id, terms) if tid is not None])
+        return touched
+
+
+class _LiveCursor:
+    # the segments' PostingsCursors one after the other, shifted by their
+    # bases; tombstoned docs are stepped over
+    __slots__ = ("parts", "k")
+
+    def __init__(self, parts):
+        self.parts = parts   # (cursor, base, tombstones), ascending bases
+        self.k = 0
+
+    def next_geq(self, target):
+        parts = self.parts
+        while self.k < len(parts):
+            c, base, bits = parts[self.k]
+            d = c.next_geq(max(0, target - base))
+            while d != END and is_deleted(bits, d):
+                d = c.next_geq(d + 1)
+            if d != END:
+                return base + d
+            self.k += 1
+        return END
+
+    def tf(self):
+        return self.parts[self.k][0].tf()
+
+    def positions(self):
+        return self.parts[self.k][0].positions()
+
+
+class IdfTable:
+    # dict-like idf computed from the live index's N and summed df
+    def __init__(self, reader):
+        self.reader = reader
+        self._cache = {}
+
+    def get(self, term, default=None):
+        if term not in self._cache:
+            df = self.reader.doc_freq(term)
+            self._cache[term] = idf_value(self.reader.num_docs, df) if df else None
+        value = self._cache[term]
+        return default if value is None else value
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __getitem__(self, term):
+        value = self.get(term)
+        if value is None:
+            raise KeyError(term)
+        return value
+
+
+def open_index(root=LIVE_DIR):
+    reader = MultiSegmentReader(root)
+    return reader, IdfTable(reader)
+
+
+# ----------------------------------------
+# WRITER + TIERED MERGE POLICY
+# ----------------------------------------
+def _write_batch_segment(seg_dir, doc_ids, cleaned_docs, positional_index):
+    writer = SegmentWriter(seg_dir, doc_ids, [len(cleaned_docs[d]) for d in doc_ids])
+    for term in sorted(positional_index, key=lambda t: t.encode("utf-8")):
+        writer.add(term, positional_index[term])
+    writer.close()
+
+
+class IndexWriter:
+    def __init__(self, root=LIVE_DIR, analyzer=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest = load_manifest(self.root)
+        # one analyzer for every live segment: a new live index takes the
+        # one of the batch index it sits in (or the given one) and saves it
+        if (self.root / ANALYZER_FILE).exists():
+            self.analyzer = load_analyzer(self.root)
+            if analyzer is not None and analyzer.config() != self.analyzer.config():
+                raise ValueError(f"{self.root} was built with analyzer {self.analyzer.config()}")
+        else:
+            # segments written before the analyzer was saved used the default
+            fallback = DEFAULT if self.manifest["segments"] else load_analyzer(self.root.parent)
+            self.analyzer = analyzer or fallback
+            if self._base() is not None and self.analyzer.config() != fallback.config():
+                raise ValueError(f"{self.root.parent} was built with analyzer {fallback.config()}")
+            self.analyzer.save(self.root)
+        self._lock = threading.Lock()
+        self._merging = set()
+        self._sweep()
+        base = self._base()
+        if base is not None:
+            self._seed(base)
+
+    def _base(self):
+        # the batch segment a new live index starts from, if there is one
+        base = self.root.parent / "positional"
+        if (self.root / MANIFEST_FILE).exists() or not (base / "meta.json").exists():
+            return None
+        return base
+
+    def _seed(self, base):
+        # the batch segment becomes the first live segment, hardlinked (no
+        # file of a segment is ever rewritten, and build_index swaps whole
+        # directories), so its docs keep doc nums 0 .. N-1 and are replaced,
+        # deleted and merged like any other
+        reader = SegmentReader(base)
+        name = self._new_name()
+        seg_dir = self._seg_dir(name)
+        seg_dir.mkdir()
+        for path in base.iterdir():
+            try:
+                os.link(path, seg_dir / path.name)
+            except OSError:
+                shutil.copy2(path, seg_dir / path.name)
+        total_len = reader.meta["total_len"]
+        self.manifest["segments"].append({
+            "name": name,
+            "num_docs": reader.num_docs,
+            "num_deleted": 0,
+            "total_len": total_len,
+            "live_len": total_len,
+        })
+        self._commit()
+
+    def _seg_dir(self, name):
+        return self.root / name
+
+    def _info(self, name):
+        for info in self.manifest["segments"]:
+            if info["name"] == name:
+                return info
+        return None
+
+    def _commit(self):
+        self.manifest["generation"] += 1
+        data = json.dumps(self.manifest, indent=1).encode("utf-8")
+        _write_atomic(self.root / MANIFEST_FILE, data)
+        # searchers of the index dir around live/ reopen on the new marker
+        write_build_marker(self.root.parent, live_generation=self.manifest["generation"])
+
+    def _sweep(self):
+        # drop segment dirs a crashed write or finished merge left behind
+        live = {info["name"] for info in self.manifest["segments"]}
+        for path in self.root.glob("seg_*"):
+            if path.is_dir() and path.name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _new_name(self):
+        name = f"seg_{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+        return name
+
+    # --- deletes ---
+    def _delete_locked(self, doc_ids):
+        doc_ids = set(doc_ids)
+        deleted = 0
+        for info in self.manifest["segments"]:
+            seg_dir = self._seg_dir(info["name"])
+            reader = SegmentReader(seg_dir)
+            bits = load_tombstones(seg_dir, reader.num_docs)
+            changed = False
+            for doc_id in doc_ids:
+                local = reader.doc_num(doc_id)
+                if local is None or is_deleted(bits, local):
+                    continue
+                bits[local >> 3] |= 1 << (local & 7)
+                info["num_deleted"] += 1
+                info["live_len"] -= reader.doc_len(local)
+                changed = True
+                deleted += 1
+            if changed:
+                _write_atomic(seg_dir / TOMBSTONES_FILE, bytes(bits))
+        return deleted
+
+    def delete(self, doc_ids):
+        with self._lock:
+            deleted = self._delete_locked(doc_ids)
+            if deleted:
+                self._commit()
+        return deleted
+
+    # --- adds ---
+    def add_documents(self, cleaned_docs):
+        # cleaned_docs: doc_id -> tokens from self.analyzer; existing ids
+        # are replaced
+        if not cleaned_docs:
+            return None
+        doc_ids = sorted(cleaned_docs)
+        positional_index, _ = build_indexes(cleaned_docs, doc_ids, with_biword=False)
+
+        with self._lock:
+            name = self._new_name()
+        seg_dir = self._seg_dir(name)
+        _write_batch_segment(seg_dir, doc_ids, cleaned_docs, positional_index)
+
+        with self._lock:
+            self._delete_locked(doc_ids)
+            total_len = sum(len(t) for t in cleaned_docs.values())
+            self.manifest["segments"].append({
+                "name": name,
+                "num_docs": len(doc_ids),
+                "num_deleted": 0,
+                "total_len": total_len,
+                "live_len": total_len,
+            })
+            self._commit()
+        return name
+
+    def add_batch(self, path):
+        _, cleaned_docs = load_docs(path, self.analyzer)
+        return self.add_documents(cleaned_docs)
+
+    # --- merges ---
+    def find_merges(self):
+        # tier = how many times SEGMENTS_PER_TIER fits into the live size
+        tiers = {}
+        merges = []
+        for info in self.manifest["segments"]:
+            if info["name"] in self._merging:
+                continue
+            live = info["num_docs"] - info["num_deleted"]
+            if info["num_docs"] and info["num_deleted"] / info["num_docs"] > MAX_DELETED_RATIO:
+                merges.append([info["name"]])
+                continue
+            tier = 0
+            size = max(live, FLOOR_DOCS)
+            while size >= FLOOR_DOCS * SEGMENTS_PER_TIER:
+                size //= SEGMENTS_PER_TIER
+                tier += 1
+            tiers.setdefault(tier, []).append(info)
+        for tier in sorted(tiers):
+            group = sorted(tiers[tier], key=lambda s: s["num_docs"] - s["num_deleted"])
+            while len(group) >= SEGMENTS_PER_TIER:
+                merges.append([s["name"] for s in group[:SEGMENTS_PER_TIER]])
+                group = group[SEGMENTS_PER_TIER:]
+        return merges
+
+    def merge(self, names):
+        with self._lock:
+            if any(n in self._merging or self._info(n) is None for n in names):
+                return None
+            self._merging.update(names)
+            new_name = self._new_name()
+        try:
+            return self._merge(names, new_name)
+        finally:
+            with self._lock:
+                self._merging.difference_update(names)
+
+    def _merge(self, names, new_name):
+        readers = [SegmentReader(self._seg_dir(n)) for n in names]
+        snapshots = [load_tombstones(self._seg_dir(n), r.num_docs) for n, r in zip(names, readers)]
+
+        # new doc table: live docs of every input, in order
+        remaps, doc_ids, doc_lens = [], [], []
+        for reader, bits in zip(readers, snapshots):
+            remap = [-1] * reader.num_docs
+            for d in range(reader.num_docs):
+                if not is_deleted(bits, d):
+                    remap[d] = len(doc_ids)
+                    doc_ids.append(reader.doc_id(d))
+                    doc_lens.append(reader.doc_len(d))
+            remaps.append(remap)
+
+        new_dir = self._seg_dir(new_name)
+        writer = SegmentWriter(new_dir, doc_ids, doc_lens)
+        last = None
+        for term in heapq.merge(*(r.terms() for r in readers)):
+            if term == last:
+                continue
+            last = term
+            postings = {}
+            for reader, remap in zip(readers, remaps):
+                for d, positions in reader.positions(term):
+                    if remap[d] >= 0:
+                        postings[remap[d]] = positions
+            if postings:
+                writer.add(term, postings)
+        writer.close()
+
+        with self._lock:
+            # carry over deletes that landed while we were merging
+            bits_new = bytearray((len(doc_ids) + 7) // 8)
+            num_deleted = 0
+            live_len = sum(doc_lens)
+            for n, reader, snap, remap in zip(names, readers, snapshots, remaps):
+                current = load_tombstones(self._seg_dir(n), reader.num_docs)
+                for d in range(reader.num_docs):
+                    if is_deleted(current, d) and not is_deleted(snap, d):
+                        nd = remap[d]
+                        bits_new[nd >> 3] |= 1 << (nd & 7)
+                        num_deleted += 1
+                        live_len -= doc_lens[nd]
+            if num_deleted:
+                _write_atomic(new_dir / TOMBSTONES_FILE, bytes(bits_new))
+
+            segments = self.manifest["segments"]
+            first = min(i for i, s in enumerate(segments) if s["name"] in names)
+            kept = [s for s in segments if s["name"] not in names]
+            kept.insert(first, {
+                "name": new_name,
+                "num_docs": len(doc_ids),
+                "num_deleted": num_deleted,
+                "total_len": sum(doc_lens),
+                "live_len": live_len,
+            })
+            self.manifest["segments"] = kept
+            self._commit()
+
+        for n in names:
+            shutil.rmtree(self._seg_dir(n), ignore_errors=True)
+        return new_name
+
+    def maybe_merge(self, background=False):
+        def run():
+            while True:
+                merges = self.find_merges()
+                if not merges:
+                    return
+                for names in merges:
+                    self.merge(names)
+
+        if background:
+            thread = threading.Thread(target=run, name="segment-merge", daemon=True)
+            thread.start()
+            return thread
+        run()
+        return None
+
+
+# ----------------------------------------
+# CLI
+# ----------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Incremental segment index")
+    parser.add_argument("--root", default=str(LIVE_DIR))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    add = sub.add_parser("add", help="index a JSONL batch as a new segment")
+    add.add_argument("paths", nargs="+")
+    delete = sub.add_parser("delete", help="tombstone documents by id")
+    delete.add_argument("doc_ids", nargs="+")
+    sub.add_parser("merge", help="run the tiered merge policy")
+    sub.add_parser("stats", help="print live collection statistics")
+    args = parser.parse_args()
+
+    writer = IndexWriter(args.root)
+    if args.cmd == "add":
+        for path in args.paths:
+            name = writer.add_batch(path)
+            print(f"Added {path} as {name}")
+        writer.maybe_merge()
+    elif args.cmd == "delete":
+        print(f"Deleted {writer.delete(args.doc_ids)} documents.")
+        writer.maybe_merge()
+    elif args.cmd == "merge":
+        writer.maybe_merge()
+
+    reader = MultiSegmentReader(args.root)
+    print(f"generation={reader.generation} segments={len(reader.segments)} "
+          f"N={reader.num_docs} avg_len={reader.avg_doc_len:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import json
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from segment import BM25_K1, BM25_B, page_in_array
+from tracing import count, span
+
+# ----------------------------------------
+# TERM x DOCUMENT MATRIX (NUMPY)
+# ----------------------------------------
+# The positional segment's postings re-laid out as a sparse term x doc
+# matrix in CSR form (one row per term, rows in term-dictionary order):
+#
+#   indptr.npy    int64  [num_terms + 1]  row r is indices[indptr[r]:indptr[r+1]]
+#   indices.npy   int32  [nnz]            doc nums, ascending within a row
+#   tf.npy        int32  [nnz]            term frequency
+#   doc_len.npy   float64[num_docs]       token count per doc
+#   idf.npy       float64[num_terms]      collection idf per row
+#   ftf.npy       float32[nnz]            BM25F tf~ (fields.py), when the field
+#                                         index was built first
+#   meta.json     shape + avg_doc_len, checked against the segment
+#
+# Everything is np.load(mmap_mode="r"), so opening costs nothing and a
+# query touches only its terms' slices. Scoring a query is a few array
+# operations per term into a dense score vector plus argpartition, which
+# makes exhaustive scoring cheap enough to be the reference baseline for
+# the pruned engines (WAND in topk.py). With the field index (fields.py)
+# attached, scoring="bm25f" scores title and abstract as separate fields.
+# A posting's tf~ depends on no query parameter (k1 only enters at
+# saturation), so it is computed once here: BM25F then reads one slice
+# per term where BM25 gathers the length norm of every doc in the row.
+
+META_FILE = "meta.json"
+STREAM_BATCH = 4096   # doc nums top_k_stream pulls from its stream per step
+FTF_CHUNK = 1 << 20   # postings per step when writing ftf.npy
+
+
+def write_matrix(out_dir, reader, idf, fields=None):
+    # reader: SegmentReader over the positional segment; idf: term -> idf;
+    # fields: its FieldIndex, for the BM25F tf~ column
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    num_terms = reader.num_terms
+
+    indptr = np.zeros(num_terms + 1, dtype=np.int64)
+    for r in range(num_terms):
+        indptr[r + 1] = indptr[r] + reader.entry_at(r)[0]
+    nnz = int(indptr[-1])
+
+    indices = np.lib.format.open_memmap(out_dir / "indices.npy", mode="w+", dtype=np.int32, shape=(nnz,))
+    tf = np.lib.format.open_memmap(out_dir / "tf.npy", mode="w+", dtype=np.int32, shape=(nnz,))
+    idf_vec = np.zeros(num_terms, dtype=np.float64)
+    for r, term in enumerate(reader.terms()):
+        postings = reader.postings(term)
+        start = indptr[r]
+        indices[start:start + len(postings)] = [d for d, _ in postings]
+        tf[start:start + len(postings)] = [f for _, f in postings]
+        idf_vec[r] = idf.get(term, 0.0)
+    indices.flush()
+    tf.flush()
+    if fields is not None:
+        ftf = np.lib.format.open_memmap(out_dir / "ftf.npy", mode="w+", dtype=np.float32, shape=(nnz,))
+        for start in range(0, nnz, FTF_CHUNK):
+            end = min(start + FTF_CHUNK, nnz)
+            ftf[start:end] = fields.field_tf(start, end, indices[start:end], tf[start:end])
+        ftf.flush()
+        del ftf
+    del indices, tf
+
+    np.save(out_dir / "indptr.npy", indptr)
+    np.save(out_dir / "idf.npy", idf_vec)
+    np.save(out_dir / "doc_len.npy",
+            np.array([reader.doc_len(d) for d in range(reader.num_docs)], dtype=np.float64))
+    meta = {"num_terms": num_terms, "num_docs": reader.num_docs, "nnz": nnz,
+            "avg_doc_len": reader.avg_doc_len}
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+class TermDocMatrix:
+    def __init__(self, path, reader, fields=None):
+        # reader maps terms to rows (term_id) and doc nums to ids; fields
+        # (a FieldIndex) splits each row's tf for scoring="bm25f"
+        self.path = Path(path)
+        self.reader = reader
+        self.fields = fields
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if (self.meta["num_terms"], self.meta["num_docs"]) != (reader.num_terms, reader.num_docs):
+            raise ValueError(f"{self.path} does not match segment {reader.path}; rebuild the index")
+        if fields is not None and (fields.meta["nnz"] != self.meta["nnz"] or not (self.path / "ftf.npy").exists()):
+            raise ValueError(f"{fields.path} does not match {self.path}; rebuild the index")
+        self.num_docs = self.meta["num_docs"]
+        self.avg_doc_len = self.meta["avg_doc_len"]
+        self.indptr = np.load(self.path / "indptr.npy", mmap_mode="r")
+        self.indices = np.load(self.path / "indices.npy", mmap_mode="r")
+        self.tf = np.load(self.path / "tf.npy", mmap_mode="r")
+        self.doc_len = np.load(self.path / "doc_len.npy", mmap_mode="r")
+        self.idf = np.load(self.path / "idf.npy", mmap_mode="r")
+        self.ftf = None if fields is None else np.load(self.path / "ftf.npy", mmap_mode="r")
+        self._norms = {}
+
+    def row(self, term):
+        r = self.reader.term_id(term)
+        if r is None:
+            return None, None
+        start, end = self.indptr[r], self.indptr[r + 1]
+        return self.indices[start:end], self.tf[start:end]
+
+    def prefault(self, term_ids=()):
+        # page in the per-doc arrays and the rows of term_ids; -> bytes
+        touched = sum(page_in_array(a) for a in (self.indptr, self.doc_len, self.idf))
+        for r in term_ids:
+            start, end = int(self.indptr[r]), int(self.indptr[r + 1])
+            touched += page_in_array(self.indices, start, end) + page_in_array(self.tf, start, end)
+            if self.ftf is not None:
+                touched += page_in_array(self.ftf, start, end)
+        self._length_norm(BM25_K1, BM25_B)
+        return touched
+
+    def _length_norm(self, k1, b):
+        # k1 * (1 - b + b * |d| / avgdl), once per (k1, b)
+        norm = self._norms.get((k1, b))
+        if norm is None:
+            norm = self._norms[(k1, b)] = k1 * (1 - b + b * (self.doc_len / self.avg_doc_len))
+        return norm
+
+    def _check_scoring(self, scoring):
+        if scoring == "bm25f" and self.fields is None:
+            raise ValueError("bm25f scoring needs the field index; rebuild without --no-fields")
+
+    def scores(self, query_tokens, scoring="bm25", k1=BM25_K1, b=BM25_B):
+        # dense score vector over all doc nums
+        self._check_scoring(scoring)
+        scores = np.zeros(self.num_docs, dtype=np.float64)
+        norm = self._length_norm(k1, b) if scoring == "bm25" else None
+        for q, qtf in Counter(query_tokens).items():
+            r = self.reader.term_id(q)
+            if r is None or self.idf[r] == 0.0:
+                continue
+            start, end = self.indptr[r], self.indptr[r + 1]
+            docs = self.indices[start:end]
+            tf = self.tf[start:end]
+            weight = qtf * self.idf[r]
+            count("postings_scored", int(end - start))
+            if scoring == "bm25":
+                scores[docs] += weight * (tf * (k1 + 1) / (tf + norm[docs]))
+            elif scoring == "bm25f":
+                ftf = self.ftf[start:end].astype(np.float64)
+                scores[docs] += weight * (ftf * (k1 + 1) / (ftf + k1))
+            else:
+                scores[docs] += weight * (tf / self.doc_len[docs])
+        return scores
+
+    def doc_scores(self, query_tokens, doc_nums, scoring="bm25", k1=BM25_K1, b=BM25_B):
+        # scores of just doc_nums (sorted, unique): each row is binary
+        # searched for them instead of scattering the whole row
+        self._check_scoring(scoring)
+        scores = np.zeros(len(doc_nums), dtype=np.float64)
+        norm = self._length_norm(k1, b) if scoring == "bm25" else None
+        for q, qtf in Counter(query_tokens).items():
+            r = self.reader.term_id(q)
+            if r is None or self.idf[r] == 0.0:
+                continue
+            start, end = self.indptr[r], self.indptr[r + 1]
+            docs = self.indices[start:end]
+            at = np.minimum(np.searchsorted(docs, doc_nums), len(docs) - 1)
+            found = docs[at] == doc_nums
+            count("postings_scored", int(found.sum()))
+            tf = self.tf[start:end][at[found]]
+            hit = doc_nums[found]
+            weight = qtf * self.idf[r]
+            if scoring == "bm25":
+                scores[found] += weight * (tf * (k1 + 1) / (tf + norm[hit]))
+            elif scoring == "bm25f":
+                ftf = self.ftf[start:end][at[found]].astype(np.float64)
+                scores[found] += weight * (ftf * (k1 + 1) / (ftf + k1))
+            else:
+                scores[found] += weight * (tf / self.doc_len[hit])
+        return scores
+
+    def top_k(self, query_tokens, k=10, scoring="bm25", candidates=None, k1=BM25_K1, b=BM25_B):
+        # -> [(doc_id, score)] like ranker / topk; candidates: external ids
+        if candidates is not None:
+            nums = np.unique(np.array([n for n in map(self.reader.doc_num, candidates) if n is not None],
+                                      dtype=np.int64))
+            scores = np.zeros(self.num_docs, dtype=np.float64)
+            scores[nums] = self.doc_scores(query_tokens, nums, scoring, k1, b)
+            hits = nums[scores[nums] > 0]
+        else:
+            scores = self.scores(query_tokens, scoring, k1, b)
+            hits = np.flatnonzero(scores > 0)
+        if k is not None and len(hits) > k:
+            # k-th best score, then everything tied with it so the cut is
+            # deterministic (lower doc num wins, as in topk.py)
+            kth = scores[hits[np.argpartition(-scores[hits], k - 1)[k - 1]]]
+            hits = hits[scores[hits] >= kth]
+        hits = hits[np.lexsort((hits, -scores[hits]))][:k]
+        return [(self.reader.doc_id(int(d)), round(float(scores[d]), 4)) for d in hits]
+
+    def top_k_stream(self, query_tokens, doc_nums, k=None, scoring="bm25", batch=STREAM_BATCH):
+        # top_k over candidates that arrive as an ascending iterator of doc
+        # nums (query_planner.execute), pulled and scored a batch at a time.
+        # Every candidate is a match and is kept: one that scores 0 (NOT-only
+        # and OR NOT queries) ranks after the scored ones, by doc num
+        nums, scores = [], []
+        while True:
+            with span("intersect"):
+                chunk = np.fromiter(islice(doc_nums, batch), dtype=np.int64)
+            if not len(chunk):
+                break
+            with span("score"):
+                scores.append(self.doc_scores(query_tokens, chunk, scoring))
+                count("candidates_scored", len(chunk))
+                nums.append(chunk)
+        if not nums:
+            return []
+        with span("score"):
+            hits, s = np.concatenate(nums), np.concatenate(scores)
+            order = np.lexsort((hits, -s))[:k]
+            return [(self.reader.doc_id(int(hits[i])), round(float(s[i]), 4)) for i in order]
+
+
+def load_matrix(path, reader, fields=None):
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        return None
+    return TermDocMatrix(path, reader, fields)
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+from analyzer import DEFAULT, Analyzer
+from runs import merge_runs, record_id, write_run
+from segment import idf_value
+
+# ----------------------------------------
+# PARALLEL (MAP / REDUCE) INDEX BUILD
+# ----------------------------------------
+# count:  the records in each range are counted (raw lines, no JSON
+#         parsing), so a record without an id gets the same ordinal id
+#         (runs.record_id) as in the serial and SPIMI builds
+# map:    the JSONL file is cut into byte ranges aligned to line starts;
+#         each ProcessPoolExecutor worker tokenizes + inverts one range
+#         and writes a positional run (plus a word-pair run when the
+#         n-gram phrase index is enabled) to disk
+# reduce: merge_runs k-way merges the runs (in range order, so doc nums
+#         stay in file order) straight into the final segments
+#
+# A worker only ever holds one range in memory, and the merge holds one
+# term at a time, so peak RSS is bounded by CHUNK_BYTES, not corpus size.
+
+CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def split_ranges(path, parts):
+    size = os.path.getsize(path)
+    parts = max(parts, -(-size // CHUNK_BYTES))
+    step = max(1, -(-size // parts))
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def _read_range(path, start, end):
+    # non-blank lines that *start* inside [start, end) belong to this range
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                yield line
+
+
+def _count_range(args):
+    path, start, end = args
+    return sum(1 for _ in _read_range(path, start, end))
+
+
+def _invert_range(args):
+    path, start, end, base, tmp_dir, chunk_no, with_pairs, analyzer_config = args
+    analyzer = Analyzer(**analyzer_config)
+    doc_ids = []
+    doc_lens = []
+    positional = {}
+    biword = {}
+    for line in _read_range(path, start, end):
+        entry = json.loads(line)
+        doc_num = len(doc_ids)
+        doc_id = record_id(entry, base + doc_num)
+        text = entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
+        doc_ids.append(doc_id)
+
+        tokens = analyzer.analyze(text)
+        doc_lens.append(len(tokens))
+        for pos, term in enumerate(tokens):
+            positional.setdefault(term, {}).setdefault(doc_num, []).append(pos)
+        if not with_pairs:
+            continue
+        for i in range(len(tokens) - 1):
+            pair = tokens[i] + " " + tokens[i + 1]
+            biword.setdefault(pair, {}).setdefault(doc_num, []).append(i)
+
+    pos_run = os.path.join(tmp_dir, f"chunk_{chunk_no:05d}.pos.run")
+    write_run(pos_run, doc_ids, positional)
+    bi_run = None
+    if with_pairs:
+        bi_run = os.path.join(tmp_dir, f"chunk_{chunk_no:05d}.bi.run")
+        write_run(bi_run, doc_ids, biword, doc_lens)
+    return pos_run, bi_run, len(doc_ids)
+
+
+def build_parallel(docs_path, out_dir, workers=None, ngram_min_df=None, codecs=None, analyzer=DEFAULT):
+    workers = workers or os.cpu_count() or 1
+    tmp_dir = out_dir / "tmp_runs"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    ranges = split_ranges(docs_path, workers * 4)
+    with_pairs = ngram_min_df is not None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = list(pool.map(_count_range, [(str(docs_path), s, e) for s, e in ranges]))
+        bases = [0, *accumulate(counts)][:-1]   # ordinal of each range's first record
+        jobs = [(str(docs_path), s, e, base, str(tmp_dir), i, with_pairs, analyzer.config())
+                for i, ((s, e), base) in enumerate(zip(ranges, bases))]
+        print(f"Inverting {len(jobs)} byte ranges on {workers} workers ...")
+        results = list(pool.map(_invert_range, jobs))
+
+        pos_runs = [r[0] for r in results]
+        bi_runs = [r[1] for r in results]
+        n_docs = sum(r[2] for r in results)
+
+        # the two indexes merge independently, so reduce them side by side
+        print(f"Merging {len(pos_runs)} runs ({n_docs} docs) ...")
+        pos_merge = pool.submit(merge_runs, pos_runs, out_dir / "positional", codecs=codecs)
+        if with_pairs:
+            pool.submit(merge_runs, bi_runs, out_dir / "ngram", ngram_min_df, False, codecs=codecs).result()
+        df = pos_merge.result()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    idf = {t: idf_value(n_docs, d) for t, d in df.items()}
+    with open(out_dir / "idf.json", "w", encoding="utf-8") as f:
+        json.dump(idf, f)
+    return n_docs
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from positional import phrase_match
+from query_engine import doc_list, intersect_many
+from segment import SegmentReader, META_FILE
+from tracing import count, span
+
+# ----------------------------------------
+# PHRASE ENGINE
+# ----------------------------------------
+# Phrases are always answered from the positional index (phrase_spans
+# does the position intersection). Two deployments are supported:
+#
+#   positional  nothing extra on disk; candidates = AND of the terms
+#   ngram       a compact word-pair index: doc-only postings (deduplicated,
+#               no positions) for pairs with df >= min_df. Common pairs like
+#               "of the" get a candidate list far shorter than either term's,
+#               so fewer documents reach positional verification.
+#
+# bench/bench_phrase.py measures index size against phrase latency for
+# both, so the choice can be made per deployment at build time.
+
+NGRAM_MIN_DF = 10
+
+
+def word_pairs(tokens):
+    return [tokens[i] + " " + tokens[i + 1] for i in range(len(tokens) - 1)]
+
+
+def prune_ngrams(pair_index, min_df=NGRAM_MIN_DF):
+    # keep only the common pairs; rare ones are cheap to verify anyway
+    return {pair: postings for pair, postings in pair_index.items() if len(postings) >= min_df}
+
+
+def load_ngram_index(path):
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        return None
+    return SegmentReader(path)
+
+
+def phrase_docs(reader, tokens, ngram=None):
+    # -> [(doc_num, spans), ...]
+    if not tokens:
+        return []
+    if len(tokens) == 1:
+        return [(d, []) for d in doc_list(reader, tokens[0])]
+
+    candidates = None
+    if ngram is not None:
+        with span("intersect"):
+            pair_lists = [doc_list(ngram, p) for p in word_pairs(tokens) if p in ngram]
+            if pair_lists:
+                candidates = intersect_many(pair_lists)
+                count("candidates", len(candidates))
+    return phrase_match(reader, tokens, candidates)
+
+
+def phrase_search(reader, tokens, ngram=None):
+    return [reader.doc_id(d) for d, _ in phrase_docs(reader, tokens, ngram)]
@@ -0,0 +1,119 @@
+import heapq
+
+from query_engine import and_terms, intersect_many
+from tracing import count, span
+
+# ----------------------------------------
+# POSITIONAL MERGE ENGINE
+# ----------------------------------------
+# All matchers take the sorted position lists of the query terms inside
+# one document and return match spans as (first_pos, last_pos) token
+# positions, which the UI can reuse for highlighting.
+#
+#   phrase        terms at consecutive positions, in order
+#   NEAR/k        all terms inside a window with last - first <= k, any order
+#   W/k           same window, but the terms must appear in query order
+#
+# Every matcher is a forward-only merge over the lists, so a document
+# costs O(total positions) (NEAR/k adds a log(#terms) heap factor) instead
+# of the old O(|p1| * |p2|) nested loops.
+
+
+def phrase_spans(position_lists):
+    # shift term i's positions back by i; phrase starts are the common values
+    n = len(position_lists)
+    if n == 0:
+        return []
+    shifted = [[p - i for p in positions] for i, positions in enumerate(position_lists)]
+    return [(s, s + n - 1) for s in intersect_many(shifted)]
+
+
+def near_spans(position_lists, k):
+    # unordered: sweep the minimal windows that contain every term
+    if not position_lists or any(not p for p in position_lists):
+        return []
+    heap = [(p[0], i, 0) for i, p in enumerate(position_lists)]
+    heapq.heapify(heap)
+    hi = max(p[0] for p in position_lists)
+    spans = []
+    while True:
+        lo, i, j = heap[0]
+        if hi - lo <= k and (not spans or spans[-1][0] != lo):
+            spans.append((lo, hi))
+        if j + 1 == len(position_lists[i]):
+            break
+        nxt = position_lists[i][j + 1]
+        heapq.heapreplace(heap, (nxt, i, j + 1))
+        hi = max(hi, nxt)
+    return spans
+
+
+def ordered_spans(position_lists, k):
+    # ordered: for each start, take the earliest in-order chain; pointers
+    # only move forward because starts are visited in increasing order
+    if not position_lists or any(not p for p in position_lists):
+        return []
+    ptrs = [0] * len(position_lists)
+    spans = []
+    for start in position_lists[0]:
+        prev = start
+        for i in range(1, len(position_lists)):
+            positions = position_lists[i]
+            j = ptrs[i]
+            while j < len(positions) and positions[j] <= prev:
+                j += 1
+            ptrs[i] = j
+            if j == len(positions):
+                return spans
+            prev = positions[j]
+        if prev - start <= k:
+            spans.append((start, prev))
+    return spans
+
+
+# ----------------------------------------
+# DOCUMENT-LEVEL QUERIES OVER A SEGMENT
+# ----------------------------------------
+def _match_docs(reader, terms, matcher, candidates=None):
+    # -> [(doc_num, spans), ...] for docs where matcher finds a span;
+    # candidates (sorted doc nums) can pre-narrow the AND of the terms
+    unique = list(dict.fromkeys(terms))
+    if any(reader.doc_freq(t) == 0 for t in unique):
+        return []
+    if candidates is None:
+        with span("intersect"):
+            candidates = and_terms(reader, unique)
+            count("candidates", len(candidates))
+    if not candidates:
+        return []
+    with span("verify"):
+        # the candidates ascend, so each term's cursor only moves forward
+        # and decodes the positions of the blocks holding a candidate
+        opened = {t: reader.cursor(t) for t in unique}
+        cursors = [opened[t] for t in terms]
+        out = []
+        for doc in candidates:
+            lists = [c.positions() if c.next_geq(doc) == doc else None for c in cursors]
+            if None in lists:
+                continue
+            spans = matcher(lists)
+            if spans:
+                out.append((doc, spans))
+        count("candidates_verified", len(candidates))
+        count("matches", len(out))
+    return out
+
+
+def phrase_match(reader, terms, candidates=None):
+    return _match_docs(reader, terms, phrase_spans, candidates)
+
+
+def proximity_match(reader, terms, k, ordered=False):
+    if ordered:
+        return _match_docs(reader, terms, lambda lists: ordered_spans(lists, k))
+    return _match_docs(reader, terms, lambda lists: near_spans(lists, k))
+
+
+def proximity_search(reader, terms, k, ordered=False):
+    # external doc ids of docs with a NEAR/k (or W/k) match
+    return [reader.doc_id(d) for d, _ in proximity_match(reader, terms, k, ordered)]
@@ -0,0 +1,289 @@
+import struct
+from itertools import accumulate
+
+# ----------------------------------------
+# POSTINGS CODECS
+# ----------------------------------------
+# Every codec turns a list of non-negative ints into bytes and back; the
+# caller always knows how many values a block holds, so no codec stores
+# its own count. The segment writer feeds each field as gaps:
+#
+#   docs        doc num gaps (first gap is from 0)
+#   tfs         term frequencies
+#   positions   position gaps, restarting from 0 in every doc
+#
+# Codecs:
+#   vbyte      7 bits per byte + continuation bit (the v3 encoding)
+#   simple8b   as many values as fit in one u64: 4-bit selector + 60
+#              payload bits split into 1..240 equal slots
+#   pfor       blocks of 128 values bit-packed at the width that minimises
+#              the block size; the few values wider than that are patched
+#              in from an exception list (OptPFD-style)
+#   ef         Elias-Fano over the running sums of the gaps -- for docs
+#              those are the doc nums themselves; about 2 + log2(U / n)
+#              bits per value whatever the gap distribution
+#
+# bench/bench_codecs.py reports bytes per posting and decode speed per
+# field, and build_index.py picks a codec per field.
+
+U64 = struct.Struct("<Q")
+PFOR_BLOCK = 128
+
+
+# ----------------------------------------
+# VARINT HELPERS
+# ----------------------------------------
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(buf):
+    out = []
+    value = shift = 0
+    for b in buf:
+        value |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            out.append(value)
+            value = shift = 0
+    return out
+
+
+def read_varint(buf, off):
+    # -> (value, offset after it)
+    value = shift = 0
+    while True:
+        b = buf[off]
+        off += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, off
+        shift += 7
+
+
+# ----------------------------------------
+# BIT PACKING
+# ----------------------------------------
+# Values are packed in groups of 8, so every group is exactly `width`
+# bytes and a chunk of CHUNK values converts with one int.from_bytes.
+CHUNK = 64
+
+
+def _padded(count):
+    return (count + 7) & ~7
+
+
+def packed_size(width, count):
+    return _padded(count) * width // 8
+
+
+def pack_bits(values, width, out):
+    if width == 0:
+        return
+    for s in range(0, len(values), CHUNK):
+        chunk = values[s:s + CHUNK]
+        acc = 0
+        for i, v in enumerate(chunk):
+            acc |= v << (i * width)
+        out += acc.to_bytes(packed_size(width, len(chunk)), "little")
+
+
+def unpack_bits(buf, off, width, count):
+    # -> (values, offset after them)
+    if width == 0:
+        return [0] * count, off
+    out = []
+    mask = (1 << width) - 1
+    for s in range(0, count, CHUNK):
+        n = min(CHUNK, count - s)
+        size = packed_size(width, n)
+        acc = int.from_bytes(buf[off:off + size], "little")
+        out.extend((acc >> (i * width)) & mask for i in range(n))
+        off += size
+    return out, off
+
+
+# ----------------------------------------
+# CODECS
+# ----------------------------------------
+class VByte:
+    name = "vbyte"
+
+    def encode(self, values):
+        out = bytearray()
+        for v in values:
+            encode_varint(v, out)
+        return bytes(out)
+
+    def decode(self, buf, count):
+        return decode_varints(buf)
+
+
+# (values per word, bits per value); 0-bit slots encode runs of zeros
+SIMPLE8B_SELECTORS = [(240, 0), (120, 0), (60, 1), (30, 2), (20, 3), (15, 4), (12, 5), (10, 6),
+                      (8, 7), (7, 8), (6, 10), (5, 12), (4, 15), (3, 20), (2, 30), (1, 60)]
+
+
+class Simple8b:
+    name = "simple8b"
+
+    def encode(self, values):
+        out = bytearray()
+        i, n = 0, len(values)
+        while i < n:
+            for selector, (count, bits) in enumerate(SIMPLE8B_SELECTORS):
+                if i + count > n and count > 1:
+                    continue
+                chunk = values[i:i + count]
+                if max(chunk) >> bits:
+                    continue
+                word = selector
+                for j, v in enumerate(chunk):
+                    word |= v << (4 + j * bits)
+                out += U64.pack(word)
+                i += len(chunk)
+                break
+            else:
+                raise ValueError(f"simple8b cannot encode {values[i]} (more than 60 bits)")
+        return bytes(out)
+
+    def decode(self, buf, count):
+        out = []
+        for (word,) in U64.iter_unpack(buf):
+            n, bits = SIMPLE8B_SELECTORS[word & 0xF]
+            if bits == 0:
+                out.extend([0] * min(n, count - len(out)))
+                continue
+            mask = (1 << bits) - 1
+            word >>= 4
+            out.extend((word >> (j * bits)) & mask for j in range(n))
+        return out
+
+
+def _varint_len(v):
+    return max(1, (v.bit_length() + 6) // 7)
+
+
+class PForDelta:
+    # per block: u8 width, u8 exceptions, packed low bits, then for each
+    # exception u8 index + varint(value >> width)
+    name = "pfor"
+
+    @staticmethod
+    def _best_width(block):
+        widest = max(block).bit_length()
+        best = (packed_size(widest, len(block)), widest)
+        for width in range(widest):
+            over = [v >> width for v in block if v >> width]
+            size = packed_size(width, len(block)) + sum(1 + _varint_len(h) for h in over)
+            if size < best[0]:
+                best = (size, width)
+        return best[1]
+
+    def encode(self, values):
+        out = bytearray()
+        for s in range(0, len(values), PFOR_BLOCK):
+            block = values[s:s + PFOR_BLOCK]
+            width = self._best_width(block)
+            mask = (1 << width) - 1
+            exceptions = [(i, v >> width) for i, v in enumerate(block) if v >> width]
+            out.append(width)
+            out.append(len(exceptions))
+            pack_bits([v & mask for v in block], width, out)
+            for i, high in exceptions:
+                out.append(i)
+                encode_varint(high, out)
+        return bytes(out)
+
+    def decode(self, buf, count):
+        out = []
+        off = 0
+        while len(out) < count:
+            n = min(PFOR_BLOCK, count - len(out))
+            width, n_exc = buf[off], buf[off + 1]
+            block, off = unpack_bits(buf, off + 2, width, n)
+            for _ in range(n_exc):
+                i = buf[off]
+                high, off = read_varint(buf, off + 1)
+                block[i] |= high << width
+            out.extend(block)
+        return out
+
+
+# low-bit positions of the set bits of every byte value
+_BYTE_BITS = [[b for b in range(8) if v >> b & 1] for v in range(256)]
+
+
+class EliasFano:
+    # over the running sums x_0 <= x_1 <= ... <= x_{n-1} = U of the input:
+    #   u8 L, varint(U), n * L low bits (packed), then the high parts
+    #   x_i >> L in unary as a bit vector: bit (x_i >> L) + i is set
+    name = "ef"
+
+    def encode(self, values):
+        sums = list(accumulate(values))
+        if not sums:
+            return b""
+        n, universe = len(sums), sums[-1]
+        low_bits = max(0, (universe // n).bit_length() - 1)
+        mask = (1 << low_bits) - 1
+        out = bytearray([low_bits])
+        encode_varint(universe, out)
+        pack_bits([x & mask for x in sums], low_bits, out)
+        high = bytearray(((universe >> low_bits) + n + 7) // 8)
+        for i, x in enumerate(sums):
+            bit = (x >> low_bits) + i
+            high[bit >> 3] |= 1 << (bit & 7)
+        out += high
+        return bytes(out)
+
+    def sums(self, buf, count):
+        # the running sums themselves (doc nums, for the docs field)
+        if not count:
+            return []
+        low_bits = buf[0]
+        _, off = read_varint(buf, 1)
+        lows, off = unpack_bits(buf, off, low_bits, count)
+        sums = []
+        for byte_i in range(off, len(buf)):
+            byte = buf[byte_i]
+            if not byte:
+                continue
+            base = (byte_i - off) * 8
+            for b in _BYTE_BITS[byte]:
+                i = len(sums)
+                if i == count:
+                    break
+                sums.append(((base + b - i) << low_bits) | lows[i])
+        return sums
+
+    def decode(self, buf, count):
+        sums = self.sums(buf, count)
+        return [x - p for x, p in zip(sums, [0] + sums[:-1])]
+
+
+CODECS = {c.name: c for c in (VByte(), Simple8b(), PForDelta(), EliasFano())}
+FIELDS = ("docs", "tfs", "positions")
+DEFAULT_CODECS = {field: "vbyte" for field in FIELDS}
+
+
+def decode_sums(codec, buf, count, base=0):
+    # base + running sums of a gap-coded block; Elias-Fano stores the sums
+    if isinstance(codec, EliasFano):
+        sums = codec.sums(buf, count)
+        return [x + base for x in sums] if base else sums
+    gaps = codec.decode(buf, count)
+    if base and gaps:
+        gaps[0] += base
+    return list(accumulate(gaps))
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown postings codec {name!r}; choose from {', '.join(CODECS)}")
@@ -0,0 +1,123 @@
+import math
+from bisect import bisect_left
+
+# ----------------------------------------
+# SHARED QUERY ENGINE
+# ----------------------------------------
+# Posting lists are array('I') buffers of integer doc nums in ascending
+# order (the segment stores them that way). Two in-memory lists intersect
+# by merging with sqrt(n) strides or, when one list is much shorter, by
+# galloping through the long one -- O(short * log long) comparisons.
+# and_terms works off the segment instead: it looks the terms up in the
+# term dictionary, decodes only the rarest list, and seeks every other
+# term's PostingsCursor to the surviving docs in ascending document-
+# frequency order. The cursor gallops over the segment's skip entries, so
+# only the blocks holding a candidate are decoded, and it stops as soon as
+# the running result is empty (the remaining lists are never read).
+# The boolean query language (AND/OR/NOT, parentheses, phrases, NEAR) is
+# parsed by query_parser.py and planned over lazy cursors by query_planner.py.
+
+GALLOP_RATIO = 8   # gallop once the long list is this many times longer
+
+
+def skip_length(n):
+    # stride of the in-memory skips over a decoded list of n doc nums
+    return max(1, int(math.sqrt(n)))
+
+
+def gallop(seq, target, lo=0):
+    # first index >= lo with seq[index] >= target (exponential + binary search)
+    n = len(seq)
+    if lo >= n or seq[lo] >= target:
+        return lo
+    step = 1
+    hi = lo + 1
+    while hi < n and seq[hi] < target:
+        lo = hi
+        step *= 2
+        hi = lo + step
+    return bisect_left(seq, target, lo + 1, min(hi, n))
+
+
+def _merge_with_skips(a, b):
+    out = []
+    na, nb = len(a), len(b)
+    sa, sb = skip_length(na), skip_length(nb)
+    i = j = 0
+    while i < na and j < nb:
+        x, y = a[i], b[j]
+        if x == y:
+            out.append(x)
+            i += 1
+            j += 1
+        elif x < y:
+            if i + sa < na and a[i + sa] <= y:
+                while i + sa < na and a[i + sa] <= y:
+                    i += sa
+            else:
+                i += 1
+        else:
+            if j + sb < nb and b[j + sb] <= x:
+                while j + sb < nb and b[j + sb] <= x:
+                    j += sb
+            else:
+                j += 1
+    return out
+
+
+def _gallop_intersect(short, long):
+    out = []
+    j = 0
+    n = len(long)
+    for d in short:
+        j = gallop(long, d, j)
+        if j == n:
+            break
+        if long[j] == d:
+            out.append(d)
+    return out
+
+
+def intersect(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return []
+    if len(b) >= GALLOP_RATIO * len(a):
+        return _gallop_intersect(a, b)
+    return _merge_with_skips(a, b)
+
+
+def intersect_many(lists):
+    lists = sorted(lists, key=len)
+    if not lists:
+        return []
+    result = lists[0]
+    for p in lists[1:]:
+        if not result:
+            break
+        result = intersect(result, p)
+    return list(result)
+
+
+# ----------------------------------------
+# TERM-LEVEL OPERATORS OVER A SEGMENT
+# ----------------------------------------
+def doc_list(reader, term):
+    # array('I') of doc nums; only the doc block is decoded
+    return reader.doc_nums(term)
+
+
+def and_terms(reader, terms):
+    terms = list(dict.fromkeys(terms))
+    dfs = {t: reader.doc_freq(t) for t in terms}
+    if not terms or min(dfs.values()) == 0:
+        return []
+    rarest, *rest = sorted(terms, key=dfs.get)
+    result = doc_list(reader, rarest)
+    for t in rest:
+        cursor = reader.cursor(t)
+        result = [d for d in result if cursor.next_geq(d) == d]
+        if not result:
+            return []
+    return result
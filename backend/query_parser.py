@@ -0,0 +1,265 @@
+import re
+
+from analyzer import DEFAULT
+
+# ----------------------------------------
+# BOOLEAN QUERY LANGUAGE
+# ----------------------------------------
+# Query string -> operator tree over analyzed index terms:
+#
+#   cancer cells                 AND is implicit between operands
+#   cancer AND (cells OR tissue) parentheses group
+#   tumor NOT benign             NOT excludes its operand (a bare NOT
+#                                query is "every doc except")
+#   "stem cell therapy"          quoted phrase: consecutive positions
+#   gene NEAR/5 expression       all words within a window of 5 positions,
+#   gene W/5 expression          ... in query order; bare NEAR / W use the
+#                                search's k. Chains (a NEAR/3 b NEAR/3 c)
+#                                put every word in one window
+#   title:transformer            the operand only in that field: a word,
+#   title:"neural network"       a phrase, or a group (title:(a OR b)); read
+#                                from the field's own postings (fields.py)
+#
+# Operators are only recognised in upper case. OR binds tighter than AND
+# ("a b OR c" is a AND (b OR c)), as the flat parser before this one did,
+# so older boolean queries keep their meaning.
+#
+#   query    := and_expr
+#   and_expr := or_expr ( [AND] or_expr )*
+#   or_expr  := unary ( OR unary )*
+#   unary    := NOT unary | near
+#   near     := primary ( (NEAR[/k] | W[/k]) primary )*
+#   primary  := field ":" primary | "(" and_expr ")" | '"' words '"' | word
+#
+# Words go through the index's analyzer: a word that analyzes to several
+# terms ("state-of-the-art") is their AND, one that analyzes to nothing (a
+# stopword) drops out of the tree. Malformed queries raise
+# QuerySyntaxError. query_planner.py plans and executes the tree.
+
+DEFAULT_NEAR = 3
+QUERY_FIELDS = ("title",)   # field: prefixes, case-insensitive
+TOKEN_RE = re.compile(r'(?i:%s):|\(|\)|"[^"]*"?|[^\s()"]+' % "|".join(QUERY_FIELDS))
+NEAR_RE = re.compile(r"(NEAR|W)(?:/(\d+))?$")
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+# ----------------------------------------
+# OPERATOR TREE
+# ----------------------------------------
+# field: None for the whole doc, else a QUERY_FIELDS name
+def _prefix(field):
+    return f"{field}:" if field else ""
+
+
+class Term:
+    def __init__(self, term, field=None):
+        self.term = term
+        self.field = field
+
+    def __repr__(self):
+        return _prefix(self.field) + self.term
+
+
+class Phrase:
+    def __init__(self, terms, field=None):
+        self.terms = terms
+        self.field = field
+
+    def __repr__(self):
+        return _prefix(self.field) + '"' + " ".join(self.terms) + '"'
+
+
+class Near:
+    def __init__(self, terms, k, ordered=False, field=None):
+        self.terms = terms
+        self.k = k
+        self.ordered = ordered
+        self.field = field
+
+    def __repr__(self):
+        chain = f" {'W' if self.ordered else 'NEAR'}/{self.k} ".join(self.terms)
+        return f"{self.field}:({chain})" if self.field else chain
+
+
+class And:
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return "(" + " AND ".join(map(repr, self.children)) + ")"
+
+
+class Or:
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return "(" + " OR ".join(map(repr, self.children)) + ")"
+
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return f"NOT {self.child!r}"
+
+
+def _group(cls, children):
+    # drop operands that analyzed away; one operand needs no operator
+    children = [c for c in children if c is not None]
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else cls(children)
+
+
+def _words(terms, field=None):
+    if not terms:
+        return None
+    return Term(terms[0], field) if len(terms) == 1 else And([Term(t, field) for t in terms])
+
+
+def query_terms(node, negated=False):
+    # the terms of the tree in query order; NOT-ed subtrees only with negated
+    if node is None:
+        return []
+    if isinstance(node, Term):
+        return [node.term]
+    if isinstance(node, (Phrase, Near)):
+        return list(node.terms)
+    if isinstance(node, Not):
+        return query_terms(node.child, negated) if negated else []
+    return [t for c in node.children for t in query_terms(c, negated)]
+
+
+# ----------------------------------------
+# PARSER
+# ----------------------------------------
+class _Parser:
+    def __init__(self, query, analyzer, k):
+        self.tokens = TOKEN_RE.findall(query)
+        self.i = 0
+        self.analyzer = analyzer
+        self.k = k
+        self.field = None   # set while inside a field: prefix
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def take(self):
+        tok = self.peek()
+        self.i += 1
+        return tok
+
+    def parse(self):
+        node = self.and_expr()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"unexpected {self.peek()!r}")
+        return node
+
+    def operand_follows(self):
+        tok = self.peek()
+        return tok is not None and tok != ")" and tok not in ("AND", "OR") and not NEAR_RE.match(tok)
+
+    def and_expr(self):
+        children = [self.or_expr()]
+        while True:
+            tok = self.peek()
+            if tok == "AND":
+                self.take()
+                if not self.operand_follows():
+                    raise QuerySyntaxError("AND needs an operand on both sides")
+            elif not self.operand_follows():
+                break
+            children.append(self.or_expr())
+        return _group(And, children)
+
+    def or_expr(self):
+        children = [self.unary()]
+        while self.peek() == "OR":
+            self.take()
+            if not self.operand_follows():
+                raise QuerySyntaxError("OR needs an operand on both sides")
+            children.append(self.unary())
+        return _group(Or, children)
+
+    def unary(self):
+        if self.peek() == "NOT":
+            self.take()
+            if not self.operand_follows():
+                raise QuerySyntaxError("NOT needs an operand")
+            child = self.unary()
+            return None if child is None else Not(child)
+        return self.near()
+
+    def near(self):
+        first = self.primary()
+        tok = self.peek()
+        m = NEAR_RE.match(tok) if tok else None
+        if m is None:
+            return first
+        fields = set()
+        terms, window, ordered = self._near_operand(first, fields), None, m.group(1) == "W"
+        while m is not None:
+            self.take()
+            k = int(m.group(2)) if m.group(2) else self.k
+            if window is not None and (k, m.group(1) == "W") != (window, ordered):
+                raise QuerySyntaxError("one NEAR chain takes one window; group with parentheses")
+            window = k
+            if not self.operand_follows():
+                raise QuerySyntaxError(f"{m.group(1)} needs an operand on both sides")
+            terms += self._near_operand(self.primary(), fields)
+            tok = self.peek()
+            m = NEAR_RE.match(tok) if tok else None
+        if len(fields) > 1:
+            raise QuerySyntaxError("NEAR / W join words of one field")
+        field = fields.pop() if fields else None
+        if len(terms) < 2:
+            return _words(terms, field)
+        return Near(terms, window, ordered, field)
+
+    def _near_operand(self, node, fields):
+        if node is None:
+            return []
+        words = [node] if isinstance(node, Term) else node.children if isinstance(node, And) else ()
+        if not words or not all(isinstance(c, Term) for c in words):
+            raise QuerySyntaxError("NEAR / W join single words")
+        fields.update(c.field for c in words)   # one word may be several terms
+        return [c.term for c in words]
+
+    def primary(self):
+        tok = self.take()
+        if tok is None:
+            raise QuerySyntaxError("query ends early")
+        if tok.endswith(":") and tok[:-1].lower() in QUERY_FIELDS:
+            if not self.operand_follows():
+                raise QuerySyntaxError(f"{tok} needs an operand")
+            outer, self.field = self.field, tok[:-1].lower()
+            node = self.primary()
+            self.field = outer
+            return node
+        if tok == "(":
+            node = self.and_expr()
+            if self.take() != ")":
+                raise QuerySyntaxError("unbalanced '('")
+            return node
+        if tok == ")":
+            raise QuerySyntaxError("unbalanced ')'")
+        if tok in ("AND", "OR") or NEAR_RE.match(tok):
+            raise QuerySyntaxError(f"{tok} needs an operand on both sides")
+        if tok.startswith('"'):
+            if len(tok) < 2 or not tok.endswith('"'):
+                raise QuerySyntaxError("unterminated quote")
+            terms = self.analyzer.analyze(tok[1:-1])
+            if len(terms) < 2:
+                return _words(terms, self.field)
+            return Phrase(terms, self.field)
+        return _words(self.analyzer.analyze(tok), self.field)
+
+
+def parse_query(query, analyzer=DEFAULT, k=DEFAULT_NEAR):
+    # -> operator tree, or None when nothing searchable is left
+    return _Parser(query, analyzer, k).parse()
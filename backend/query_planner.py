@@ -0,0 +1,454 @@
+import argparse
+import time
+from array import array
+
+from analyzer import DEFAULT
+from phrase import word_pairs
+from positional import near_spans, ordered_spans, phrase_spans
+from query_engine import gallop
+from query_parser import DEFAULT_NEAR, And, Near, Not, Phrase, QuerySyntaxError, Term, parse_query, query_terms
+from segment import END
+from tracing import count
+
+# ----------------------------------------
+# QUERY PLANNER AND STREAMING EXECUTOR
+# ----------------------------------------
+# query_parser.py's operator tree -> a plan over the segment's doc lists,
+# costed by document frequency:
+#
+#   term         its stored doc list (est = df); a term not in the index
+#                is EMPTY, and EMPTY short-circuits the AND around it.
+#                title:term reads the title segment's list instead (same
+#                doc nums, fields.py), title phrases its positions
+#   AND          flattened; inputs run rarest first, NOT operands become
+#                exclusions, phrases / NEAR are pushed down as positional
+#                filters over the AND of their terms (plus their word pairs
+#                when the n-gram index has them), cheapest filter first
+#   OR           flattened; EMPTY operands dropped (est = sum, capped at N)
+#   NOT only     ALL docs minus the operand
+#
+# Execution is document-at-a-time: every plan node is a cursor over
+# ascending doc nums with next_geq(target) (skip to the first doc >=
+# target). A term is the segment's PostingsCursor: it gallops over the
+# stored skip entries and decodes only the blocks it lands in. AND
+# leapfrogs its inputs -- the rarest proposes a doc, the others gallop to
+# it -- OR takes the smallest head, exclusions and positional filters
+# check one doc at a time. No intermediate result list is built at any
+# level: execute() yields matching doc nums as they are found, and the
+# ranker pulls them in batches (matrix.py top_k_stream).
+#
+# Positional filters keep a cursor per term too and read the positions of
+# just the docs the cheaper operands let through, a block at a time.
+#
+#   python query_planner.py '"stem cell" AND (therapy OR treatment) NOT mouse'
+
+
+# ----------------------------------------
+# CURSORS
+# ----------------------------------------
+# next_geq(target) -> the first doc >= target, or END. Targets never go
+# down, and asking again for a target <= the current doc returns it.
+# ListCursor is the same over an in-memory list (ALL docs, EMPTY).
+class ListCursor:
+    __slots__ = ("docs", "i", "n")
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.i = 0
+        self.n = len(docs)
+
+    def next_geq(self, target):
+        docs, i, n = self.docs, self.i, self.n
+        if i < n and docs[i] < target:
+            i += 1   # usually the next doc already is the target
+            if i < n and docs[i] < target:
+                i = gallop(docs, target, i)
+            self.i = i
+        return docs[i] if i < n else END
+
+
+class AndCursor:
+    __slots__ = ("kids",)
+
+    def __init__(self, kids):
+        self.kids = kids   # rarest first: it proposes, the rest gallop
+
+    def next_geq(self, target):
+        kids = self.kids
+        n = len(kids)
+        doc = kids[0].next_geq(target)
+        agree, i = 1, 1 % n
+        while doc != END:
+            if agree == n:
+                return doc
+            d = kids[i].next_geq(doc)
+            if d == doc:
+                agree += 1
+            else:
+                doc, agree = d, 1
+            i = i + 1 if i + 1 < n else 0
+        return END
+
+
+class OrCursor:
+    __slots__ = ("kids", "heads")
+
+    def __init__(self, kids):
+        self.kids = kids
+        self.heads = [-1] * len(kids)
+
+    def next_geq(self, target):
+        best = END
+        heads = self.heads
+        for j, kid in enumerate(self.kids):
+            d = heads[j]
+            if d < target:
+                d = heads[j] = kid.next_geq(target)
+            if d < best:
+                best = d
+        return best
+
+
+class ExcludeCursor:
+    __slots__ = ("base", "excluded")
+
+    def __init__(self, base, excluded):
+        self.base = base
+        self.excluded = excluded
+
+    def next_geq(self, target):
+        d = self.base.next_geq(target)
+        while d != END and self.excluded.next_geq(d) == d:
+            d = self.base.next_geq(d + 1)
+        return d
+
+
+class FilterCursor:
+    # docs of base whose positions satisfy the filter's matcher
+    __slots__ = ("base", "plan", "doc", "cursors", "verified")
+
+    def __init__(self, base, plan):
+        self.base = base
+        self.plan = plan
+        self.doc = -1
+        self.cursors = None   # per query term: its postings cursor, opened on first use
+        self.verified = 0
+
+    def next_geq(self, target):
+        if self.doc >= target:
+            return self.doc
+        base = self.base
+        d = base.next_geq(target)
+        if d != END and self.cursors is None:
+            reader = self.plan.reader
+            opened = {t: reader.cursor(t) for t in dict.fromkeys(self.plan.terms)}
+            self.cursors = [opened[t] for t in self.plan.terms]
+        cursors, matcher = self.cursors, self.plan.matcher
+        while d != END:
+            self.verified += 1
+            lists = [c.positions() if c.next_geq(d) == d else None for c in cursors]
+            if None not in lists and matcher(lists):
+                break
+            d = base.next_geq(d + 1)
+        self.doc = d
+        return d
+
+
+# ----------------------------------------
+# PLAN NODES
+# ----------------------------------------
+# est: upper bound on the docs a node yields; cursor(filters) builds the
+# node's cursor and appends any FilterCursor to filters (for the counters)
+class EmptyPlan:
+    est = 0
+
+    def cursor(self, filters):
+        return ListCursor(())
+
+    def explain(self, depth=0):
+        return ["  " * depth + "EMPTY"]
+
+
+EMPTY = EmptyPlan()
+
+
+class AllPlan:
+    def __init__(self, reader):
+        self.reader = reader
+        self.est = reader.num_docs
+
+    def cursor(self, filters):
+        docs = self.reader.all_docs()
+        return ListCursor(docs if isinstance(docs, range) else array("I", docs))
+
+    def explain(self, depth=0):
+        return ["  " * depth + f"ALL docs={self.est}"]
+
+
+class ListPlan:
+    # one stored doc list: a term of the segment or of a field's segment
+    # (kind = the field), or a pair of the n-gram index
+    def __init__(self, source, key, df, kind="term"):
+        self.source = source
+        self.key = key
+        self.est = df
+        self.kind = kind
+
+    def cursor(self, filters):
+        return self.source.cursor(self.key)
+
+    def explain(self, depth=0):
+        return ["  " * depth + f"{self.kind} {self.key!r} df={self.est}"]
+
+
+class FilterPlan:
+    # a positional check (phrase, NEAR/k, W/k) over terms, not a doc source
+    def __init__(self, reader, terms, kind, k=0, cost=0, field=None):
+        self.reader = reader   # the segment (or field segment) with the positions
+        self.terms = terms
+        self.kind = kind
+        self.k = k
+        self.cost = cost   # postings whose positions it decodes
+        self.field = field
+        if kind == "phrase":
+            self.matcher = phrase_spans
+        elif kind == "W":
+            self.matcher = lambda lists: ordered_spans(lists, k)
+        else:
+            self.matcher = lambda lists: near_spans(lists, k)
+
+    def explain(self, depth=0):
+        label = '"' + " ".join(self.terms) + '"' if self.kind == "phrase" else \
+            f" {self.kind}/{self.k} ".join(self.terms)
+        if self.field:
+            label = f"{self.field}:({label})"
+        return ["  " * depth + f"filter {label} cost={self.cost}"]
+
+
+class AndPlan:
+    def __init__(self, inputs, excludes=(), filters=()):
+        self.inputs = sorted(inputs, key=lambda p: p.est)
+        self.excludes = list(excludes)
+        self.filters = sorted(filters, key=lambda f: f.cost)
+        self.est = self.inputs[0].est
+
+    def cursor(self, filters):
+        kids = [p.cursor(filters) for p in self.inputs]
+        c = kids[0] if len(kids) == 1 else AndCursor(kids)
+        if self.excludes:
+            ex = [p.cursor(filters) for p in self.excludes]
+            c = ExcludeCursor(c, ex[0] if len(ex) == 1 else OrCursor(ex))
+        for f in self.filters:
+            c = FilterCursor(c, f)
+            filters.append(c)
+        return c
+
+    def explain(self, depth=0):
+        pad = "  " * depth
+        out = [pad + f"AND est={self.est}"]
+        for p in self.inputs:
+            out += p.explain(depth + 1)
+        for p in self.excludes:
+            out += [pad + "  NOT"] + p.explain(depth + 2)
+        for f in self.filters:
+            out += f.explain(depth + 1)
+        return out
+
+
+class OrPlan:
+    def __init__(self, children, num_docs):
+        self.children = sorted(children, key=lambda p: -p.est)
+        self.est = min(num_docs, sum(p.est for p in children))
+
+    def cursor(self, filters):
+        return OrCursor([p.cursor(filters) for p in self.children])
+
+    def explain(self, depth=0):
+        out = ["  " * depth + f"OR est={self.est}"]
+        for p in self.children:
+            out += p.explain(depth + 1)
+        return out
+
+
+# ----------------------------------------
+# PLANNER
+# ----------------------------------------
+class _Planner:
+    def __init__(self, reader, ngram=None, fields=None):
+        self.reader = reader
+        self.ngram = ngram
+        self.fields = fields
+
+    def _source(self, field):
+        # -> (segment, plan kind) a node of this field reads
+        if field is None:
+            return self.reader, "term"
+        if self.fields is None or field not in self.fields.readers:
+            raise QuerySyntaxError(f"{field}: needs the field index; rebuild without --no-fields")
+        return self.fields.readers[field], field
+
+    def plan(self, node):
+        if node is None:
+            return EMPTY
+        if isinstance(node, Term):
+            source, kind = self._source(node.field)
+            df = source.doc_freq(node.term)
+            return ListPlan(source, node.term, df, kind) if df else EMPTY
+        if isinstance(node, (Phrase, Near)):
+            return self._positional(node)
+        if isinstance(node, (And, Not)):
+            return self._and(node.children if isinstance(node, And) else [node])
+        return self._or(node.children)
+
+    def _and(self, children):
+        inputs, excludes, filters = {}, [], []
+        for c in children:
+            if isinstance(c, Not):
+                p = self.plan(c.child)
+                if isinstance(p, AllPlan):
+                    return EMPTY
+                if p is not EMPTY:
+                    excludes.append(p)
+                continue
+            p = self.plan(c)
+            if p is EMPTY:
+                return EMPTY   # no need to plan (or read) the other operands
+            if isinstance(p, AndPlan):
+                inputs.update((_key(q), q) for q in p.inputs)
+                excludes += p.excludes
+                filters += p.filters
+            elif not isinstance(p, AllPlan):
+                inputs[_key(p)] = p
+        inputs = [p for p in inputs.values() if not isinstance(p, AllPlan)]
+        if not inputs:
+            inputs = [AllPlan(self.reader)]
+        if len(inputs) == 1 and not excludes and not filters:
+            return inputs[0]
+        return AndPlan(inputs, excludes, filters)
+
+    def _or(self, children):
+        plans = []
+        for c in children:
+            p = self.plan(c)
+            if isinstance(p, AllPlan):
+                return p
+            if isinstance(p, OrPlan):
+                plans += p.children
+            elif p is not EMPTY:
+                plans.append(p)
+        if not plans:
+            return EMPTY
+        return plans[0] if len(plans) == 1 else OrPlan(plans, self.reader.num_docs)
+
+    def _positional(self, node):
+        source, kind = self._source(node.field)
+        terms = list(node.terms)
+        dfs = {t: source.doc_freq(t) for t in terms}
+        if not all(dfs.values()):
+            return EMPTY
+        inputs = {}
+        covered = set()
+        if isinstance(node, Phrase) and node.field is None and self.ngram is not None:
+            # a phrase implies each of its word pairs: the n-gram lists are
+            # far shorter than the terms' for common pairs ("of the")
+            for pair in word_pairs(terms):
+                if pair in self.ngram:
+                    inputs[("pair", pair)] = ListPlan(self.ngram, pair, self.ngram.doc_freq(pair), "pair")
+                    covered.update(pair.split(" "))
+        for t in terms:
+            if t not in covered:
+                inputs[(kind, t)] = ListPlan(source, t, dfs[t], kind)
+        if isinstance(node, Phrase):
+            check, k = "phrase", 0
+        else:
+            check, k = ("W" if node.ordered else "NEAR"), node.k
+        cost = sum(dfs[t] for t in dict.fromkeys(terms))
+        return AndPlan(inputs.values(), (), [FilterPlan(source, terms, check, k, cost, node.field)])
+
+
+def _key(p):
+    return (p.kind, p.key) if isinstance(p, ListPlan) else id(p)
+
+
+def plan_query(node, reader, ngram=None, fields=None):
+    # fields: the FieldIndex that title: nodes read (fields.py)
+    return _Planner(reader, ngram, fields).plan(node)
+
+
+def explain(plan):
+    return "\n".join(plan.explain())
+
+
+# ----------------------------------------
+# EXECUTION
+# ----------------------------------------
+def execute(plan):
+    # -> generator of matching doc nums, ascending, produced lazily
+    filters = []
+    c = plan.cursor(filters)
+    n = 0
+    try:
+        d = c.next_geq(0)
+        while d != END:
+            n += 1
+            yield d
+            d = c.next_geq(d + 1)
+    finally:
+        verified = sum(f.verified for f in filters)
+        count("candidates", verified if filters else n)
+        if filters:
+            count("candidates_verified", verified)
+        count("matches", n)
+
+
+def query_tree(qtype, query, analyzer=DEFAULT, k=DEFAULT_NEAR):
+    # every filtering query type as an operator tree
+    if qtype == "boolean":
+        return parse_query(query, analyzer, k)
+    terms = analyzer.analyze(query)
+    if qtype == "phrase":
+        if len(terms) < 2:
+            return Term(terms[0]) if terms else None
+        return Phrase(terms)
+    # NEAR/k (any order) or W/k (query order) over any number of terms
+    return Near(terms, k, qtype == "proximity_ordered") if len(terms) >= 2 else None
+
+
+def boolean_search(reader, query, analyzer=DEFAULT, ngram=None, k=DEFAULT_NEAR, fields=None):
+    # query string -> matching external doc ids, in doc num order
+    plan = plan_query(parse_query(query, analyzer, k), reader, ngram, fields)
+    return [reader.doc_id(d) for d in execute(plan)]
+
+
+# ----------------------------------------
+# CLI: EXPLAIN A QUERY
+# ----------------------------------------
+def main():
+    from analyzer import load_analyzer
+    from fields import load_fields
+    from phrase import load_ngram_index
+    from search_service import INDEX_DIR
+    from segment import SegmentReader
+
+    parser = argparse.ArgumentParser(description="Parse, plan and run a boolean query")
+    parser.add_argument("query")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--k", type=int, default=DEFAULT_NEAR, help="window of a bare NEAR / W")
+    args = parser.parse_args()
+
+    reader = SegmentReader(f"{args.index_dir}/positional")
+    analyzer = load_analyzer(args.index_dir)
+    ngram = load_ngram_index(f"{args.index_dir}/ngram")
+    fields = load_fields(f"{args.index_dir}/fields", reader)
+    tree = parse_query(args.query, analyzer, args.k)
+    plan = plan_query(tree, reader, ngram, fields)
+    print(f"tree  {tree!r}\nplan\n{explain(plan)}")
+    t0 = time.perf_counter()
+    docs = [reader.doc_id(d) for d in execute(plan)]
+    print(f"{len(docs)} docs in {(time.perf_counter() - t0) * 1000:.2f} ms: {docs[:10]}"
+          f"{' ...' if len(docs) > 10 else ''}")
+    print(f"ranked on {query_terms(tree)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,43 @@
-import json
-import os
-
-# Paths to index files
-positional_path = "C:\Projects\HybridSearchEngine\output/positional_index.json"
-biword_path = "C:\Projects\HybridSearchEngine\output/biword_index.json"
-
-# Utility: Intersect two posting lists
-def intersect(list1, list2):
-    i, j = 0, 0
-    result = []
-    while i < len(list1) and j < len(list2):
-        if list1[i] == list2[j]:
-            result.append(list1[i])
-            i += 1
-            j += 1
-        elif list1[i] < list2[j]:
-            i += 1
-        else:
-            j += 1
-    return result
+from pathlib import Path
+
+from analyzer import load_analyzer
+from segment import SegmentReader, PositionalIndexView
+from phrase import load_ngram_index, phrase_search
+from positional import proximity_search
+from query_parser import QuerySyntaxError
+from query_planner import boolean_search
+
+# Paths to index segments
+BASE_DIR = Path(__file__).resolve().parent
+INDEX_DIR = (BASE_DIR / ".." / "output").resolve()
+positional_path = INDEX_DIR / "positional"
+ngram_path = INDEX_DIR / "ngram"
+ANALYZER = load_analyzer(INDEX_DIR)   # the one the index was built with
 
 # Load Indexes
 def load_indexes():
-    with open(positional_path, "r", encoding="utf-8") as f:
-        pos_index = json.load(f)
-    with open(biword_path, "r", encoding="utf-8") as f:
-        bi_index = json.load(f)
-    return pos_index, bi_index
+    pos_index = PositionalIndexView(SegmentReader(positional_path))
+    ngram_index = load_ngram_index(ngram_path)
+    return pos_index, ngram_index
 
 # Boolean AND query 
-def boolean_and(term1, term2, pos_index):
-    docs1 = sorted(pos_index.get(term1, {}).keys())
-    docs2 = sorted(pos_index.get(term2, {}).keys())
-    return intersect(docs1, docs2)
+def boolean_and(query, pos_index):
+    # AND / OR / NOT, parentheses, "phrases", NEAR/k; planned rarest operand first
+    return boolean_search(pos_index.reader, query, ANALYZER)
 
 #  Phrase query 
-def phrase_query(phrase, bi_index, pos_index):
-    tokens = phrase.lower().split()
-    if len(tokens) == 1:
-        return sorted(pos_index.get(tokens[0], {}).keys())
-
-    # create list of biwords
-    biwords = [" ".join(tokens[i:i+2]) for i in range(len(tokens)-1)]
-    # start intersection
-    postings = [bi_index.get(b, []) for b in biwords if b in bi_index]
-    if not postings:
-        return []
-
-    result = postings[0]
-    for p in postings[1:]:
-        result = intersect(result, p)
-    if not result:
-        return []
-
-    # verify actual positions using positional index
-    verified_docs = []
-    for doc in result:
-        first_term_positions = pos_index.get(tokens[0], {}).get(doc, [])
-        for pos in first_term_positions:
-            match = True
-            for i in range(1, len(tokens)):
-                term_positions = pos_index.get(tokens[i], {}).get(doc, [])
-                if (pos + i) not in term_positions:
-                    match = False
-                    break
-            if match:
-                verified_docs.append(doc)
-                break
-    return sorted(verified_docs)
+def phrase_query(phrase, ngram_index, pos_index):
+    # verified against positions; the optional n-gram index only narrows candidates
+    return phrase_search(pos_index.reader, ANALYZER.analyze(phrase), ngram_index)
 
 # Proximity query
-def proximity_query(term1, term2, k, pos_index):
-    docs1 = set(pos_index.get(term1, {}).keys())
-    docs2 = set(pos_index.get(term2, {}).keys())
-    common_docs = docs1.intersection(docs2)
-    results = []
-
-    for doc in common_docs:
-        positions1 = pos_index[term1][doc]
-        positions2 = pos_index[term2][doc]
-        for p1 in positions1:
-            for p2 in positions2:
-                if abs(p1 - p2) <= k:
-                    results.append(doc)
-                    break
-            else:
-                continue
-            break
-    return sorted(results)
+def proximity_query(terms, k, pos_index, ordered=False):
+    # NEAR/k (any order) or W/k (query order) over any number of terms
+    return proximity_search(pos_index.reader, ANALYZER.analyze_terms(terms), k, ordered)
 
 # MAIN INTERFACE 
 def main():
-    pos_index, bi_index = load_indexes()
+    pos_index, ngram_index = load_indexes()
     print("✅ Indexes loaded successfully!\n")
 
     while True:
@@ -103,21 +49,24 @@ def main():
         choice = input("Enter your choice (1/2/3/4): ").strip()
 
         if choice == "1":
-            t1 = input("Enter first term: ").strip().lower()
-            t2 = input("Enter second term: ").strip().lower()
-            results = boolean_and(t1, t2, pos_index)
+            query = input("Enter query (AND implied; OR, NOT, ( ), \"phrases\", NEAR/k allowed): ")
+            try:
+                results = boolean_and(query, pos_index)
+            except QuerySyntaxError as e:
+                print(f"❌ Invalid query: {e}")
+                continue
             print(f"→ Found {len(results)} matching docs:", results)
 
         elif choice == "2":
             phrase = input("Enter phrase (use quotes optional): ").strip().lower()
-            results = phrase_query(phrase, bi_index, pos_index)
+            results = phrase_query(phrase, ngram_index, pos_index)
             print(f"→ Found {len(results)} matching docs:", results)
 
         elif choice == "3":
-            t1 = input("Enter first term: ").strip().lower()
-            t2 = input("Enter second term: ").strip().lower()
+            terms = input("Enter terms (space separated): ").strip().lower().split()
             k = int(input("Enter proximity (k): ").strip())
-            results = proximity_query(t1, t2, k, pos_index)
+            ordered = input("Keep query order? (y/n): ").strip().lower() == "y"
+            results = proximity_query(terms, k, pos_index, ordered)
             print(f"→ Found {len(results)} matching docs:", results)
 
         elif choice == "4":
@@ -1,85 +1,103 @@
-import os
-import math
+import json
 from collections import Counter, defaultdict
+from pathlib import Path
 
-# Path to cleaned documents
-DATA_PATH = "C:\Projects\HybridSearchEngine\data/cleaned_docs"
-
-# TF-IDF RANKING 
-
-def load_docs():
-    docs = {}
-    for file in os.listdir(DATA_PATH):
-        if file.endswith(".txt"):
-            with open(os.path.join(DATA_PATH, file), "r", encoding="utf-8") as f:
-                docs[file.replace(".txt", "")] = f.read().split()
-    return docs
-
-def compute_tf(doc_tokens):
-    tf = Counter(doc_tokens)
-    total = len(doc_tokens)
-    return {term: freq / total for term, freq in tf.items()}
-
-def compute_idf(all_docs):
-    N = len(all_docs)
-    df = defaultdict(int)
-    for tokens in all_docs.values():
-        for term in set(tokens):
-            df[term] += 1
-    return {term: math.log((N + 1) / (df_val + 1)) + 1 for term, df_val in df.items()}
-
-def tfidf_score(query_tokens, docs, idf):
-    scores = {}
-    for doc_id, tokens in docs.items():
-        tf = compute_tf(tokens)
-        score = 0.0
-        for q in query_tokens:
-            if q in tf and q in idf:
-                score += tf[q] * idf[q]
-        if score > 0:
-            scores[doc_id] = round(score, 4)
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
-
-# BM25 RANKING 
-
-def bm25_score(query_tokens, docs, idf, k1=1.5, b=0.75):
-    avg_len = sum(len(d) for d in docs.values()) / len(docs)
-    scores = {}
-    for doc_id, tokens in docs.items():
-        tf = Counter(tokens)
-        doc_len = len(tokens)
-        score = 0.0
-        for q in query_tokens:
-            if q in tf and q in idf:
-                freq = tf[q]
-                num = idf[q] * freq * (k1 + 1)
-                denom = freq + k1 * (1 - b + b * (doc_len / avg_len))
-                score += num / denom
-        if score > 0:
-            scores[doc_id] = round(score, 4)
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+from analyzer import load_analyzer
+from matrix import load_matrix
+from segment import SegmentReader, BM25_K1, BM25_B, bm25_tf
+from topk import top_k
+
+# Paths to index segment + collection stats
+BASE_DIR = Path(__file__).resolve().parent
+INDEX_DIR = (BASE_DIR / ".." / "output").resolve()
+
+# Both rankers score straight from the postings (tf per doc) and the doc
+# lengths stored in the segment, so the cost is O(matching postings) and
+# avg_len is always the full-collection average, not the candidate subset.
+# matrix.TermDocMatrix computes the same scores vectorized over NumPy
+# arrays; it is the exhaustive reference the pruned top-k is checked against.
+
+def load_index():
+    reader = SegmentReader(INDEX_DIR / "positional")
+    with open(INDEX_DIR / "idf.json", "r", encoding="utf-8") as f:
+        idf = json.load(f)
+    return reader, idf
+
+def candidate_nums(reader, candidates):
+    # external doc ids -> set of doc nums (None means "whole collection")
+    if candidates is None:
+        return None
+    nums = set()
+    for doc_id in candidates:
+        doc_num = reader.doc_num(doc_id)
+        if doc_num is not None:
+            nums.add(doc_num)
+    return nums
+
+def rank_scores(reader, scores, keep=None):
+    # keep: doc nums returned even when they score 0 (the matches of a
+    # filtering query), after the scored ones in doc num order
+    ranked = [(reader.doc_id(d), round(s, 4)) for d, s in scores.items() if s > 0]
+    ranked = sorted(ranked, key=lambda x: x[1], reverse=True)
+    if keep:
+        ranked += [(reader.doc_id(d), 0.0) for d in sorted(keep) if scores.get(d, 0.0) <= 0]
+    return ranked
+
+# TF-IDF RANKING
+
+def tfidf_score(query_tokens, reader, idf, candidates=None):
+    allowed = candidate_nums(reader, candidates)
+    scores = defaultdict(float)
+    for q, qtf in Counter(query_tokens).items():
+        if q not in idf:
+            continue
+        for doc, freq in reader.postings(q):
+            if allowed is not None and doc not in allowed:
+                continue
+            scores[doc] += qtf * freq / reader.doc_len(doc) * idf[q]
+    return rank_scores(reader, scores, allowed)
+
+# BM25 RANKING
+
+def bm25_score(query_tokens, reader, idf, candidates=None, k1=BM25_K1, b=BM25_B):
+    allowed = candidate_nums(reader, candidates)
+    avg_len = reader.avg_doc_len
+    scores = defaultdict(float)
+    for q, qtf in Counter(query_tokens).items():
+        if q not in idf:
+            continue
+        weight = qtf * idf[q]
+        for doc, freq in reader.postings(q):
+            if allowed is not None and doc not in allowed:
+                continue
+            scores[doc] += weight * bm25_tf(freq, reader.doc_len(doc), avg_len, k1, b)
+    return rank_scores(reader, scores, allowed)
 
 # ---------- MAIN ----------
 def main():
-    print("📚 Loading cleaned documents...")
-    docs = load_docs()
-    print(f"Loaded {len(docs)} docs.")
-
-    idf = compute_idf(docs)
+    print("📚 Loading index segment...")
+    reader, idf = load_index()
+    matrix = load_matrix(INDEX_DIR / "matrix", reader)
+    analyzer = load_analyzer(INDEX_DIR)
+    print(f"Loaded {reader.num_docs} docs.")
 
     while True:
         q = input("\nEnter search query (or 'exit'): ").strip().lower()
         if q == "exit":
             break
-        query_tokens = q.split()
+        query_tokens = analyzer.analyze(q)
 
         print("\nTF-IDF Ranking:")
-        tfidf_results = tfidf_score(query_tokens, docs, idf)
-        print(tfidf_results[:10])
+        tfidf_results = top_k(query_tokens, reader, idf, k=10, scoring="tfidf")
+        print(tfidf_results)
 
         print("\nBM25 Ranking:")
-        bm25_results = bm25_score(query_tokens, docs, idf)
-        print(bm25_results[:10])
+        bm25_results = top_k(query_tokens, reader, idf, k=10)
+        print(bm25_results)
+
+        if matrix is not None:
+            print("\nBM25 Ranking (exhaustive, NumPy):")
+            print(matrix.top_k(query_tokens, k=10))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from query_parser import NEAR_RE, TOKEN_RE
+
+# ----------------------------------------
+# QUERY RESULT CACHE
+# ----------------------------------------
+# One cache per process, shared by every session / request thread:
+#   - keys are normalized, so "Deep  Learning" and "deep learning" share
+#     an entry (upper-case AND / OR / NOT stay operators)
+#   - LRU eviction once max_entries is reached, and a per-entry TTL
+#   - stamped with the index generation (the build marker's id): when a
+#     rebuild or an incremental commit writes a new marker, every entry
+#     is dropped
+#   - hit / miss / eviction counters for sizing it
+#   - optionally mirrored to a JSON file so a restart does not start cold
+#
+# Values must be JSON-serializable when a path is given; lists of
+# (doc_id, score) pairs come back as tuples.
+
+MAX_ENTRIES = 1024
+TTL_SECONDS = 600
+SAVE_INTERVAL = 5.0
+
+OPERATORS = ("AND", "OR", "NOT")
+
+# written last by every index writer (build_index.main once the new parts
+# are in place, IndexWriter after each manifest commit), so the index on
+# disk is a different one exactly when its id changes
+BUILD_MARKER = "build.json"
+
+
+def normalize_query(query):
+    # collapse whitespace and case over the query language's tokens;
+    # operators (NEAR/k, W/k included) keep their meaning
+    return " ".join(t if t in OPERATORS or NEAR_RE.match(t) else t.lower() for t in TOKEN_RE.findall(query))
+
+
+def write_build_marker(index_dir, **info):
+    # a fresh id per finished build / commit; replaced atomically
+    path = Path(index_dir) / BUILD_MARKER
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"id": uuid.uuid4().hex, **info}, f)
+    os.replace(tmp, path)
+
+
+def index_generation(index_dir):
+    # the id in the build marker; "" for an index that has none yet.
+    # Unlike an mtime stamp, two builds in the same clock tick still differ
+    try:
+        with open(Path(index_dir) / BUILD_MARKER, "r", encoding="utf-8") as f:
+            return json.load(f)["id"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return ""
+
+
+def _thaw(value):
+    if isinstance(value, list):
+        return [tuple(v) if isinstance(v, list) else v for v in value]
+    return value
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.generation = None
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+        if self.path is not None:
+            self._load()
+
+    @staticmethod
+    def key(kind, query, *params):
+        return "|".join([kind, normalize_query(query), *map(str, params)])
+
+    def check_generation(self, generation):
+        # -> True when the index changed and the cache was emptied
+        with self._lock:
+            if generation == self.generation:
+                return False
+            changed = self.generation is not None
+            if changed:
+                self.invalidations += 1
+            self.generation = generation
+            self._entries.clear()
+            self._dirty = True
+            return changed
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+        if self.path is not None:
+            self._maybe_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    # --- optional on-disk copy ---
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return   # a torn or foreign file just means a cold start
+        now = time.time()
+        self.generation = data.get("generation")
+        for key, expires_at, value in data.get("entries", []):
+            if expires_at >= now:
+                self._entries[key] = (expires_at, _thaw(value))
+
+    def _maybe_save(self):
+        if time.time() - self._saved_at >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {
+                    "generation": self.generation,
+                    "entries": [[k, exp, v] for k, (exp, v) in self._entries.items()],
+                }
+                self._dirty = False
+                self._saved_at = time.time()
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
@@ -0,0 +1,170 @@
+import heapq
+import struct
+
+from postings_codec import encode_varint, decode_varints
+from segment import SegmentWriter
+
+# ----------------------------------------
+# SORTED PARTIAL RUNS
+# ----------------------------------------
+# A run is the inverted index of one slice of the input, written to disk
+# in term order so that any number of runs can be k-way merged into a
+# segment while only one term's postings are in memory at a time.
+#
+#   u32 N, N * (varint len, doc id bytes, varint doc_len)     doc table
+#   per term: u32 record length, varint term len, raw term bytes, then
+#       varints n_postings, n_postings * (doc gap, tf, tf * position gap)
+#
+# Doc nums inside a run are local (0..N-1); the merge shifts every run by
+# the number of docs in the runs before it.
+
+U32 = struct.Struct("<I")
+
+
+def record_id(entry, ordinal):
+    # the doc id of a JSONL record in every build, the docstore and the
+    # field index: its id field, else its ordinal among the non-blank lines
+    return entry.get("id") or entry.get("doc_id") or entry.get("_id") or str(ordinal)
+
+
+def write_run(path, doc_ids, index, doc_lens=None):
+    # index: term -> {local_doc_num: [positions]}
+    # doc_lens defaults to the token counts implied by the index itself; a
+    # word-pair run passes the docs' token counts, like build_serial does
+    if doc_lens is None:
+        doc_lens = [0] * len(doc_ids)
+        for postings in index.values():
+            for d, positions in postings.items():
+                doc_lens[d] += len(positions)
+
+    with open(path, "wb") as f:
+        header = bytearray()
+        for doc_id, doc_len in zip(doc_ids, doc_lens):
+            name = doc_id.encode("utf-8")
+            encode_varint(len(name), header)
+            header += name
+            encode_varint(doc_len, header)
+        f.write(U32.pack(len(doc_ids)))
+        f.write(header)
+
+        for term in sorted(index, key=lambda t: t.encode("utf-8")):
+            key = term.encode("utf-8")
+            postings = index[term]
+            rec = bytearray()
+            encode_varint(len(key), rec)
+            rec += key
+            encode_varint(len(postings), rec)
+            prev_doc = 0
+            for d in sorted(postings):
+                positions = postings[d]
+                encode_varint(d - prev_doc, rec)
+                encode_varint(len(positions), rec)
+                prev_doc = d
+                prev_pos = 0
+                for p in positions:
+                    encode_varint(p - prev_pos, rec)
+                    prev_pos = p
+            f.write(U32.pack(len(rec)))
+            f.write(rec)
+
+
+def _varint_at(buf, i):
+    value = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, i
+        shift += 7
+
+
+def _read_varint(f):
+    value = shift = 0
+    while True:
+        b = f.read(1)[0]
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value
+        shift += 7
+
+
+class RunReader:
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        n = U32.unpack(self._f.read(4))[0]
+        self.doc_ids = []
+        self.doc_lens = []
+        for _ in range(n):
+            size = _read_varint(self._f)
+            self.doc_ids.append(self._f.read(size).decode("utf-8"))
+            self.doc_lens.append(_read_varint(self._f))
+
+    def __iter__(self):
+        # yields (term_bytes, [(local_doc, [positions]), ...]) in term order
+        f = self._f
+        while True:
+            head = f.read(4)
+            if not head:
+                break
+            rec = f.read(U32.unpack(head)[0])
+            n, i = _varint_at(rec, 0)
+            key = rec[i:i + n]
+            vals = decode_varints(rec[i + n:])
+            count = vals[0]
+            i = 1
+            postings = []
+            doc = 0
+            for _ in range(count):
+                doc += vals[i]
+                tf = vals[i + 1]
+                i += 2
+                positions = []
+                p = 0
+                for g in vals[i:i + tf]:
+                    p += g
+                    positions.append(p)
+                i += tf
+                postings.append((doc, positions))
+            yield key, postings
+        f.close()
+
+
+def merge_runs(run_paths, out_dir, min_df=1, with_positions=True, doc_lens=None, codecs=None):
+    # k-way merge of runs (in input order) into one segment; returns
+    # {term: df} so the caller can compute idf without another pass.
+    # Terms with df < min_df are dropped (used for the pruned n-gram index).
+    readers = [RunReader(p) for p in run_paths]
+    doc_ids, run_lens, bases = [], [], []
+    for r in readers:
+        bases.append(len(doc_ids))
+        doc_ids.extend(r.doc_ids)
+        run_lens.extend(r.doc_lens)
+
+    writer = SegmentWriter(out_dir, doc_ids, doc_lens or run_lens, with_positions, codecs)
+    df = {}
+
+    def keyed(i, reader):
+        for key, postings in reader:
+            yield key, i, postings
+
+    def emit(key, merged):
+        if len(merged) >= min_df:
+            term = key.decode("utf-8")
+            writer.add(term, merged)
+            df[term] = len(merged)
+
+    current, merged = None, {}
+    for key, i, postings in heapq.merge(*(keyed(i, r) for i, r in enumerate(readers))):
+        if key != current:
+            if current is not None:
+                emit(current, merged)
+            current, merged = key, {}
+        base = bases[i]
+        for d, positions in postings:
+            merged[base + d] = positions
+    if current is not None:
+        emit(current, merged)
+    writer.close()
+    return df
@@ -0,0 +1,169 @@
+import json
+from pathlib import Path
+
+from analyzer import load_analyzer
+from phrase import load_ngram_index
+from query_parser import query_terms
+from query_planner import execute, plan_query, query_tree
+from ranker import bm25_score
+from dense import load_dense_index, rrf
+from fields import load_fields
+from impact import load_impact_index
+from incremental_index import MANIFEST_FILE, open_index
+from matrix import load_matrix
+from result_cache import index_generation
+from segment import SegmentReader
+from topk import top_k
+from tracing import count, span
+
+# ----------------------------------------
+# SEARCH SERVICE
+# ----------------------------------------
+# Every query type behind one call, shared by the HTTP API workers
+# (api_server.py) and the Streamlit app's in-process mode. A Searcher owns
+# the open segments and reopens them when the index generation changes.
+#
+# When the incremental index (incremental_index.py, <index dir>/live) has
+# a manifest, it is what gets searched: its segments (the first one is
+# the batch segment it was seeded with) through a MultiSegmentReader, idf
+# from its live counts, queries analyzed with the analyzer saved next to
+# its manifest. The matrix, fields, impact,
+# dense and n-gram indexes are built over the batch segment's doc nums, so
+# the live index is scored from postings (BM25) without them.
+
+BASE_DIR = Path(__file__).resolve().parent
+INDEX_DIR = (BASE_DIR / ".." / "output").resolve()
+TOP_K = 10
+
+QUERY_TYPES = ("boolean", "phrase", "proximity", "proximity_ordered", "ranked", "semantic", "hybrid")
+TOP_K_TYPES = ("ranked", "semantic", "hybrid")   # cut at depth; the rest return every match
+FUSION_DEPTH = 100                               # per-leg candidates fused by RRF
+
+
+class Searcher:
+    def __init__(self, index_dir=INDEX_DIR, cache=None):
+        self.index_dir = Path(index_dir)
+        self.cache = cache
+        self.generation = None
+        self.refresh()
+
+    def refresh(self):
+        # -> True when the segments were (re)opened
+        generation = index_generation(self.index_dir)
+        if generation == self.generation:
+            return False
+        self.analyzer = load_analyzer(self.index_dir)
+        if (self.index_dir / "live" / MANIFEST_FILE).exists():
+            self._open_live()
+        else:
+            self._open_batch()
+        self.generation = generation
+        if self.cache is not None:
+            self.cache.check_generation(generation)
+        return True
+
+    def _open_batch(self):
+        self.reader = SegmentReader(self.index_dir / "positional")
+        self.ngram = load_ngram_index(self.index_dir / "ngram")
+        with open(self.index_dir / "idf.json", "r", encoding="utf-8") as f:
+            self.idf = json.load(f)
+        # title postings, field lengths and stored titles: title: queries,
+        # and BM25F instead of BM25 wherever the matrix scores
+        self.fields = load_fields(self.index_dir / "fields", self.reader)
+        self.scoring = "bm25" if self.fields is None else "bm25f"
+        # vectorized exhaustive scoring when the build emitted the matrix
+        self.matrix = load_matrix(self.index_dir / "matrix", self.reader, self.fields)
+        # impact-ordered tiers for early-terminating top-k, when built
+        self.impacts = load_impact_index(self.index_dir / "impact", self.reader)
+        # optional dense leg; without it semantic / hybrid fall back to BM25
+        self.dense = load_dense_index(self.index_dir / "dense", self.reader, self.idf, self.analyzer)
+
+    def _open_live(self):
+        self.analyzer = load_analyzer(self.index_dir / "live")
+        self.reader, self.idf = open_index(self.index_dir / "live")
+        self.ngram = self.fields = self.matrix = self.impacts = self.dense = None
+        self.scoring = "bm25"
+
+    def cache_key(self, qtype, query, k=3, depth=TOP_K):
+        # k only matters to proximity, depth only to ranked top-k
+        return self.cache.key(qtype, query,
+                              k if qtype.startswith("proximity") else "",
+                              depth if qtype in TOP_K_TYPES else "")
+
+    def search(self, qtype, query, k=3, depth=TOP_K):
+        # -> [(doc_id, score), ...] best first; ranked stops at depth,
+        # the filtering types return every match
+        if qtype not in QUERY_TYPES:
+            raise ValueError(f"Unknown query type: {qtype!r}")
+        if self.cache is None:
+            return self.execute(qtype, query, k, depth)
+        key = self.cache_key(qtype, query, k, depth)
+        results = self.cache.get(key)
+        if results is None:
+            count("cache_misses")
+            results = self.execute(qtype, query, k, depth)
+            self.cache.put(key, results)
+        else:
+            count("cache_hits")
+        return results
+
+    def execute(self, qtype, query, k=3, depth=TOP_K, reader=None):
+        # uncached; reader can stand in for the segment (see batch_search.py)
+        reader = self.reader if reader is None else reader
+        with span("parse"):
+            q = self.analyzer.analyze(query)
+
+        if qtype in TOP_K_TYPES:
+            if self.dense is None or qtype == "ranked":
+                return self._lexical_top(q, depth, reader)
+            if qtype == "semantic":
+                return self._dense_top(query, depth)
+            # reciprocal rank fusion of the BM25 and dense rankings
+            pool = max(depth, FUSION_DEPTH)
+            return rrf([self._lexical_top(q, pool, reader), self._dense_top(query, pool)], depth)
+
+        # boolean (the full query language), phrase and proximity are all
+        # operator trees: planned on doc freqs (phrases verified against
+        # positions, the n-gram index only narrows candidates), then
+        # streamed into the scorer (query_planner.py)
+        with span("parse"):
+            tree = query_tree(qtype, query, self.analyzer, k)
+            plan = plan_query(tree, reader, self.ngram, self.fields)
+        return self._rank_stream(query_terms(tree), execute(plan), reader)
+
+    def _rank_stream(self, q, docs, reader):
+        # docs: ascending doc nums, produced as the scorer pulls them
+        if self.matrix is not None:
+            return self.matrix.top_k_stream(q, docs, scoring=self.scoring)
+        with span("intersect"):
+            ids = [reader.doc_id(d) for d in docs]
+        return self._rescore(q, ids, reader) if ids else []
+
+    def _rescore(self, q, docs, reader):
+        # score from postings + stored doc lengths, restricted to the matches
+        with span("score"):
+            count("candidates_scored", len(docs))
+            if self.matrix is not None:
+                return self.matrix.top_k(q, None, scoring=self.scoring, candidates=docs)
+            return bm25_score(q, reader, self.idf, candidates=docs)
+
+    def _lexical_top(self, q, depth, reader):
+        # exhaustive NumPy scoring is the fastest when the matrix is there
+        # (bench/bench_impact.py); otherwise prune
+        with span("topk"):
+            if self.matrix is not None:
+                return self.matrix.top_k(q, depth, scoring=self.scoring)
+            if self.impacts is not None:
+                return self.impact_top(q, depth, reader)
+            # free-text top-k straight off the inverted index (WAND pruning)
+            return top_k(q, reader, self.idf, k=depth)
+
+    def _dense_top(self, query, depth):
+        with span("dense"):
+            return self.dense.search(query, depth)
+
+    def impact_top(self, q, depth, reader=None):
+        # score-at-a-time narrows to the docs that can be in the top k,
+        # then only those are scored exactly
+        docs = self.impacts.candidates(q, depth)
+        return self._rescore(q, docs, self.reader if reader is None else reader)[:depth] if docs else []
@@ -0,0 +1,610 @@
+import heapq
+import json
+import math
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from pathlib import Path
+
+from tracing import count, span
+from postings_codec import DEFAULT_CODECS, FIELDS, decode_sums, encode_varint, get_codec, read_varint
+from query_engine import gallop
+
+# ----------------------------------------
+# SEGMENT FORMAT
+# ----------------------------------------
+# One index segment is a directory with:
+#   meta.json      format version, counts, collection length stats
+#   docids.bin     u32 N, (N + 1) u32 offsets, utf-8 doc id strings
+#   doclens.bin    u32 token count per doc num (BM25 length norm)
+#   terms.bin      the sorted lexicon, front-coded in blocks of TERM_BLOCK:
+#                  the block's first term as varint(len) + bytes, then per
+#                  term varint(shared prefix), varint(suffix len), suffix
+#   terms.idx      u32 offset of every block (binary search on first terms)
+#   entries.bin    one fixed-size ENTRY per term id (the term's rank in the
+#                  lexicon); ENTRY carries per-term score upper bounds for top-k
+#   postings.bin   per term: its postings cut into blocks of meta.json
+#                  "skip_block" postings (SKIP_BLOCK when written);
+#                  terms with more than one block start with a skip table,
+#                  one SKIP entry per block: last doc num, block offset
+#                  (from the end of the table), positions offset (from the
+#                  term's positions). A block is varint(doc block length),
+#                  doc gaps (the first from the previous block's last doc),
+#                  tfs
+#   positions.bin  per term and block: position gaps (restarting in every
+#                  doc) (empty when meta.json has "positions": false)
+#
+# Each of the three fields -- docs, tfs, positions -- is encoded with the
+# codec named in meta.json "codecs" (postings_codec.py; vbyte by default),
+# restarted in every block, so any block decodes on its own. Readers mmap
+# the files and only decode the postings of the terms a query actually
+# touches; a PostingsCursor only decodes the blocks it lands in, gallops
+# over the skip table past the rest, and decodes tfs and positions of a
+# block only when asked for them.
+#
+# Terms and docs are dense integers inside the engine: a term string is
+# resolved to its term id once, a doc id string to its doc num once, and
+# postings come back as array('I') buffers (np.frombuffer views them
+# without copying). Strings only exist at the edges -- query parsing and
+# the doc ids in results.
+
+FORMAT_VERSION = 6
+TERM_BLOCK = 16
+SKIP_BLOCK = 128             # postings per block (one skip entry each)
+MAX_CACHED_TERMS = 1 << 16   # term -> id lookups kept per reader
+
+META_FILE = "meta.json"
+DOCIDS_FILE = "docids.bin"
+DOCLENS_FILE = "doclens.bin"
+TERMS_FILE = "terms.bin"
+TERMS_IDX_FILE = "terms.idx"
+ENTRIES_FILE = "entries.bin"
+POSTINGS_FILE = "postings.bin"
+POSITIONS_FILE = "positions.bin"
+
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+# df, postings offset, postings length, positions offset, positions length,
+# max BM25 tf-component, max tf / doc_len
+ENTRY = struct.Struct("<IQQQQdd")
+# last doc num, postings offset, positions offset of one block
+SKIP = struct.Struct("<III")
+
+END = 1 << 32   # past every doc num (cursors)
+
+# BM25 parameters the stored upper bounds are computed with
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def idf_value(n_docs, df):
+    # smoothed idf shared by build_index and the incremental index
+    return math.log((n_docs + 1) / (df + 1)) + 1
+
+
+def bm25_tf(tf, doc_len, avg_len, k1=BM25_K1, b=BM25_B):
+    # BM25 term weight without the idf factor
+    return tf * (k1 + 1) / (tf + k1 * (1 - b + b * (doc_len / avg_len)))
+
+
+# ----------------------------------------
+# WRITER
+# ----------------------------------------
+class SegmentWriter:
+    # Streams terms into a new segment. Terms must be added in ascending
+    # utf-8 byte order; doc lengths are needed up front for the BM25 bounds.
+    # with_positions=False keeps only (doc, tf) postings (positions.bin empty).
+    # codecs: {field: codec name} overriding DEFAULT_CODECS.
+    def __init__(self, out_dir, doc_ids, doc_lens, with_positions=True, codecs=None):
+        self.out_dir = Path(out_dir)
+        self.with_positions = with_positions
+        self.codecs = {**DEFAULT_CODECS, **(codecs or {})}
+        self._codec = {field: get_codec(self.codecs[field]) for field in FIELDS}
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.doc_lens = list(doc_lens)
+        self.total_len = sum(self.doc_lens)
+        self.avg_len = self.total_len / len(self.doc_lens) if self.doc_lens else 0.0
+        self.num_docs = len(self.doc_lens)
+        self.num_terms = 0
+        self.skip_block = SKIP_BLOCK
+        self._last_key = None
+
+        names = [d.encode("utf-8") for d in doc_ids]
+        with open(self.out_dir / DOCIDS_FILE, "wb") as f:
+            f.write(U32.pack(len(names)))
+            off = 0
+            for name in names:
+                f.write(U32.pack(off))
+                off += len(name)
+            f.write(U32.pack(off))
+            for name in names:
+                f.write(name)
+
+        with open(self.out_dir / DOCLENS_FILE, "wb") as f:
+            f.write(struct.pack(f"<{len(self.doc_lens)}I", *self.doc_lens))
+
+        self._terms_out = open(self.out_dir / TERMS_FILE, "wb")
+        self._idx_out = open(self.out_dir / TERMS_IDX_FILE, "wb")
+        self._entries_out = open(self.out_dir / ENTRIES_FILE, "wb")
+        self._post_out = open(self.out_dir / POSTINGS_FILE, "wb")
+        self._pos_out = open(self.out_dir / POSITIONS_FILE, "wb")
+        self._term_off = self._post_off = self._pos_off = 0
+
+    def add(self, term, postings):
+        # postings: {doc_num: [positions]} with ascending doc nums
+        key = term.encode("utf-8")
+        last = self._last_key
+        if last is not None and key <= last:
+            raise ValueError(f"Terms must be added in sorted order: {term!r}")
+        self._last_key = key
+
+        docs = list(postings)
+        max_bm25 = max_tf_norm = 0.0
+        skips, blocks, pos_blocks = [], [], []
+        post_size = pos_size = 0
+        prev_doc = 0
+        block_size = self.skip_block
+        for start in range(0, len(docs), block_size):
+            doc_gaps, tfs, pos_gaps = [], [], []
+            for doc_num in docs[start:start + block_size]:
+                positions = postings[doc_num]
+                tf = len(positions)
+                doc_len = self.doc_lens[doc_num]
+                doc_gaps.append(doc_num - prev_doc)
+                tfs.append(tf)
+                prev_doc = doc_num
+                max_bm25 = max(max_bm25, bm25_tf(tf, doc_len, self.avg_len))
+                max_tf_norm = max(max_tf_norm, tf / doc_len)
+                if not self.with_positions:
+                    continue
+                prev_pos = 0
+                for p in positions:
+                    pos_gaps.append(p - prev_pos)
+                    prev_pos = p
+            doc_block = self._codec["docs"].encode(doc_gaps)
+            block = bytearray()
+            encode_varint(len(doc_block), block)
+            block += doc_block
+            block += self._codec["tfs"].encode(tfs)
+            pos_block = self._codec["positions"].encode(pos_gaps) if self.with_positions else b""
+            skips.append(SKIP.pack(prev_doc, post_size, pos_size))
+            blocks.append(block)
+            pos_blocks.append(pos_block)
+            post_size += len(block)
+            pos_size += len(pos_block)
+        # one block needs no skip table: short lists cost what they did
+        post_buf = b"".join((skips if len(blocks) > 1 else []) + blocks)
+        pos_buf = b"".join(pos_blocks)
+
+        record = bytearray()
+        if self.num_terms % TERM_BLOCK == 0:
+            self._idx_out.write(U32.pack(self._term_off))
+            encode_varint(len(key), record)
+            record += key
+        else:
+            shared = 0
+            limit = min(len(key), len(last))
+            while shared < limit and key[shared] == last[shared]:
+                shared += 1
+            encode_varint(shared, record)
+            encode_varint(len(key) - shared, record)
+            record += key[shared:]
+        self._terms_out.write(record)
+        self._entries_out.write(ENTRY.pack(
+            len(postings), self._post_off, len(post_buf), self._pos_off, len(pos_buf),
+            max_bm25, max_tf_norm))
+        self._post_out.write(post_buf)
+        self._pos_out.write(pos_buf)
+        self._term_off += len(record)
+        self._post_off += len(post_buf)
+        self._pos_off += len(pos_buf)
+        self.num_terms += 1
+
+    def close(self):
+        for f in (self._terms_out, self._idx_out, self._entries_out, self._post_out, self._pos_out):
+            f.close()
+        meta = {
+            "format": FORMAT_VERSION,
+            "num_docs": self.num_docs,
+            "num_terms": self.num_terms,
+            "total_len": self.total_len,
+            "avg_doc_len": self.avg_len,
+            "positions": self.with_positions,
+            "codecs": self.codecs,
+            "skip_block": self.skip_block,
+        }
+        # meta.json last: a segment without it is incomplete
+        with open(self.out_dir / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+
+def write_segment(out_dir, doc_ids, index, with_positions=True, doc_lens=None, codecs=None):
+    # index: term -> {doc_num: [positions]}, doc nums ascending per term
+    # doc_ids: doc_num -> external string id
+    # doc_lens defaults to the token counts implied by the index itself
+    if doc_lens is None:
+        doc_lens = [0] * len(doc_ids)
+        for postings in index.values():
+            for doc_num, positions in postings.items():
+                doc_lens[doc_num] += len(positions)
+
+    writer = SegmentWriter(out_dir, doc_ids, doc_lens, with_positions, codecs)
+    for term in sorted(index, key=lambda t: t.encode("utf-8")):
+        writer.add(term, index[term])
+    writer.close()
+
+
+# ----------------------------------------
+# READER
+# ----------------------------------------
+def _map(path):
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def page_in(buf, off=0, n=None):
+    # fault buf[off:off + n] into memory (readahead hint, then one byte read
+    # per page); -> bytes covered
+    n = len(buf) - off if n is None else n
+    if n <= 0:
+        return 0
+    if isinstance(buf, mmap.mmap) and hasattr(buf, "madvise"):
+        start = off - off % mmap.PAGESIZE
+        buf.madvise(mmap.MADV_WILLNEED, start, off + n - start)
+    buf[off:off + n:mmap.PAGESIZE]
+    return n
+
+
+def page_in_array(a, start=0, end=None):
+    # the same for rows start:end of a numpy array (an mmap'd .npy)
+    part = a[start:end].reshape(-1)
+    if part.size:
+        part[::max(1, mmap.PAGESIZE // part.itemsize)].sum()
+    return part.nbytes
+
+
+class SegmentReader:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported segment format in {self.path}: {self.meta.get('format')}")
+
+        self.num_docs = self.meta["num_docs"]
+        self.num_terms = self.meta["num_terms"]
+        self.avg_doc_len = self.meta["avg_doc_len"]
+        self.has_positions = self.meta.get("positions", True)
+        self.skip_block = self.meta["skip_block"]
+        self.codecs = {field: get_codec(name) for field, name in self.meta["codecs"].items()}
+        self._docids = _map(self.path / DOCIDS_FILE)
+        self._doclens = _map(self.path / DOCLENS_FILE)
+        self._terms = _map(self.path / TERMS_FILE)
+        self._terms_idx = _map(self.path / TERMS_IDX_FILE)
+        self._entries = _map(self.path / ENTRIES_FILE)
+        self._num_blocks = len(self._terms_idx) // 4
+        self._heads = None
+        self._ids = {}   # term -> term id (None if absent), bounded by MAX_CACHED_TERMS
+        self._postings = _map(self.path / POSTINGS_FILE)
+        self._positions = _map(self.path / POSITIONS_FILE)
+        self._doc_nums = None
+
+    # --- doc id table ---
+    def doc_id(self, doc_num):
+        start, end = struct.unpack_from("<II", self._docids, 4 + 4 * doc_num)
+        base = 4 + 4 * (self.num_docs + 1)
+        return self._docids[base + start:base + end].decode("utf-8")
+
+    def doc_num(self, doc_id):
+        if self._doc_nums is None:
+            self._doc_nums = {self.doc_id(i): i for i in range(self.num_docs)}
+        return self._doc_nums.get(doc_id)
+
+    def all_docs(self):
+        return range(self.num_docs)
+
+    def doc_len(self, doc_num):
+        return U32.unpack_from(self._doclens, 4 * doc_num)[0]
+
+    # --- term dictionary ---
+    def _block(self, b):
+        # -> [term bytes] of lexicon block b
+        off = U32.unpack_from(self._terms_idx, 4 * b)[0]
+        count = min(TERM_BLOCK, self.num_terms - b * TERM_BLOCK)
+        n, off = read_varint(self._terms, off)
+        term = self._terms[off:off + n]
+        off += n
+        out = [term]
+        for _ in range(count - 1):
+            shared, off = read_varint(self._terms, off)
+            n, off = read_varint(self._terms, off)
+            term = term[:shared] + self._terms[off:off + n]
+            off += n
+            out.append(term)
+        return out
+
+    def _find(self, key):
+        # bisect the block heads (1 / TERM_BLOCK of the lexicon, loaded on
+        # first use), then scan one block up to the key
+        if self._heads is None:
+            heads = []
+            for b in range(self._num_blocks):
+                n, off = read_varint(self._terms, U32.unpack_from(self._terms_idx, 4 * b)[0])
+                heads.append(self._terms[off:off + n])
+            self._heads = heads
+        b = bisect_right(self._heads, key) - 1
+        if b < 0:
+            return None
+        term = self._heads[b]
+        if term == key:
+            return b * TERM_BLOCK
+        terms = self._terms
+        off = U32.unpack_from(self._terms_idx, 4 * b)[0]
+        n, off = read_varint(terms, off)
+        off += n
+        for i in range(1, min(TERM_BLOCK, self.num_terms - b * TERM_BLOCK)):
+            shared, off = read_varint(terms, off)
+            n, off = read_varint(terms, off)
+            term = term[:shared] + terms[off:off + n]
+            off += n
+            if term >= key:
+                return b * TERM_BLOCK + i if term == key else None
+        return None
+
+    def term_id(self, term):
+        # rank of the term in the sorted lexicon (row id in matrix.py), or None
+        try:
+            return self._ids[term]
+        except KeyError:
+            pass
+        if len(self._ids) >= MAX_CACHED_TERMS:
+            self._ids.clear()
+        tid = self._ids[term] = self._find(term.encode("utf-8"))
+        return tid
+
+    def term(self, term_id):
+        return self._block(term_id // TERM_BLOCK)[term_id % TERM_BLOCK].decode("utf-8")
+
+    def entry_at(self, term_id):
+        return ENTRY.unpack_from(self._entries, ENTRY.size * term_id)
+
+    def lookup(self, term):
+        tid = self.term_id(term)
+        return None if tid is None else self.entry_at(tid)
+
+    def __contains__(self, term):
+        return self.term_id(term) is not None
+
+    def terms(self):
+        for b in range(self._num_blocks):
+            for t in self._block(b):
+                yield t.decode("utf-8")
+
+    def doc_freq(self, term):
+        entry = self.lookup(term)
+        return entry[0] if entry else 0
+
+    def score_bounds(self, term):
+        # (max BM25 tf-component, max tf / doc_len) over the term's postings
+        entry = self.lookup(term)
+        return (entry[5], entry[6]) if entry else (0.0, 0.0)
+
+    # --- postings ---
+    def _skips(self, entry):
+        # -> (last doc nums, block offsets, positions offsets, offset of the
+        # first block) of a term; a lone block has no table and END as last
+        df, post_off = entry[0], entry[1]
+        n = -(-df // self.skip_block)
+        if n <= 1:
+            return (END,), (0,), (0,), post_off
+        table = struct.unpack_from(f"<{3 * n}I", self._postings, post_off)
+        return table[0::3], table[1::3], table[2::3], post_off + SKIP.size * n
+
+    def _doc_block(self, entry, skips, b):
+        # -> (doc nums, raw tfs, number of postings) of block b
+        lasts, offs, _, first = skips
+        n = min(self.skip_block, entry[0] - b * self.skip_block)
+        end = first + offs[b + 1] if b + 1 < len(offs) else entry[1] + entry[2]
+        raw = self._postings[first + offs[b]:end]
+        size, off = read_varint(raw, 0)
+        docs = decode_sums(self.codecs["docs"], raw[off:off + size], n, lasts[b - 1] if b else 0)
+        return docs, raw[off + size:], n
+
+    def _position_block(self, entry, skips, b, n):
+        # -> the n position gaps of block b
+        pos_offs = skips[2]
+        end = pos_offs[b + 1] if b + 1 < len(pos_offs) else entry[4]
+        start = entry[3]
+        return self.codecs["positions"].decode(self._positions[start + pos_offs[b]:start + end], n)
+
+    def _decode_docs(self, entry):
+        # -> doc nums of one dictionary entry as array('I')
+        skips = self._skips(entry)
+        docs = array("I")
+        for b in range(len(skips[1])):
+            docs.extend(self._doc_block(entry, skips, b)[0])
+        return docs
+
+    def _decode_postings(self, entry):
+        # -> (doc nums, tfs) of one dictionary entry, both array('I')
+        skips = self._skips(entry)
+        docs, tfs = array("I"), array("I")
+        for b in range(len(skips[1])):
+            block, raw_tfs, n = self._doc_block(entry, skips, b)
+            docs.extend(block)
+            tfs.extend(self.codecs["tfs"].decode(raw_tfs, n))
+        return docs, tfs
+
+    def doc_nums(self, term):
+        # array('I') of the doc nums containing the term (tfs are not decoded)
+        entry = self.lookup(term)
+        if entry is None:
+            return array("I")
+        with span("postings"):
+            count("postings_decoded", entry[0])
+            return self._decode_docs(entry)
+
+    def postings(self, term):
+        # [(doc_num, tf), ...] in ascending doc_num order
+        entry = self.lookup(term)
+        if entry is None:
+            return []
+        with span("postings"):
+            count("postings_decoded", entry[0])
+            return list(zip(*self._decode_postings(entry)))
+
+    def positions(self, term):
+        # [(doc_num, [positions]), ...] in ascending doc_num order
+        if not self.has_positions:
+            raise ValueError(f"{self.path} was built without positions")
+        entry = self.lookup(term)
+        if entry is None:
+            return []
+        with span("postings"):
+            skips = self._skips(entry)
+            out = []
+            for b in range(len(skips[1])):
+                docs, raw_tfs, n = self._doc_block(entry, skips, b)
+                tfs = self.codecs["tfs"].decode(raw_tfs, n)
+                gaps = self._position_block(entry, skips, b, sum(tfs))
+                i = 0
+                for doc, tf in zip(docs, tfs):
+                    out.append((doc, list(accumulate(gaps[i:i + tf]))))
+                    i += tf
+                count("positions_decoded", i)
+            count("postings_decoded", entry[0])
+            return out
+
+    def cursor(self, term):
+        # a PostingsCursor over the term's postings (None if absent)
+        entry = self.lookup(term)
+        return None if entry is None else PostingsCursor(self, entry)
+
+    # --- warm-up (warmup.py) ---
+    def hot_terms(self, n):
+        # -> ids of the n terms with the largest doc freq, largest first
+        dfs = [e[0] for e in ENTRY.iter_unpack(self._entries)]
+        return heapq.nlargest(n, range(len(dfs)), key=dfs.__getitem__)
+
+    def prefault(self, term_ids=()):
+        # page in the doc table, the lexicon and the postings / positions of
+        # term_ids, and build the lazy lookup state (doc id map, block heads,
+        # cached term ids) a first query would otherwise pay for; -> bytes
+        touched = sum(page_in(buf) for buf in (self._docids, self._doclens, self._terms,
+                                              self._terms_idx, self._entries))
+        for tid in term_ids:
+            entry = self.entry_at(tid)
+            touched += page_in(self._postings, entry[1], entry[2])
+            if self.has_positions:
+                touched += page_in(self._positions, entry[3], entry[4])
+            self.term_id(self.term(tid))
+        self.doc_num("")
+        return touched
+
+
+# ----------------------------------------
+# LAZY POSTINGS CURSOR
+# ----------------------------------------
+class PostingsCursor:
+    # One term's postings, decoded a block at a time. next_geq(target)
+    # gallops over the skip table's last doc nums to the first block that
+    # can hold target (the blocks jumped over are never decoded), then
+    # within that block; -> the first doc >= target, or END. Targets never
+    # go down. tf() and positions() are for the doc last returned and
+    # decode the block's tfs / positions on first use.
+    __slots__ = ("reader", "entry", "skips", "lasts", "b", "docs", "i", "n", "last",
+                 "_raw_tfs", "_tfs", "_starts", "_gaps")
+
+    def __init__(self, reader, entry):
+        self.reader = reader
+        self.entry = entry
+        self.skips = reader._skips(entry)
+        self.lasts = self.skips[0]
+        self._load(0)
+
+    def _load(self, b):
+        self.b = b
+        self.docs, self._raw_tfs, self.n = self.reader._doc_block(self.entry, self.skips, b)
+        self.last = self.docs[-1] if self.n else -1
+        self.i = 0
+        self._tfs = self._gaps = None
+        count("postings_decoded", self.n)
+
+    def next_geq(self, target):
+        docs, i = self.docs, self.i
+        if target <= self.last:
+            # in this block: usually the next doc already is the target
+            if docs[i] < target:
+                i += 1
+                if docs[i] < target:
+                    i = gallop(docs, target, i)
+                self.i = i
+            return docs[i]
+        b = gallop(self.lasts, target, self.b + 1)
+        if b == len(self.lasts):
+            self.i, self.last = self.n, -1
+            return END
+        self._load(b)
+        docs = self.docs
+        if docs[0] < target:
+            self.i = gallop(docs, target, 1)
+        return docs[self.i]
+
+    def tf(self):
+        if self._tfs is None:
+            self._tfs = self.reader.codecs["tfs"].decode(self._raw_tfs, self.n)
+        return self._tfs[self.i]
+
+    def positions(self):
+        if self._gaps is None:
+            self.tf()
+            self._starts = [0, *accumulate(self._tfs)]
+            self._gaps = self.reader._position_block(self.entry, self.skips, self.b, self._starts[-1])
+            count("positions_decoded", self._starts[-1])
+        i = self.i
+        return list(accumulate(self._gaps[self._starts[i]:self._starts[i + 1]]))
+
+
+# ----------------------------------------
+# DICT-LIKE VIEWS FOR THE QUERY CODE
+# ----------------------------------------
+class PositionalIndexView:
+    # Behaves like the old {term: {doc_id: [positions]}} JSON dict, but
+    # decodes one term at a time and keeps only a small LRU of them.
+    def __init__(self, reader, cache_size=256):
+        self.reader = reader
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _load(self, term):
+        if term in self._cache:
+            self._cache.move_to_end(term)
+            return self._cache[term]
+        if term not in self.reader:
+            return None
+        value = {self.reader.doc_id(d): pos for d, pos in self.reader.positions(term)}
+        self._cache[term] = value
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return value
+
+    def get(self, term, default=None):
+        value = self._load(term)
+        return default if value is None else value
+
+    def __getitem__(self, term):
+        value = self._load(term)
+        if value is None:
+            raise KeyError(term)
+        return value
+
+    def __contains__(self, term):
+        return term in self._cache or term in self.reader
+
+    def __len__(self):
+        return self.reader.num_terms
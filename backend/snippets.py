@@ -0,0 +1,141 @@
+import heapq
+from collections import Counter, defaultdict
+from html import escape
+
+from analyzer import DEFAULT
+from positional import phrase_spans
+from query_parser import QuerySyntaxError, parse_query, query_terms as tree_terms
+from segment import idf_value
+from tracing import count, span
+
+# ----------------------------------------
+# QUERY-BIASED SNIPPETS
+# ----------------------------------------
+# For every displayed hit:
+#   1. the query terms' positions in that doc come from the positional
+#      postings: each term's cursor seeks to the displayed doc nums in
+#      order, so only the blocks holding a displayed hit are decoded
+#   2. a two-pointer sweep over the merged positions finds the window of
+#      SNIPPET_TOKENS tokens covering the most idf weight -- linear in the
+#      number of matches in the doc
+#   3. the window's token byte spans (recorded at index time, docstore.py)
+#      cut the passage straight out of the store, and exactly the matched
+#      tokens are wrapped in <span class='hl'>; everything else is escaped
+#
+# Work per hit is bounded by its matches + the window, not the doc length.
+
+SNIPPET_TOKENS = 40
+MATCH_BONUS = 0.01   # among windows with the same terms, prefer more hits
+
+
+def query_terms(qtype, query, analyzer=DEFAULT):
+    # the index terms a query can match (boolean operators and NOT-ed terms dropped)
+    if qtype == "boolean":
+        try:
+            return tree_terms(parse_query(query, analyzer))
+        except QuerySyntaxError:
+            return []
+    return analyzer.analyze(query)
+
+
+def best_window(term_positions, weights, window=SNIPPET_TOKENS):
+    # -> (first, last) token positions of the best-scoring window
+    occurrences = heapq.merge(*[[(p, t) for p in ps] for t, ps in term_positions.items()])
+    occ = []
+    counts = Counter()
+    score = 0.0
+    best = (-1.0, 0, 0)
+    lo = 0
+    for p, t in occurrences:
+        occ.append((p, t))
+        if counts[t] == 0:
+            score += weights[t]
+        counts[t] += 1
+        while p - occ[lo][0] >= window:
+            old = occ[lo][1]
+            counts[old] -= 1
+            if counts[old] == 0:
+                score -= weights[old]
+            lo += 1
+        total = score + MATCH_BONUS * (len(occ) - lo)
+        if total > best[0]:
+            best = (total, occ[lo][0], p)
+    return best[1], best[2]
+
+
+def make_snippet(store, doc_num, term_positions, weights, window=SNIPPET_TOKENS, highlight=None):
+    # -> HTML passage for one doc; highlight defaults to every term position
+    n_tokens = store.num_tokens(doc_num)
+    start = 0
+    if term_positions:
+        first, last = best_window(term_positions, weights, window)
+        # centre the matches, then keep the window inside the doc
+        start = first - (window - (last - first + 1)) // 2
+        start = max(0, min(start, n_tokens - window))
+    end = min(n_tokens, start + window)
+    spans = store.token_spans(doc_num, start, end)
+    if not spans:
+        return ""
+
+    base = spans[0][0]
+    raw = store.passage(doc_num, base, spans[-1][1])
+    if highlight is None:
+        highlight = {p for ps in term_positions.values() for p in ps}
+    hits = {p for p in highlight if start <= p < end}
+    parts = ["… " if start > 0 else ""]
+    cursor = 0
+    for i, (s, e) in enumerate(spans):
+        if start + i not in hits:
+            continue
+        s, e = s - base, e - base
+        parts.append(escape(raw[cursor:s].decode("utf-8")))
+        parts.append(f"<span class='hl'>{escape(raw[s:e].decode('utf-8'))}</span>")
+        cursor = e
+    parts.append(escape(raw[cursor:].decode("utf-8")))
+    parts.append(" …" if end < n_tokens else "")
+    return "".join(parts)
+
+
+def _phrase_positions(terms, doc_positions):
+    # phrase queries: only whole phrase occurrences count (and get highlighted)
+    lists = [doc_positions.get(t) for t in terms]
+    if None in lists:
+        return {}, set()
+    spans = phrase_spans(lists)
+    covered = {p for first, last in spans for p in range(first, last + 1)}
+    return {" ".join(terms): [first for first, _ in spans]}, covered
+
+
+def make_snippets(reader, store, terms, doc_ids, window=SNIPPET_TOKENS, phrase=False):
+    # -> {doc_id: html} for the hits being rendered
+    with span("snippet"):
+        count("snippets", len(doc_ids))
+        return _make_snippets(reader, store, terms, doc_ids, window, phrase)
+
+
+def _make_snippets(reader, store, terms, doc_ids, window, phrase):
+    nums = {d: reader.doc_num(d) for d in doc_ids}
+    wanted = sorted({n for n in nums.values() if n is not None})
+    positions = defaultdict(dict)   # doc num -> term -> positions
+    weights = {}
+    for t in dict.fromkeys(terms):
+        df = reader.doc_freq(t)
+        if df == 0:
+            continue
+        weights[t] = idf_value(reader.num_docs, df)
+        cursor = reader.cursor(t)
+        for n in wanted:
+            if cursor.next_geq(n) == n:
+                positions[n][t] = cursor.positions()
+    if phrase and len(terms) > 1:
+        weights[" ".join(terms)] = 1.0
+    out = {}
+    for d, n in nums.items():
+        if n is None:
+            out[d] = ""
+            continue
+        term_positions, highlight = positions.get(n, {}), None
+        if phrase and len(terms) > 1:
+            term_positions, highlight = _phrase_positions(terms, term_positions)
+        out[d] = make_snippet(store, n, term_positions, weights, window, highlight)
+    return out
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+
+from analyzer import DEFAULT
+from runs import merge_runs, record_id, write_run
+from segment import idf_value
+
+# ----------------------------------------
+# SPIMI: SINGLE-PASS IN-MEMORY INDEXING
+# ----------------------------------------
+# The JSONL is streamed one line at a time into a block of in-memory
+# postings. Whenever the estimated size of the block passes the memory
+# budget, the block is written out as a sorted run (runs.py) and a new one
+# is started. At the end all runs are k-way merged into the segments, so
+# neither the raw text nor the full index is ever held in memory.
+
+# rough CPython costs, used to estimate a block's footprint without
+# walking it: a new term (str + dict slot + inner dict), a new posting
+# (dict slot + list) and one more position (int + list slot)
+TERM_BYTES = 200
+POSTING_BYTES = 120
+POSITION_BYTES = 36
+
+
+class _Block:
+    def __init__(self, with_pairs):
+        self.with_pairs = with_pairs
+        self.doc_ids = []
+        self.doc_lens = []
+        self.positional = {}
+        self.biword = {}
+        self.size = 0
+
+    def _add(self, index, term, doc_num, pos):
+        postings = index.get(term)
+        if postings is None:
+            postings = index[term] = {}
+            self.size += TERM_BYTES
+        positions = postings.get(doc_num)
+        if positions is None:
+            positions = postings[doc_num] = []
+            self.size += POSTING_BYTES
+        positions.append(pos)
+        self.size += POSITION_BYTES
+
+    def add_doc(self, doc_id, tokens):
+        doc_num = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lens.append(len(tokens))
+        self.size += len(doc_id) + POSTING_BYTES
+        for pos, term in enumerate(tokens):
+            self._add(self.positional, term, doc_num, pos)
+        if not self.with_pairs:
+            return
+        for i in range(len(tokens) - 1):
+            self._add(self.biword, tokens[i] + " " + tokens[i + 1], doc_num, i)
+
+
+def build_spimi(docs_path, out_dir, memory_mb=256, ngram_min_df=None, codecs=None, analyzer=DEFAULT):
+    budget = memory_mb * 1024 * 1024
+    tmp_dir = out_dir / "tmp_runs"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    pos_runs, bi_runs = [], []
+    n_docs = 0
+    with_pairs = ngram_min_df is not None
+
+    def flush(block):
+        n = len(pos_runs)
+        pos_run = os.path.join(tmp_dir, f"block_{n:05d}.pos.run")
+        write_run(pos_run, block.doc_ids, block.positional)
+        pos_runs.append(pos_run)
+        if with_pairs:
+            bi_run = os.path.join(tmp_dir, f"block_{n:05d}.bi.run")
+            write_run(bi_run, block.doc_ids, block.biword, block.doc_lens)
+            bi_runs.append(bi_run)
+        print(f"  flushed block {n} ({len(block.doc_ids)} docs, ~{block.size // (1024 * 1024)} MB)")
+
+    block = _Block(with_pairs)
+    with open(docs_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            doc_id = record_id(entry, n_docs)
+            text = entry.get("text") or (entry.get("title", "") + " " + entry.get("abstract", ""))
+            block.add_doc(doc_id, analyzer.analyze(text))
+            n_docs += 1
+            if block.size >= budget:
+                flush(block)
+                block = _Block(with_pairs)
+    if block.doc_ids:
+        flush(block)
+
+    print(f"Merging {len(pos_runs)} blocks ({n_docs} docs) ...")
+    df = merge_runs(pos_runs, out_dir / "positional", codecs=codecs)
+    if with_pairs:
+        merge_runs(bi_runs, out_dir / "ngram", ngram_min_df, with_positions=False, codecs=codecs)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    idf = {t: idf_value(n_docs, d) for t, d in df.items()}
+    with open(out_dir / "idf.json", "w", encoding="utf-8") as f:
+        json.dump(idf, f)
+    return n_docs
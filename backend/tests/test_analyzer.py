@@ -0,0 +1,67 @@
+import json
+import random
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from analyzer import ANALYZER_FILE, DEFAULT, STOPWORDS, Analyzer, load_analyzer, s_stem
+from search_service import Searcher
+
+# The ASCII fast path and the regex path split alike, token spans line up
+# with the analyzed terms, and the analyzer a build was configured with is
+# the one its queries go through.
+
+PIECES = ["The", "graphs", "of", "Queries", "x2", "co-op", "state-of-the-art", "(a)", "naïve", "Café",
+          "STRASSE", "ﬁle", "İstanbul", "...", "\t", "\n", "42nd", "classes"]
+
+
+def texts():
+    rng = random.Random(8)
+    for _ in range(100):
+        yield " ".join(rng.choices(PIECES, k=rng.randint(0, 12)))
+
+
+def test_fast_path_matches_regex():
+    for text in texts():
+        if text.isascii():
+            assert DEFAULT.analyze(text) == re.findall(r"[a-z0-9]+", text.lower())
+
+
+@pytest.mark.parametrize("analyzer", [DEFAULT, Analyzer(stopwords=True), Analyzer(stopwords=True, stem="s")])
+def test_spans_line_up_with_terms(analyzer):
+    for text in texts():
+        data = text.encode("utf-8")
+        # a span can cover a char whose lower case is a token char plus a mark ("İ")
+        surface = [re.sub(r"[^a-z0-9]", "", data[s:e].decode("utf-8").lower()) for s, e in analyzer.token_spans(text)]
+        if analyzer.stem:
+            surface = [s_stem(t) for t in surface]
+        assert surface == analyzer.analyze(text)
+
+
+def test_s_stemmer():
+    words = ["queries", "graphs", "classes", "toes", "glass", "virus", "series"]
+    assert [s_stem(w) for w in words] == ["query", "graph", "classe", "toe", "glass", "virus", "sery"]
+    assert Analyzer(stopwords=True).analyze("The graph of a tree") == ["graph", "tree"]
+    with pytest.raises(ValueError):
+        Analyzer(stem="lancaster")
+
+
+def test_build_config_is_used_at_query_time(tmp_path):
+    corpus = tmp_path / "docs.jsonl"
+    docs = [("d1", "Colourings of sparse graphs"), ("d2", "A graph and the queries"), ("d3", "Sparse codes")]
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in docs), encoding="utf-8")
+    out = tmp_path / "index"
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields",
+                      "--stopwords", "--stem", "s"])
+    assert json.loads((out / ANALYZER_FILE).read_text()) == {"stopwords": sorted(STOPWORDS), "stem": "s"}
+    searcher = Searcher(out)
+    assert searcher.reader.doc_freq("the") == 0 and searcher.reader.doc_freq("graph") == 2
+    assert {d for d, _ in searcher.search("boolean", "Graphs")} == {"d1", "d2"}
+    assert {d for d, _ in searcher.search("phrase", "sparse graph")} == {"d1"}
+    assert {d for d, _ in searcher.search("phrase", "graph and the query")} == {"d2"}
+    assert load_analyzer(tmp_path) is DEFAULT
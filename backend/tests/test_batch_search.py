@@ -0,0 +1,60 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+import segment
+from batch_search import SharedPostings, search_batch
+from search_service import Searcher
+
+# A batch returns what the serial loop returns, query by query, while the
+# queries of a chunk share the postings blocks they decode.
+
+DOCS = [
+    ("d1", "Quantum field theory in curved space."),
+    ("d2", "Colouring sparse graphs with few colours."),
+    ("d3", "Training deep neural networks on sparse data."),
+    ("d4", "Solutions of the field equations of general relativity."),
+    ("d5", "Sparse quantum error correcting codes."),
+]
+QUERIES = [("ranked", "sparse quantum"), ("boolean", "sparse AND NOT graphs"), ("phrase", "field theory"),
+           ("proximity", "sparse codes"), ("proximity_ordered", "field equations"), "field",
+           ("boolean", "quantum OR (deep AND networks)")]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in DOCS), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out)])
+    return out
+
+
+def test_batch_matches_serial(index):
+    searcher = Searcher(index)
+    serial = [searcher.execute("ranked", q) if isinstance(q, str) else searcher.execute(*q) for q in QUERIES]
+    batch = [None] * len(QUERIES)
+    for i, results in search_batch(QUERIES, index, chunk_size=3):
+        batch[i] = results
+    assert batch == serial
+
+
+def test_chunk_decodes_each_block_once(index, monkeypatch):
+    searcher = Searcher(index)
+    decoded = []
+    original = segment.SegmentReader._doc_block
+
+    def counting(self, entry, skips, b):
+        decoded.append((entry[1], b))
+        return original(self, entry, skips, b)
+
+    monkeypatch.setattr(segment.SegmentReader, "_doc_block", counting)
+    shared = SharedPostings(searcher.reader)
+    for query in ("sparse quantum", "sparse AND field", "sparse"):
+        searcher.execute("boolean", query, reader=shared)
+    assert decoded and len(decoded) == len(set(decoded))
@@ -0,0 +1,66 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+import spimi
+from segment import SegmentReader
+
+# Every build mode indexes the same corpus into the same segments, up to
+# doc num order: the same doc ids (records without one are named by their
+# ordinal), the same positions per (term, doc id), the same idf.
+
+WORDS = [f"w{i}" for i in range(40)]
+
+
+def write_corpus(path):
+    rng = random.Random(3)
+    lines = []
+    for i in range(60):
+        entry = {"text": " ".join(rng.choices(WORDS, k=rng.randint(3, 30)))}
+        if i % 7:
+            entry["id"] = f"doc{i}"
+        lines.append(json.dumps(entry))
+        if i == 20:
+            lines.append("")   # blank lines are not records
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def contents(index_dir, part):
+    reader = SegmentReader(index_dir / part)
+    postings = {}
+    for term in reader.terms():
+        if reader.has_positions:
+            postings[term] = {reader.doc_id(d): p for d, p in reader.positions(term)}
+        else:
+            postings[term] = {reader.doc_id(d): tf for d, tf in reader.postings(term)}
+    doc_lens = {reader.doc_id(d): reader.doc_len(d) for d in range(reader.num_docs)}
+    return postings, doc_lens
+
+
+def build(tmp_path, name, *args):
+    corpus = tmp_path / "docs.jsonl"
+    if not corpus.exists():
+        write_corpus(corpus)
+    out = tmp_path / name
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields",
+                      "--phrase-index", "ngram", "--ngram-min-df", "2", *args])
+    return out
+
+
+@pytest.mark.parametrize("mode", [["--workers", "2"], ["--memory-mb", "1"]])
+def test_build_mode_matches_serial(tmp_path, monkeypatch, mode):
+    # a position "costs" 64 KiB, so SPIMI flushes a run every few docs
+    monkeypatch.setattr(spimi, "POSITION_BYTES", 64 * 1024)
+    serial = build(tmp_path, "serial")
+    other = build(tmp_path, "other", *mode)
+    for part in ("positional", "ngram"):
+        assert contents(other, part) == contents(serial, part)
+    assert json.loads((other / "idf.json").read_text()) == json.loads((serial / "idf.json").read_text())
+    ids = set(contents(serial, "positional")[1])
+    assert len(ids) == 60 and {"0", "7", "56"} <= ids
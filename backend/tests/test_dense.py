@@ -0,0 +1,79 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from dense import hashed_query_vector, rrf, write_dense
+from search_service import Searcher
+
+# The hashed-tfidf leg embeds docs and queries the same way, IVF with every
+# list probed is the exact scan, and hybrid is the RRF of the BM25 and
+# dense rankings.
+
+WORDS = [f"w{i}" for i in range(40)]
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    rng = random.Random(2)
+    docs = {f"d{i}": rng.choices(WORDS, k=rng.randint(3, 25)) for i in range(150)}
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": " ".join(t)}) + "\n" for d, t in docs.items()),
+                      encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-fields", "--dense"])
+    return docs, Searcher(out)
+
+
+def test_doc_vectors_match_query_embedding(built):
+    docs, searcher = built
+    dense = searcher.dense
+    for doc_id, tokens in docs.items():
+        expected = hashed_query_vector(tokens, searcher.idf, dense.dim)
+        assert np.allclose(dense.vectors[searcher.reader.doc_num(doc_id)], expected, atol=1e-5)
+
+
+def test_search_is_exact_cosine(built):
+    docs, searcher = built
+    dense = searcher.dense
+    qvec = dense.embed_query("w1 w2 w30")
+    cosines = np.asarray(dense.vectors) @ qvec
+    best = np.lexsort((np.arange(len(cosines)), -cosines))[:10]
+    assert dense.search("w1 w2 w30", 10) == [(searcher.reader.doc_id(int(d)), round(float(cosines[d]), 4)) for d in best]
+    # a doc's own text is its nearest neighbour
+    assert dense.search(" ".join(docs["d42"]), 1)[0] == ("d42", 1.0)
+
+
+def test_ivf_probing_every_list_is_exact(built):
+    _, searcher = built
+    dense = searcher.dense
+    qvec = dense.embed_query("w5 w6")
+    assert dense.search_vector(qvec, 20, nprobe=len(dense.centroids)) == dense.brute_force(qvec, 20)
+    approx = dict(dense.brute_force(qvec, 20, quantized=True))
+    assert all(abs(approx.get(d, 0.0) - s) < 0.02 for d, s in dense.brute_force(qvec, 5))
+
+
+def test_ivf_lists_partition_the_docs(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((300, 16)).astype(np.float32)
+    write_dense(tmp_path, vectors, "test", nlist=7)
+    offsets, ids = np.load(tmp_path / "ivf_offsets.npy"), np.load(tmp_path / "ivf_ids.npy")
+    assert offsets[-1] == 300 and sorted(ids) == list(range(300))
+
+
+def test_rrf():
+    fused = rrf([[("a", 9.0), ("b", 5.0)], [("b", 0.9), ("c", 0.8)]], k=3, rrf_k=1)
+    assert fused == [("b", round(1 / 3 + 1 / 2, 6)), ("a", 0.5), ("c", round(1 / 3, 6))]
+
+
+def test_hybrid_fuses_both_legs(built):
+    _, searcher = built
+    query = "w3 w17"
+    lexical = searcher.search("ranked", query, depth=100)
+    semantic = searcher.search("semantic", query, depth=100)
+    assert searcher.search("hybrid", query, depth=10) == rrf([lexical, semantic], 10)
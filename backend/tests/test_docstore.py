@@ -0,0 +1,70 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+import docstore
+from analyzer import DEFAULT
+from docstore import doc_text, load_docstore
+from segment import SegmentReader
+
+# Every doc's text reads back byte for byte, stored as-is or in zlib
+# blocks (several of them, through LRUs smaller than the corpus), and its
+# stored token spans are the analyzer's: span p is the token at position p.
+
+WORDS = ["Café", "naïve", "Straße", "graph", "COLOURING", "x2", "état", "—", "bounds", "of"]
+
+
+def records():
+    rng = random.Random(4)
+    out = []
+    for i in range(40):
+        text = " ".join(rng.choices(WORDS, k=rng.randint(0, 30)))
+        if i % 5 == 0:
+            out.append({"id": f"d{i}", "title": "Title " + text[:20], "abstract": text})
+        elif i % 7 == 0:
+            out.append({"text": text + "."})   # named by its ordinal
+        else:
+            out.append({"id": f"d{i}", "text": text})
+    return out
+
+
+@pytest.fixture(scope="module", params=["none", "zlib"])
+def store(request, tmp_path_factory):
+    out = tmp_path_factory.mktemp(request.param)
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps(r) + "\n" for r in records()), encoding="utf-8")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(docstore, "BLOCK_BYTES", 256)
+        build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields",
+                          "--doc-compression", request.param])
+    return load_docstore(out / "docstore", SegmentReader(out / "positional"), cache_size=3, block_cache_size=2)
+
+
+def test_text_round_trip(store):
+    assert store.meta["compression"] in ("none", "zlib")
+    for _ in range(2):   # the second pass reads through the LRUs
+        for i, entry in enumerate(records()):
+            assert store.text(entry.get("id", str(i))) == doc_text(entry)
+    assert store.text("missing", "-") == "-"
+
+
+def test_spans_are_the_analyzers(store):
+    for i, entry in enumerate(records()):
+        text = doc_text(entry)
+        doc_num = store.reader.doc_num(entry.get("id", str(i)))
+        spans = store.token_spans(doc_num, 0, store.num_tokens(doc_num))
+        assert spans == DEFAULT.token_spans(text)
+        assert store.num_tokens(doc_num) == store.reader.doc_len(doc_num)
+        data = text.encode("utf-8")
+        terms = [data[s:e].decode("utf-8").lower() for s, e in spans]
+        assert terms == DEFAULT.analyze(text)
+        if spans:
+            s, e = spans[-1]
+            assert store.passage(doc_num, s, e) == data[s:e]
+            assert store.token_spans(doc_num, len(spans) - 1, len(spans) + 5) == [spans[-1]]
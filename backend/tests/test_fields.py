@@ -0,0 +1,88 @@
+import json
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from analyzer import DEFAULT
+from docstore import doc_text
+from fields import FIELD_B, FIELD_WEIGHTS, doc_fields
+from search_service import Searcher
+from segment import BM25_K1
+
+# BM25F from the matrix's precomputed tf~ equals the formula in fields.py
+# evaluated on the raw title / abstract tokens, for every way a record can
+# carry its title; title: queries read the title field alone.
+
+WORDS = [f"w{i}" for i in range(25)]
+QUERIES = [["w0"], ["w1", "w2"], ["w3", "w3", "w20"], ["w24", "w0", "w7"]]
+
+
+def records():
+    rng = random.Random(13)
+    out = []
+    for i in range(80):
+        title = " ".join(rng.choices(WORDS, k=rng.randint(1, 6)))
+        abstract = " ".join(rng.choices(WORDS, k=rng.randint(0, 40)))
+        doc_id = f"d{i}"
+        if i % 4 == 0:
+            out.append({"id": doc_id, "title": title, "abstract": abstract})
+        elif i % 4 == 1:
+            out.append({"id": doc_id, "text": f"Title: {title}\nAbstract: {abstract}"})
+        elif i % 4 == 2:
+            out.append({"id": doc_id, "text": f"{title}.   {abstract}"})
+        else:
+            out.append({"id": doc_id, "text": f"{title} {abstract}"})   # no recognizable title
+    return out
+
+
+@pytest.fixture(scope="module")
+def searcher(tmp_path_factory):
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps(r) + "\n" for r in records()), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out)])
+    searcher = Searcher(out)
+    assert searcher.scoring == "bm25f"
+    return searcher
+
+
+def reference_bm25f(query, idf):
+    docs = {}
+    for r in records():
+        title = DEFAULT.analyze(doc_fields(r)[0])
+        whole = DEFAULT.analyze(doc_text(r))
+        abstract_tf = Counter(whole) - Counter(title)
+        docs[r["id"]] = ((Counter(title), len(title)), (abstract_tf, len(whole) - len(title)))
+    avg = [sum(d[i][1] for d in docs.values()) / len(docs) for i in range(2)]
+    scores = {}
+    for doc_id, fields in docs.items():
+        score = 0.0
+        for q, qtf in Counter(query).items():
+            tf = sum(FIELD_WEIGHTS[f] * tfs[q] / (1 - FIELD_B[f] + FIELD_B[f] * n / a)
+                     for f, (tfs, n), a in zip(("title", "abstract"), fields, avg))
+            if tf:
+                score += qtf * idf[q] * tf * (BM25_K1 + 1) / (BM25_K1 + tf)
+        if score:
+            scores[doc_id] = score
+    return scores
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_bm25f_matches_reference(searcher, query):
+    ranked = dict(searcher.search("ranked", " ".join(query), depth=1000))
+    assert ranked == pytest.approx(reference_bm25f(query, searcher.idf), abs=1e-3)
+
+
+def test_titles_and_title_queries(searcher):
+    fields = searcher.fields
+    for r in records():
+        title = doc_fields(r)[0]
+        assert fields.title_of(r["id"]) == " ".join(title.split())
+    expected = {r["id"] for r in records() if "w5" in DEFAULT.analyze(doc_fields(r)[0])}
+    assert expected and {d for d, _ in searcher.search("boolean", "title:w5")} == expected
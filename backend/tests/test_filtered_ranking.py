@@ -0,0 +1,53 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from query_planner import boolean_search
+from search_service import Searcher
+
+# Filtering query types return every doc the planner matches, including
+# matches that score 0 because no ranked term occurs in them (NOT-only and
+# OR NOT queries); they rank after the scored docs, in doc num order.
+
+DOCS = [
+    ("d1", "Title: Quantum field theory\nAbstract: A quantum field in curved space."),
+    ("d2", "Title: Graph colouring\nAbstract: Colouring sparse graphs."),
+    ("d3", "Title: Neural networks\nAbstract: Training deep networks."),
+    ("d4", "Title: Field equations\nAbstract: Solutions of the field equations."),
+    ("d5", "Title: Spin chains\nAbstract: Quantum spin chains at low temperature."),
+]
+QUERIES = ["NOT field", "quantum OR NOT field", "NOT quantum NOT graph", "title:quantum OR NOT quantum"]
+
+
+@pytest.fixture(scope="module", params=["matrix", "no-matrix"])
+def searcher(request, tmp_path_factory):
+    out = tmp_path_factory.mktemp(request.param)
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in DOCS), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out)] +
+                     (["--no-matrix"] if request.param == "no-matrix" else []))
+    return Searcher(out)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_every_match_is_returned(searcher, query):
+    expected = boolean_search(searcher.reader, query, searcher.analyzer, fields=searcher.fields)
+    results = searcher.execute("boolean", query)
+    assert sorted(d for d, _ in results) == sorted(expected)
+
+
+def test_zero_scores_follow_scored_docs_in_doc_order(searcher):
+    results = searcher.execute("boolean", "quantum OR NOT field")
+    assert {d for d, _ in results[:2]} == {"d1", "d5"}
+    assert all(s > 0 for _, s in results[:2])
+    assert results[2:] == [("d2", 0.0), ("d3", 0.0)]
+
+
+def test_pure_not(searcher):
+    results = searcher.execute("boolean", "NOT field")
+    assert results == [("d2", 0.0), ("d3", 0.0), ("d5", 0.0)]
@@ -0,0 +1,59 @@
+import json
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from ranker import bm25_score
+from search_service import Searcher
+
+# Score-at-a-time over the impact tiers narrows to a candidate set that
+# holds the exact BM25 top k, so Searcher's rescored results equal
+# exhaustive BM25; it gets there without reading every posting.
+
+VOCAB = [f"w{i}" for i in range(50)]
+QUERIES = [["w0"], ["w0", "w1"], ["w2", "w30"], ["w1", "w1", "w6", "w49"], ["w3", "w4", "w8", "w20"]]
+
+
+@pytest.fixture(scope="module")
+def searcher(tmp_path_factory):
+    rng = random.Random(6)
+    weights = [1 / (i + 1) for i in range(len(VOCAB))]
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": f"d{i}", "text": " ".join(rng.choices(VOCAB, weights, k=rng.randint(5, 60)))}) + "\n"
+                              for i in range(600)), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields", "--impacts"])
+    searcher = Searcher(out)
+    assert searcher.impacts is not None
+    return searcher
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 10, 40])
+def test_impact_top_matches_exhaustive(searcher, query, k):
+    brute = bm25_score(query, searcher.reader, searcher.idf)
+    got = searcher.impact_top(query, k)
+    assert [s for _, s in got] == [s for _, s in brute[:k]]
+    assert all(dict(brute)[d] == s for d, s in got)
+    assert searcher.search("ranked", " ".join(query), depth=k) == got
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_quantized_scores_are_close(searcher, query):
+    impacts = searcher.impacts
+    exact = dict(bm25_score(query, searcher.reader, searcher.idf))
+    error = sum(Counter(query).values()) * impacts.scale
+    for doc_id, score in impacts.top_k(query, 10):
+        assert abs(score - exact[doc_id]) <= error
+
+
+def test_stops_early(searcher):
+    impacts = searcher.impacts
+    _, scored = impacts.saat(["w0"], k=5)
+    assert 0 < scored < searcher.reader.doc_freq("w0")
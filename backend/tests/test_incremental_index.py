@@ -0,0 +1,64 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from incremental_index import IndexWriter
+from search_service import Searcher
+
+# A live index created next to a batch index starts from the batch
+# segment: the batch docs keep their doc nums, and adds, replacements and
+# deletes apply on top of them.
+
+DOCS = [
+    ("d1", "Quantum field theory in curved space."),
+    ("d2", "Colouring sparse graphs."),
+    ("d3", "Training deep neural networks."),
+    ("d4", "Solutions of the field equations."),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    corpus = tmp_path / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in DOCS), encoding="utf-8")
+    out = tmp_path / "index"
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix"])
+    return out
+
+
+def ids(results):
+    return sorted(d for d, _ in results)
+
+
+def test_live_index_is_seeded_with_the_batch_segment(index):
+    batch = Searcher(index)
+    IndexWriter(index / "live")
+    live = Searcher(index)
+    assert live.reader is not batch.reader and live.reader.num_docs == len(DOCS)
+    assert [live.reader.doc_id(d) for d in range(len(DOCS))] == [batch.reader.doc_id(d) for d in range(len(DOCS))]
+    assert ids(live.execute("boolean", "field")) == ["d1", "d4"]
+
+
+def test_adds_replacements_and_deletes_apply_to_batch_docs(index):
+    writer = IndexWriter(index / "live")
+    writer.add_documents({"d5": writer.analyzer.analyze("A field guide to graphs."),
+                          "d2": writer.analyzer.analyze("Colouring planar graphs.")})
+    writer.delete(["d1"])
+    searcher = Searcher(index)
+    assert searcher.reader.num_docs == 4
+    assert ids(searcher.execute("boolean", "field")) == ["d4", "d5"]
+    assert ids(searcher.execute("boolean", "sparse")) == []
+    assert ids(searcher.execute("boolean", "planar")) == ["d2"]
+
+
+def test_an_existing_live_index_is_not_reseeded(index):
+    writer = IndexWriter(index / "live")
+    writer.delete(["d3"])
+    again = IndexWriter(index / "live")
+    assert len(again.manifest["segments"]) == 1
+    assert Searcher(index).reader.num_docs == 3
@@ -0,0 +1,50 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import segment
+from segment import TERM_BLOCK, SegmentReader, write_segment
+
+# Term ids are ranks in the front-coded lexicon (utf-8 byte order) and
+# doc nums index the doc table: both round-trip through their string
+# forms, and strings that are not there map to None.
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    rng = random.Random(12)
+    stems = ["graph", "graphs", "grapheme", "gr", "a", "z", "é", "éclair", "x1", "x10", "x2"]
+    terms = sorted({rng.choice(stems) + "".join(rng.choices("ab", k=rng.randint(0, 3))) for _ in range(200)})
+    doc_ids = [f"doc_{i:04d}" for i in range(30)] + ["ü-doc", ""]
+    index = {t: {d: [0] for d in sorted(rng.sample(range(len(doc_ids)), 3))} for t in terms}
+    out = tmp_path_factory.mktemp("seg")
+    write_segment(out, doc_ids, index)
+    return terms, doc_ids, SegmentReader(out)
+
+
+def test_term_ids_round_trip(built, monkeypatch):
+    terms, _, reader = built
+    monkeypatch.setattr(segment, "MAX_CACHED_TERMS", 8)   # exercise the cache reset
+    by_bytes = sorted(terms, key=lambda t: t.encode("utf-8"))
+    assert reader.num_terms == len(terms) > 3 * TERM_BLOCK
+    assert list(reader.terms()) == by_bytes
+    for tid, term in enumerate(by_bytes):
+        assert reader.term_id(term) == tid and reader.term(tid) == term and term in reader
+    for missing in ("", "0", "grapha", "graphz", "zzzz", "éa", "￿"):
+        if missing not in terms:
+            assert reader.term_id(missing) is None and missing not in reader
+            assert reader.doc_freq(missing) == 0 and reader.lookup(missing) is None
+
+
+def test_doc_nums_round_trip(built):
+    terms, doc_ids, reader = built
+    assert reader.num_docs == len(doc_ids)
+    assert [reader.doc_id(d) for d in reader.all_docs()] == doc_ids
+    assert all(reader.doc_num(d) == i for i, d in enumerate(doc_ids))
+    assert reader.doc_num("doc_9999") is None
+    docs = reader.doc_nums(terms[0])
+    assert docs.typecode == "I" and list(docs) == sorted(docs)
@@ -0,0 +1,75 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from matrix import load_matrix
+from ranker import bm25_score, tfidf_score
+from search_service import Searcher
+
+# The vectorized matrix scores every doc exactly as the postings scorer in
+# ranker.py does, for the whole collection, a candidate subset, or a
+# stream of doc nums.
+
+WORDS = [f"w{i}" for i in range(30)]
+QUERIES = [["w0"], ["w0", "w1"], ["w2", "w2", "w17"], ["w29", "w5", "w11"], ["nosuchterm"]]
+
+
+@pytest.fixture(scope="module")
+def searcher(tmp_path_factory):
+    rng = random.Random(11)
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    weights = [1 / (i + 1) for i in range(len(WORDS))]
+    corpus.write_text("".join(json.dumps({"id": f"d{i}", "text": " ".join(rng.choices(WORDS, weights, k=rng.randint(3, 50)))}) + "\n"
+                              for i in range(200)), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-fields"])
+    return Searcher(out)
+
+
+def assert_scores(got, expected):
+    assert dict(got) == pytest.approx(dict(expected), abs=1e-4)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_ranker(searcher, query):
+    reader, idf, matrix = searcher.reader, searcher.idf, searcher.matrix
+    assert_scores(matrix.top_k(query, None), bm25_score(query, reader, idf))
+    assert_scores(matrix.top_k(query, None, k1=0.9, b=0.4), bm25_score(query, reader, idf, k1=0.9, b=0.4))
+    assert_scores(matrix.top_k(query, None, scoring="tfidf"), tfidf_score(query, reader, idf))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_top_k_cut_and_candidates(searcher, query):
+    reader, idf, matrix = searcher.reader, searcher.idf, searcher.matrix
+    full = matrix.top_k(query, None)
+    assert matrix.top_k(query, 5) == full[:5]
+    candidates = [f"d{i}" for i in range(0, 200, 3)] + ["missing"]
+    # ranker keeps the candidates scoring 0 (filter matches); the matrix drops them
+    expected = [(d, s) for d, s in bm25_score(query, reader, idf, candidates=candidates) if s > 0]
+    assert_scores(matrix.top_k(query, None, candidates=candidates), expected)
+
+
+def test_stream_keeps_every_candidate(searcher):
+    matrix = searcher.matrix
+    nums = np.arange(0, 200, 2)
+    out = matrix.top_k_stream(["w3"], iter(nums), batch=16)
+    assert len(out) == len(nums)
+    scores = matrix.doc_scores(["w3"], nums)
+    assert sorted(s for _, s in out) == sorted(round(float(s), 4) for s in scores)
+    assert [s for _, s in out] == sorted((s for _, s in out), reverse=True)
+
+
+def test_mismatched_segment_is_refused(searcher, tmp_path):
+    other = tmp_path / "other"
+    corpus = tmp_path / "docs.jsonl"
+    corpus.write_text(json.dumps({"id": "x", "text": "w0 w1"}) + "\n", encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(other), "--no-fields"])
+    with pytest.raises(ValueError):
+        load_matrix(searcher.index_dir / "matrix", Searcher(other).reader)
@@ -0,0 +1,72 @@
+import itertools
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from search_service import Searcher
+
+# Phrase, NEAR/k and W/k queries return exactly the docs a brute-force scan
+# of the token lists finds, whether phrases are answered from positions
+# alone or with the n-gram index narrowing the candidates.
+
+WORDS = [f"w{i}" for i in range(8)]
+
+
+@pytest.fixture(scope="module")
+def docs():
+    rng = random.Random(5)
+    return {f"d{i}": rng.choices(WORDS, [6, 5, 4, 3, 2, 1, 1, 1], k=rng.randint(2, 40)) for i in range(120)}
+
+
+@pytest.fixture(scope="module", params=["positional", "ngram"])
+def searcher(request, docs, tmp_path_factory):
+    out = tmp_path_factory.mktemp(request.param)
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": " ".join(t)}) + "\n" for d, t in docs.items()),
+                      encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields",
+                      "--phrase-index", request.param, "--ngram-min-df", "2"])
+    assert (out / "ngram").exists() == (request.param == "ngram")
+    return Searcher(out)
+
+
+def has_phrase(tokens, terms):
+    n = len(terms)
+    return any(tokens[i:i + n] == terms for i in range(len(tokens) - n + 1))
+
+
+def has_window(tokens, terms, k, ordered):
+    lists = [[p for p, t in enumerate(tokens) if t == term] for term in terms]
+    for c in itertools.product(*lists):
+        if ordered and any(x >= y for x, y in zip(c, c[1:])):
+            continue
+        if max(c) - min(c) <= k:
+            return True
+    return False
+
+
+def found(searcher, qtype, query, k=3):
+    return {d for d, _ in searcher.search(qtype, query, k=k)}
+
+
+@pytest.mark.parametrize("query", ["w0 w1", "w1 w0 w2", "w3 w3", "w5 w6", "w0 w1 w2 w3"])
+def test_phrase(searcher, docs, query):
+    terms = query.split()
+    expected = {d for d, t in docs.items() if has_phrase(t, terms)}
+    assert found(searcher, "phrase", query) == expected
+    assert found(searcher, "boolean", f'"{query}"') == expected
+
+
+@pytest.mark.parametrize("query, k", [("w0 w4", 1), ("w2 w5 w1", 4), ("w6 w7", 10)])
+def test_proximity(searcher, docs, query, k):
+    terms = query.split()
+    for qtype, op, ordered in (("proximity", "NEAR", False), ("proximity_ordered", "W", True)):
+        expected = {d for d, t in docs.items() if has_window(t, terms, k, ordered)}
+        assert found(searcher, qtype, query, k) == expected
+        assert found(searcher, "boolean", f" {op}/{k} ".join(terms)) == expected
@@ -0,0 +1,91 @@
+import itertools
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import segment
+from positional import near_spans, ordered_spans, phrase_match, phrase_spans, proximity_match
+from segment import SegmentReader, write_segment
+
+# The merge matchers agree with brute force over every combination of
+# positions: phrase and W/k spans exactly, NEAR/k as "is there a window"
+# plus the validity of each reported window.
+
+VOCAB = ["a", "b", "c", "d", "e"]
+
+
+def random_lists(rng, n_terms):
+    # disjoint positions, as the terms of one document have
+    tokens = rng.choices(VOCAB[:n_terms], k=rng.randint(0, 40))
+    return [[p for p, t in enumerate(tokens) if t == term] for term in VOCAB[:n_terms]]
+
+
+def brute_phrase(lists):
+    n = len(lists)
+    return [(s, s + n - 1) for s in lists[0] if all(s + i in lists[i] for i in range(n))]
+
+
+def brute_ordered(lists, k):
+    spans = []
+    for s in lists[0]:
+        chains = [(s,) + c for c in itertools.product(*lists[1:])]
+        ends = [c[-1] for c in chains if all(x < y for x, y in zip(c, c[1:]))]
+        if ends and min(ends) - s <= k:
+            spans.append((s, min(ends)))
+    return spans
+
+
+def brute_near(lists, k):
+    return any(max(c) - min(c) <= k for c in itertools.product(*lists))
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matchers_match_brute_force(seed):
+    rng = random.Random(seed)
+    lists = random_lists(rng, rng.randint(1, 4))
+    k = rng.randint(len(lists) - 1, 8)
+    assert phrase_spans(lists) == brute_phrase(lists)
+    assert ordered_spans(lists, k) == brute_ordered(lists, k)
+    spans = near_spans(lists, k)
+    assert bool(spans) == brute_near(lists, k)
+    for lo, hi in spans:
+        assert hi - lo <= k and all(any(lo <= p <= hi for p in ps) for ps in lists)
+
+
+@pytest.fixture(scope="module")
+def docs_and_reader(tmp_path_factory):
+    rng = random.Random(7)
+    docs = [rng.choices(VOCAB, [8, 4, 2, 1, 1], k=rng.randint(1, 50)) for _ in range(300)]
+    index = {}
+    for d, tokens in enumerate(docs):
+        for p, t in enumerate(tokens):
+            index.setdefault(t, {}).setdefault(d, []).append(p)
+    out = tmp_path_factory.mktemp("seg")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(segment, "SKIP_BLOCK", 8)
+        write_segment(out, [f"d{i}" for i in range(len(docs))], index)
+    return docs, SegmentReader(out)
+
+
+def lists_in(tokens, terms):
+    return [[p for p, t in enumerate(tokens) if t == term] for term in terms]
+
+
+@pytest.mark.parametrize("terms", [["a", "b"], ["b", "a", "c"], ["d", "e"], ["a", "a"]])
+def test_phrase_match_over_segment(docs_and_reader, terms):
+    docs, reader = docs_and_reader
+    expected = [(d, brute_phrase(lists_in(tokens, terms))) for d, tokens in enumerate(docs)]
+    assert phrase_match(reader, terms) == [(d, s) for d, s in expected if s]
+
+
+@pytest.mark.parametrize("terms, k", [(["a", "c"], 1), (["c", "b", "d"], 4), (["e", "d"], 10)])
+def test_proximity_match_over_segment(docs_and_reader, terms, k):
+    docs, reader = docs_and_reader
+    ordered = [(d, brute_ordered(lists_in(tokens, terms), k)) for d, tokens in enumerate(docs)]
+    assert proximity_match(reader, terms, k, ordered=True) == [(d, s) for d, s in ordered if s]
+    near = [d for d, tokens in enumerate(docs) if brute_near(lists_in(tokens, terms), k)]
+    assert [d for d, _ in proximity_match(reader, terms, k)] == near
@@ -0,0 +1,44 @@
+import random
+import sys
+from itertools import accumulate
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from postings_codec import CODECS, PFOR_BLOCK, decode_sums, get_codec
+
+# Every codec decodes what it encoded, for the shapes postings take: runs
+# of zeros and ones, mostly-small gaps with a few huge ones (PFOR
+# exceptions), partial blocks, and the empty list.
+
+
+def value_lists():
+    rng = random.Random(9)
+    yield []
+    yield [0]
+    yield [0] * 500
+    yield [1] * 300
+    yield [(1 << 40) + 3, 0, 7]
+    for n in (1, 7, PFOR_BLOCK - 1, PFOR_BLOCK, PFOR_BLOCK + 1, 1000):
+        yield [rng.randint(0, 15) for _ in range(n)]
+        yield [rng.randint(0, 3) if rng.random() < 0.95 else rng.randint(1000, 1 << 30) for _ in range(n)]
+        yield [int(rng.expovariate(1 / 200)) for _ in range(n)]
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_round_trip(name):
+    codec = get_codec(name)
+    for values in value_lists():
+        buf = codec.encode(values)
+        assert codec.decode(buf, len(values)) == values
+        assert decode_sums(codec, buf, len(values)) == list(accumulate(values))
+        assert decode_sums(codec, buf, len(values), base=1000) == [1000 + x for x in accumulate(values)]
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        get_codec("lz4")
+    with pytest.raises(ValueError):
+        get_codec("simple8b").encode([1 << 61])
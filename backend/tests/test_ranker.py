@@ -0,0 +1,80 @@
+import json
+import math
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from analyzer import DEFAULT
+from ranker import bm25_score, tfidf_score
+from segment import BM25_B, BM25_K1, SegmentReader
+
+# BM25 is scored from the stored doc lengths and postings tfs against the
+# whole collection: the same numbers as the textbook formula over the raw
+# tokens, also when only a subset of the docs is ranked.
+
+DOCS = {
+    "d1": "the cat sat on the mat",
+    "d2": "the dog chased the cat around the garden and the house",
+    "d3": "a quiet cat",
+    "d4": "dogs and cats and more dogs",
+}
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in DOCS.items()), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields"])
+    with open(out / "idf.json", encoding="utf-8") as f:
+        return SegmentReader(out / "positional"), json.load(f)
+
+
+def reference_bm25(query, docs):
+    tokens = {d: DEFAULT.analyze(t) for d, t in DOCS.items()}
+    n = len(tokens)
+    avg_len = sum(map(len, tokens.values())) / n
+    scores = {}
+    for d in docs:
+        tf, score = Counter(tokens[d]), 0.0
+        for q in query:
+            df = sum(q in t for t in tokens.values())
+            if tf[q]:
+                idf = math.log((n + 1) / (df + 1)) + 1
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens[d]) / avg_len)
+                score += idf * tf[q] * (BM25_K1 + 1) / (tf[q] + norm)
+        if score > 0:
+            scores[d] = round(score, 4)
+    return scores
+
+
+def test_stored_statistics(index):
+    reader, idf = index
+    lens = {d: len(DEFAULT.analyze(t)) for d, t in DOCS.items()}
+    assert {reader.doc_id(d): reader.doc_len(d) for d in range(reader.num_docs)} == lens
+    assert reader.avg_doc_len == pytest.approx(sum(lens.values()) / len(lens))
+    assert dict(reader.postings("the")) == {reader.doc_num("d1"): 2, reader.doc_num("d2"): 4}
+    assert idf["cat"] == pytest.approx(math.log(5 / 4) + 1)
+
+
+@pytest.mark.parametrize("query", [["cat"], ["the", "cat"], ["dogs", "garden"], ["missing"]])
+def test_bm25_matches_reference(index, query):
+    reader, idf = index
+    assert dict(bm25_score(query, reader, idf)) == reference_bm25(query, DOCS)
+
+
+def test_candidates_keep_collection_statistics(index):
+    reader, idf = index
+    ranked = dict(bm25_score(["cat", "the"], reader, idf, candidates=["d1", "d3"]))
+    assert ranked == reference_bm25(["cat", "the"], ["d1", "d3"])
+
+
+def test_tfidf_uses_length_normalized_tf(index):
+    reader, idf = index
+    ranked = dict(tfidf_score(["dogs"], reader, idf))
+    assert ranked == {"d4": round(2 / 6 * idf["dogs"], 4)}
@@ -0,0 +1,55 @@
+import json
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from docstore import load_docstore
+from segment import SegmentReader
+from snippets import make_snippets
+
+# Snippets highlight exactly the matched tokens of the displayed hits,
+# reading their positions through the term cursors (never a whole
+# term's positions).
+
+FILLER = " ".join(f"filler{i}" for i in range(80))
+DOCS = [
+    ("d1", f"Graph colouring. {FILLER} Sparse graph colouring bounds."),
+    ("d2", "Quantum spin chains at low temperature."),
+    ("d3", f"{FILLER} The colouring of a sparse graph, and graph minors."),
+]
+HL = re.compile(r"<span class='hl'>(.*?)</span>")
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in DOCS), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--no-matrix", "--no-fields"])
+    reader = SegmentReader(out / "positional")
+    reader.positions = None   # snippets must only seek the shown docs
+    return load_docstore(out / "docstore", reader)
+
+
+def test_best_window_is_highlighted(store):
+    out = make_snippets(store.reader, store, ["sparse", "graph"], ["d1", "d3"])
+    assert HL.findall(out["d1"]) == ["Sparse", "graph"]
+    assert out["d1"].startswith("… ")
+    assert HL.findall(out["d3"]) == ["sparse", "graph", "graph"]
+
+
+def test_phrase_highlights_whole_occurrences(store):
+    out = make_snippets(store.reader, store, ["graph", "colouring"], ["d1", "d3"], phrase=True)
+    assert HL.findall(out["d1"]) == ["Graph", "colouring"]
+    assert HL.findall(out["d3"]) == []
+
+
+def test_unknown_docs_and_terms(store):
+    out = make_snippets(store.reader, store, ["nosuchterm"], ["d2", "missing"])
+    assert out["missing"] == "" and HL.findall(out["d2"]) == []
+    assert out["d2"].startswith("Quantum")
@@ -0,0 +1,81 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import segment
+from incremental_index import IndexWriter, open_index
+from ranker import bm25_score, tfidf_score
+from segment import SegmentReader, idf_value, write_segment
+from topk import top_k
+
+# WAND must return exactly the exhaustive top k, whether its bounds come
+# from the segment (default BM25) or from max tf / doc_len (other k1 / b,
+# the live index), with lists spanning many skip blocks.
+
+VOCAB = [f"w{i}" for i in range(60)]
+QUERIES = [["w0"], ["w0", "w1"], ["w3", "w40"], ["w1", "w1", "w7", "w59"], ["w2", "w5", "w9", "w30"]]
+
+
+def random_docs(seed, n):
+    rng = random.Random(seed)
+    # Zipf-like: low-numbered words are common, high-numbered ones rare
+    weights = [1 / (i + 1) for i in range(len(VOCAB))]
+    return [rng.choices(VOCAB, weights, k=rng.randint(5, 60)) for _ in range(n)]
+
+
+@pytest.fixture(scope="module")
+def segment_reader(tmp_path_factory):
+    docs = random_docs(1, 400)
+    index = {}
+    for d, tokens in enumerate(docs):
+        for p, t in enumerate(tokens):
+            index.setdefault(t, {}).setdefault(d, []).append(p)
+    out = tmp_path_factory.mktemp("seg")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(segment, "SKIP_BLOCK", 8)
+        write_segment(out, [f"d{i}" for i in range(len(docs))], index)
+    reader = SegmentReader(out)
+    idf = {t: idf_value(reader.num_docs, reader.doc_freq(t)) for t in index}
+    return reader, idf
+
+
+def assert_same_top(wand, brute, k):
+    brute_scores = dict(brute)
+    assert [s for _, s in wand] == [s for _, s in brute[:k]]
+    assert all(brute_scores[d] == s for d, s in wand)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_bm25_default_bounds(segment_reader, query, k):
+    reader, idf = segment_reader
+    assert_same_top(top_k(query, reader, idf, k), bm25_score(query, reader, idf), k)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k1, b", [(0.9, 0.4), (2.0, 1.0), (1.2, 0.0)])
+def test_bm25_other_parameters(segment_reader, query, k1, b):
+    reader, idf = segment_reader
+    wand = top_k(query, reader, idf, 10, k1=k1, b=b)
+    assert_same_top(wand, bm25_score(query, reader, idf, k1=k1, b=b), 10)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_tfidf(segment_reader, query):
+    reader, idf = segment_reader
+    assert_same_top(top_k(query, reader, idf, 10, scoring="tfidf"), tfidf_score(query, reader, idf), 10)
+
+
+def test_live_index(tmp_path):
+    writer = IndexWriter(tmp_path / "live")
+    for batch in range(3):
+        docs = random_docs(10 + batch, 150)
+        writer.add_documents({f"b{batch}_{i}": tokens for i, tokens in enumerate(docs)})
+    writer.delete([f"b0_{i}" for i in range(0, 150, 3)])
+    reader, idf = open_index(tmp_path / "live")
+    for query in QUERIES:
+        assert_same_top(top_k(query, reader, idf, 10), bm25_score(query, reader, idf), 10)
@@ -0,0 +1,79 @@
+import json
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+import tracing
+from search_service import Searcher
+from tracing import Metrics, count, current, record, span, trace
+
+# Spans nest and sum per name, counters land on the trace and on the
+# innermost open span, nothing is recorded outside a trace, and a traced
+# query reports the pipeline stages it went through.
+
+
+def test_spans_and_counters():
+    count("outside")
+    with span("outside"):
+        pass
+    assert current() is None
+
+    with trace("q", "boolean") as t:
+        with span("outer"):
+            count("a")
+            for _ in range(3):
+                with span("inner"):
+                    count("b", 2)
+        count("c")
+    assert current() is None
+    d = t.to_dict()
+    assert d["counters"] == {"a": 1, "b": 6, "c": 1}
+    outer, inner = d["spans"]["outer"], d["spans"]["inner"]
+    assert (outer["calls"], inner["calls"]) == (1, 3)
+    assert outer["counters"] == {"a": 1} and inner["counters"] == {"b": 6}
+    s = t.spans
+    assert s["outer"]["self_seconds"] == pytest.approx(s["outer"]["seconds"] - s["inner"]["seconds"])
+    assert t.seconds >= s["outer"]["seconds"] and d["profile"] is None
+
+
+def test_profile():
+    with trace("q", "ranked", profile=True) as t:
+        sorted(range(1000), reverse=True)
+    assert "function calls" in t.profile
+
+
+def test_metrics_exposition(monkeypatch, caplog):
+    metrics = Metrics()
+    monkeypatch.setattr(tracing, "METRICS", metrics)
+    with trace("graph", "phrase") as t:
+        with span("verify"):
+            count("matches", 4)
+    with caplog.at_level(logging.INFO, logger="intellisearch.query"):
+        record(t, cached=False)
+    assert json.loads(caplog.records[0].getMessage())["cached"] is False
+    record({"type": "phrase", "total_ms": 5000.0, "spans": {}, "counters": {"matches": 1}})
+    text = metrics.exposition()
+    assert 'intellisearch_query_seconds_bucket{type="phrase",le="+Inf"} 2' in text
+    assert 'intellisearch_query_seconds_bucket{type="phrase",le="2.5"} 1' in text
+    assert 'intellisearch_span_seconds_count{span="verify"} 1' in text
+    assert "intellisearch_matches_total 5" in text
+
+
+def test_traced_query(tmp_path):
+    corpus = tmp_path / "docs.jsonl"
+    docs = [("d1", "sparse graph colouring"), ("d2", "dense graph"), ("d3", "sparse graph minors")]
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in docs), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(tmp_path / "index"), "--no-fields"])
+    searcher = Searcher(tmp_path / "index")
+    with trace("sparse graph", "phrase") as t:
+        results = searcher.search("phrase", "sparse graph")
+    assert {d for d, _ in results} == {"d1", "d3"}
+    # the planner verifies positions as the scorer pulls candidates
+    assert {"parse", "intersect", "score"} <= set(t.spans)
+    assert t.counters["matches"] == 2 and t.counters["candidates_scored"] == 2
+    assert t.counters["candidates_verified"] >= 2
@@ -0,0 +1,66 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build_index
+from search_service import QUERY_TYPES
+from warmup import Warmup
+
+# A warm-up opens every part of the index, pages in the hottest terms,
+# runs one query of each type and only then reports ready (and writes the
+# ready file); a broken index ends in "failed", not in a hang.
+
+DOCS = [
+    ("d1", "Sparse graph colouring.   Bounds on the chromatic number of sparse graphs."),
+    ("d2", "Quantum error correction.   Sparse codes for quantum memories."),
+    ("d3", "Graph neural networks.   Message passing on sparse graphs."),
+    ("d4", "Field theory.   Quantum fields in curved space."),
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    out = tmp_path_factory.mktemp("index")
+    corpus = out / "docs.jsonl"
+    corpus.write_text("".join(json.dumps({"id": d, "text": t}) + "\n" for d, t in DOCS), encoding="utf-8")
+    build_index.main(["--input", str(corpus), "--out-dir", str(out), "--impacts", "--dense"])
+    return out
+
+
+def test_warm_up_to_ready(index, tmp_path):
+    ready_file = tmp_path / "ready.json"
+    warm = Warmup(index, docstore=True, hot_terms=3, ready_file=ready_file).start()
+    assert warm.wait(60) and warm.ready
+    status = warm.status()
+    assert status["prefaulted"]["hot_terms"] == 3
+    assert set(status["prefaulted"]["bytes"]) == {"segment", "matrix", "impact", "fields", "dense", "docstore"}
+    assert set(status["warm_query_ms"]) == set(QUERY_TYPES)
+    assert {"open_ms", "prefault_ms", "queries_ms", "warmup_ms", "ready_ms"} <= set(status["timings"])
+    assert json.loads(ready_file.read_text())["state"] == "ready"
+
+    reader = warm.reader
+    freqs = sorted((reader.doc_freq(t) for t in reader.terms()), reverse=True)
+    assert sorted((reader.doc_freq(reader.term(t)) for t in reader.hot_terms(3)), reverse=True) == freqs[:3]
+
+    warm.first_query()
+    first = warm.timings["time_to_first_query_ms"]
+    warm.first_query()
+    assert warm.timings["time_to_first_query_ms"] == first
+
+
+def test_segment_only(index):
+    warm = Warmup(index, searcher=False, docstore=True).run()
+    assert warm.ready and warm.searcher is None and warm.warm_query_ms == {}
+    assert warm.docs.text("d2").startswith("Quantum")
+    assert warm.fields.title_of("d3") == "Graph neural networks"
+
+
+def test_failure_is_reported(tmp_path):
+    warm = Warmup(tmp_path / "missing", ready_file=tmp_path / "ready.json").start()
+    with pytest.raises(RuntimeError):
+        warm.wait(60)
+    assert warm.state == "failed" and warm.error and not (tmp_path / "ready.json").exists()
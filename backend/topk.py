@@ -0,0 +1,130 @@
+import heapq
+from collections import Counter
+
+from segment import BM25_K1, BM25_B, END, bm25_tf
+from tracing import count
+
+# ----------------------------------------
+# WAND TOP-K RETRIEVAL
+# ----------------------------------------
+# Document-at-a-time over the query terms' postings. Every term carries a
+# score upper bound (precomputed in the segment for the default BM25
+# parameters), and a doc is only fully scored when the bounds of the
+# terms positioned at or before it could beat the current k-th best score.
+# The result heap never holds more than k entries.
+#
+# The cursors are the segment's PostingsCursors: a block of postings is
+# decoded when WAND reaches it, a seek past the pivot gallops over the
+# skip entries, and tfs are only decoded for blocks holding a scored doc.
+# No bound needs a decode either: without a usable stored BM25 bound the
+# stored max tf / doc_len gives one (bm25_bound).
+
+
+class _Cursor:
+    __slots__ = ("postings", "doc", "weight", "upper")
+
+    def __init__(self, postings, weight, upper):
+        self.postings = postings
+        self.doc = postings.next_geq(0)
+        self.weight = weight
+        self.upper = upper
+
+    @property
+    def tf(self):
+        return self.postings.tf()
+
+    def advance(self):
+        self.doc = self.postings.next_geq(self.doc + 1)
+
+    def seek(self, target):
+        # first posting with doc >= target
+        self.doc = self.postings.next_geq(target)
+
+
+def bm25_bound(max_tf_norm, avg_len, k1=BM25_K1, b=BM25_B):
+    # max of bm25_tf over docs with tf / doc_len <= max_tf_norm: at a fixed
+    # ratio it grows with doc_len, towards this limit
+    if b == 0 or not avg_len:
+        return k1 + 1
+    return (k1 + 1) * max_tf_norm / (max_tf_norm + k1 * b / avg_len)
+
+
+def _cursors(query_tokens, reader, idf, scoring, k1, b):
+    avg_len = reader.avg_doc_len
+    default_params = (k1, b) == (BM25_K1, BM25_B)
+    cursors = []
+    for q, qtf in Counter(query_tokens).items():
+        if q not in idf:
+            continue
+        postings = reader.cursor(q)
+        if postings is None:
+            continue
+        weight = qtf * idf[q]
+        max_bm25, max_tf_norm = reader.score_bounds(q)
+        if scoring == "tfidf":
+            upper = weight * max_tf_norm
+        elif default_params and max_bm25 is not None:
+            upper = weight * max_bm25
+        else:
+            # stored bounds only hold for the default k1/b (and for the
+            # avg_len they were computed against)
+            upper = weight * bm25_bound(max_tf_norm, avg_len, k1, b)
+        cursors.append(_Cursor(postings, weight, upper))
+    return cursors
+
+
+def top_k(query_tokens, reader, idf, k=10, scoring="bm25", k1=BM25_K1, b=BM25_B):
+    # -> [(doc_id, score), ...] best first, same shape as ranker.bm25_score
+    if k <= 0:
+        return []
+    avg_len = reader.avg_doc_len
+    cursors = _cursors(query_tokens, reader, idf, scoring, k1, b)
+
+    heap = []          # min-heap of (score, -doc_num)
+    threshold = 0.0
+    scored = 0
+    while True:
+        cursors = [c for c in cursors if c.doc != END]
+        if not cursors:
+            break
+        cursors.sort(key=lambda c: c.doc)
+
+        # pivot: first cursor where the accumulated bounds beat the threshold
+        acc = 0.0
+        pivot = None
+        for i, c in enumerate(cursors):
+            acc += c.upper
+            if acc > threshold:
+                pivot = i
+                break
+        if pivot is None:
+            break
+        pivot_doc = cursors[pivot].doc
+
+        if cursors[0].doc == pivot_doc:
+            scored += 1
+            doc_len = reader.doc_len(pivot_doc)
+            score = 0.0
+            for c in cursors:
+                if c.doc != pivot_doc:
+                    break
+                if scoring == "tfidf":
+                    score += c.weight * c.tf / doc_len
+                else:
+                    score += c.weight * bm25_tf(c.tf, doc_len, avg_len, k1, b)
+                c.advance()
+
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -pivot_doc))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, -pivot_doc))
+            if len(heap) == k:
+                threshold = heap[0][0]
+        else:
+            # no doc before pivot_doc can make it into the top-k
+            for c in cursors[:pivot]:
+                c.seek(pivot_doc)
+
+    count("candidates_scored", scored)
+    ranked = sorted(heap, reverse=True)
+    return [(reader.doc_id(-neg_doc), round(score, 4)) for score, neg_doc in ranked if score > 0]
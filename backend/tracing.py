@@ -0,0 +1,250 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# ----------------------------------------
+# PER-QUERY TRACING
+# ----------------------------------------
+# The query pipeline marks its stages with span(name) and its work with
+# count(name, n). Both are no-ops unless a trace is active, so the hot
+# path pays one context-variable lookup per call site (calls sit at per-
+# term / per-stage granularity, never per posting).
+#
+#   with trace(query, qtype) as t:
+#       results = searcher.search(qtype, query)
+#   record(t)    -> aggregate histograms (METRICS) + one JSON log line
+#
+# Spans nest; a span's "ms" includes its children, "self_ms" does not,
+# and repeated spans of the same name are summed ("calls"). Counters are
+# kept per trace and per innermost open span. Spans in use:
+#
+#   parse      query analysis (analyzer, query parsing and planning)
+#   postings   decoding postings / positions (postings_decoded, positions_decoded)
+#   intersect  AND / OR / NOT over doc lists, pulled lazily by the ranker
+#              (candidates)
+#   verify     positional phrase / NEAR checks (candidates_verified, matches)
+#   topk       ranked retrieval (postings_scored, candidates_scored)
+#   score      exact BM25 of filtered matches (candidates_scored)
+#   dense      the embedding leg of semantic / hybrid
+#   snippet    query-biased snippets (snippets)
+#   render     the UI drawing the result cards
+#
+# trace(..., profile=True) also runs cProfile over the query and keeps
+# the top PROFILE_LINES functions by cumulative time; sampled(rate) picks
+# queries to profile at random.
+#
+# The log line goes to the "intellisearch.query" logger at INFO, so it is
+# silent until logging is configured (api_server.py --trace-log).
+# METRICS.exposition() is the Prometheus text format (GET /metrics).
+
+LOGGER = logging.getLogger("intellisearch.query")
+PROFILE_LINES = 25
+# seconds; Prometheus-style cumulative buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar("intellisearch_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "stat", "start", "child")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.stat = trace.spans.get(name)
+        if self.stat is None:
+            self.stat = trace.spans[name] = {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "counters": {}}
+
+    def __enter__(self):
+        self.child = 0.0
+        self.trace._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.trace._stack
+        stack.pop()
+        if stack:
+            stack[-1].child += elapsed
+        stat = self.stat
+        stat["calls"] += 1
+        stat["seconds"] += elapsed
+        stat["self_seconds"] += elapsed - self.child
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, query="", qtype=""):
+        self.query = query
+        self.qtype = qtype
+        self.spans = {}      # name -> {calls, seconds, self_seconds, counters}
+        self.counters = {}
+        self.seconds = 0.0
+        self.profile = None  # pstats text when the query was profiled
+        self._stack = []
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        if self._stack:
+            c = self._stack[-1].stat["counters"]
+            c[name] = c.get(name, 0) + n
+
+    def to_dict(self):
+        return {
+            "query": self.query,
+            "type": self.qtype,
+            "total_ms": round(self.seconds * 1000, 3),
+            "spans": {name: {"calls": s["calls"], "ms": round(s["seconds"] * 1000, 3),
+                             "self_ms": round(s["self_seconds"] * 1000, 3), "counters": s["counters"]}
+                      for name, s in self.spans.items()},
+            "counters": self.counters,
+            "profile": self.profile,
+        }
+
+
+def span(name):
+    t = _current.get()
+    return _NO_SPAN if t is None else _Span(t, name)
+
+
+def count(name, n=1):
+    t = _current.get()
+    if t is not None:
+        t.count(name, n)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def trace(query="", qtype="", profile=False):
+    t = Trace(query, qtype)
+    token = _current.set(t)
+    prof = None
+    if profile:
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            prof = None   # another profiler is already running
+    start = time.perf_counter()
+    try:
+        yield t
+    finally:
+        t.seconds = time.perf_counter() - start
+        if prof is not None:
+            prof.disable()
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            t.profile = out.getvalue()
+        _current.reset(token)
+
+
+def sampled(rate):
+    # profile roughly this fraction of queries
+    return rate > 0 and random.random() < rate
+
+
+# ----------------------------------------
+# AGGREGATE METRICS (PROMETHEUS TEXT FORMAT)
+# ----------------------------------------
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        out = []
+        total = 0
+        for le, n in zip([*map(repr, self.buckets), "+Inf"], self.counts):
+            total += n
+            out.append(f'{name}_bucket{{{labels},le="{le}"}} {total}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class Metrics:
+    # process-wide aggregates; API workers send their traces to the front
+    # end, which records them here
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = {}    # query type -> Histogram of total seconds
+        self.spans = {}      # span name -> Histogram of seconds per query
+        self.counters = {}   # counter name -> running total
+
+    def observe(self, trace_dict):
+        with self._lock:
+            h = self.queries.setdefault(trace_dict["type"], Histogram())
+            h.observe(trace_dict["total_ms"] / 1000)
+            for name, s in trace_dict["spans"].items():
+                self.spans.setdefault(name, Histogram()).observe(s["ms"] / 1000)
+            for name, n in trace_dict["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def exposition(self):
+        with self._lock:
+            lines = ["# HELP intellisearch_query_seconds Query latency by query type.",
+                     "# TYPE intellisearch_query_seconds histogram"]
+            for qtype, h in sorted(self.queries.items()):
+                lines += h.lines("intellisearch_query_seconds", f'type="{qtype}"')
+            lines += ["# HELP intellisearch_span_seconds Time per query spent in each pipeline span.",
+                      "# TYPE intellisearch_span_seconds histogram"]
+            for name, h in sorted(self.spans.items()):
+                lines += h.lines("intellisearch_span_seconds", f'span="{name}"')
+            for name, n in sorted(self.counters.items()):
+                metric = f"intellisearch_{_metric_name(name)}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {n}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def record(t, **extra):
+    # -> the trace as a dict; t is a Trace or a dict from another process
+    d = t if isinstance(t, dict) else t.to_dict()
+    METRICS.observe(d)
+    if LOGGER.isEnabledFor(logging.INFO):
+        line = {k: v for k, v in d.items() if k != "profile"}
+        line.update(extra)
+        LOGGER.info(json.dumps(line))
+        if d.get("profile"):
+            LOGGER.info("profile of %s query %r\n%s", d["type"], d["query"], d["profile"])
+    return d
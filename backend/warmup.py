@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# ----------------------------------------
+# INDEX WARM-UP
+# ----------------------------------------
+# The index on disk is already the ready-to-query snapshot: segments,
+# matrix, impact tiers, dense vectors and the docstore are mmap'd exactly as
+# build_index.py wrote them, and nothing is re-tokenized at serve time.
+# What a fresh process still pays on its first queries is imports, lazy
+# state and page faults, so warm-up does that work up front:
+#
+#   open       import the query modules (numpy among them) and open the
+#              Searcher: meta files, idf.json, the maps
+#   prefault   page in the lexicon and doc table, and the postings /
+#              positions, matrix and title-field rows and impact tiers of
+#              the HOT_TERMS terms with the largest doc freq; build the doc
+#              id map, lexicon block heads and BM25 / BM25F length norms
+#   queries    one query of every type over the two least frequent of
+#              those terms (paged in, but cheap to decode), which fills what
+#              is left (the embedding model, first-call paths)
+#
+# Warmup runs the steps on a background thread (start()) or inline (run())
+# and exposes the state -- "cold", "warming", "ready" or "failed" -- the
+# step in progress and per-step timings:
+#
+#   app.py         draws at once and shows the warming state; a search
+#                  before ready waits for it
+#   api_server.py  warms every worker; GET /ready answers 503 until all are
+#
+# With a ready file (--ready-file, INTELLISEARCH_READY_FILE for the app)
+# the status JSON is written there once ready, for an exec readiness probe.
+# Time-to-first-query -- process start to the first answered user query --
+# is recorded by first_query() and reported with the warm-up timings.
+#
+#   python warmup.py               warm inline, then time a first query of every type
+#   python warmup.py --no-warm     the same first queries on a cold Searcher
+#   python bench/bench_warmup.py   both, each in fresh processes
+
+BASE_DIR = Path(__file__).resolve().parent
+INDEX_DIR = (BASE_DIR / ".." / "output").resolve()
+HOT_TERMS = 256
+READY_FILE_ENV = "INTELLISEARCH_READY_FILE"
+
+_LOADED = time.perf_counter()
+
+
+def process_age():
+    # seconds since this process started (Linux), else since this module loaded
+    try:
+        with open("/proc/self/stat", "r") as f:
+            started = int(f.read().rpartition(")")[2].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, AttributeError):
+        return time.perf_counter() - _LOADED
+
+
+def warm_queries(searcher, terms):
+    # -> {query type: ms} of one execute() per type over the given terms
+    from search_service import QUERY_TYPES
+    out = {}
+    for qtype in QUERY_TYPES:
+        query = " AND ".join(terms) if qtype == "boolean" else " ".join(terms)
+        t0 = time.perf_counter()
+        searcher.execute(qtype, query)
+        out[qtype] = round((time.perf_counter() - t0) * 1000, 3)
+    return out
+
+
+class Warmup:
+    def __init__(self, index_dir=INDEX_DIR, searcher=True, docstore=False, cache=None,
+                 hot_terms=HOT_TERMS, ready_file=None):
+        # searcher=False opens only the segment and analyzer (an app that
+        # queries over the HTTP API still needs them and the docstore)
+        self.index_dir = Path(index_dir)
+        self.with_searcher = searcher
+        self.with_docstore = docstore
+        self.cache = cache
+        self.hot_terms = hot_terms
+        self.ready_file = ready_file
+        self.state = "cold"
+        self.step = None
+        self.error = None
+        self.timings = {}
+        self.prefaulted = {}
+        self.warm_query_ms = {}   # query type -> ms of its warm-up query
+        self.searcher = self.reader = self.analyzer = self.docs = self.fields = None
+        self._done = threading.Event()
+
+    def start(self):
+        self.state = "warming"
+        threading.Thread(target=self._run, name="index-warmup", daemon=True).start()
+        return self
+
+    def run(self):
+        self.state = "warming"
+        self._run()
+        return self
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        # -> True once ready; raises if the warm-up failed
+        self._done.wait(timeout)
+        if self.state == "failed":
+            raise RuntimeError(f"index warm-up failed: {self.error}")
+        return self.ready
+
+    def _timed(self, step, fn):
+        self.step = step
+        t0 = time.perf_counter()
+        out = fn()
+        self.timings[f"{step}_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return out
+
+    def _open(self):
+        # imported here, not at the top: numpy and the query modules are
+        # part of what the background thread takes off the UI's first paint
+        from analyzer import load_analyzer
+        from docstore import load_docstore
+        from fields import load_fields
+        from segment import SegmentReader
+        if self.with_searcher:
+            from search_service import Searcher
+            self.searcher = Searcher(self.index_dir, self.cache)
+            self.reader, self.analyzer = self.searcher.reader, self.searcher.analyzer
+        else:
+            self.reader = SegmentReader(self.index_dir / "positional")
+            self.analyzer = load_analyzer(self.index_dir)
+        if self.with_docstore:
+            # built over the batch segment, also when the live index is searched
+            segment = self.reader
+            if not isinstance(segment, SegmentReader):
+                segment = SegmentReader(self.index_dir / "positional")
+            self.docs = load_docstore(self.index_dir / "docstore", segment)
+            # stored titles, so result cards need no doc text
+            if self.searcher is not None and self.searcher.reader is segment:
+                self.fields = self.searcher.fields
+            else:
+                self.fields = load_fields(self.index_dir / "fields", segment)
+
+    def _prefault(self):
+        hot = self.reader.hot_terms(self.hot_terms)
+        touched = {"segment": self.reader.prefault(hot)}
+        s = self.searcher
+        if s is not None:
+            for name, part in (("matrix", s.matrix), ("impact", s.impacts), ("fields", s.fields)):
+                if part is not None:
+                    touched[name] = part.prefault(hot)
+            if s.dense is not None:
+                touched["dense"] = s.dense.prefault()
+        if self.docs is not None:
+            touched["docstore"] = self.docs.prefault()
+        self.prefaulted = {"hot_terms": len(hot), "bytes": touched}
+        return [self.reader.term(t) for t in hot[-2:]]
+
+    def _run(self):
+        t0 = time.perf_counter()
+        try:
+            self._timed("open", self._open)
+            terms = self._timed("prefault", self._prefault)
+            if self.searcher is not None and terms:
+                self.warm_query_ms = self._timed("queries", lambda: warm_queries(self.searcher, terms))
+            self.timings["warmup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            self.timings["ready_ms"] = round(process_age() * 1000, 1)
+            self.state = "ready"
+            if self.ready_file:
+                with open(self.ready_file, "w", encoding="utf-8") as f:
+                    json.dump(self.status(), f)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+        finally:
+            self.step = None
+            self._done.set()
+
+    def first_query(self):
+        # call once a user query has been answered; only the first counts
+        if "time_to_first_query_ms" not in self.timings:
+            self.timings["time_to_first_query_ms"] = round(process_age() * 1000, 1)
+
+    def status(self):
+        return {"state": self.state, "step": self.step, "error": self.error,
+                "timings": dict(self.timings), "prefaulted": self.prefaulted, "warm_query_ms": self.warm_query_ms}
+
+
+# ----------------------------------------
+# CLI
+# ----------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Warm the index and report time-to-first-query")
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--hot-terms", type=int, default=HOT_TERMS)
+    parser.add_argument("--no-warm", action="store_true", help="open only: no prefault, no warm queries")
+    parser.add_argument("--ready-file", default=None, help="write the status JSON here once warm")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    warm = Warmup(args.index_dir, hot_terms=args.hot_terms, ready_file=args.ready_file)
+    if args.no_warm:
+        warm._timed("open", warm._open)
+        warm.timings["ready_ms"] = round(process_age() * 1000, 1)
+    else:
+        warm.run().wait()
+
+    # first user queries: the terms just past the warmed ones
+    reader = warm.reader
+    ids = reader.hot_terms(args.hot_terms + 2)[args.hot_terms:]
+    terms = [reader.term(t) for t in ids]
+    first = warm_queries(warm.searcher, terms) if terms else {}
+    warm.first_query()
+    report = {"warmed": not args.no_warm, **warm.status(), "first_queries": {"terms": terms, "ms": first}}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    t = report["timings"]
+    print(f"{'no warm-up' if args.no_warm else 'warm-up'}: " + ", ".join(f"{k[:-3]} {v:.1f} ms" for k, v in t.items()))
+    if report["prefaulted"]:
+        pages = report["prefaulted"]["bytes"]
+        print(f"prefaulted {report['prefaulted']['hot_terms']} hot terms: " +
+              ", ".join(f"{k} {v / 2**20:.1f} MB" for k, v in pages.items()))
+    print(f"first queries over {' '.join(terms)!r}: " + ", ".join(f"{q} {ms:.1f} ms" for q, ms in first.items()))
+
+
+if __name__ == "__main__":
+    main()